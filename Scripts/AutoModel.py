@@ -6,12 +6,13 @@ Author(s): Luc Anselin, Xun Li
 
 import arcpy as ARCPY
 import numpy as NUM
-import pysal as PYSAL
 import os as OS
 import SSDataObject as SSDO
 import SSUtilities as UTILS
 import sys as SYS
 import pysal2ArcUtils as AUTILS
+import RegressionUtils as RUTILS
+import BulkOutput as BULK
 
 # OLS Error result uses first 2, Lag result uses all 4
 FIELDNAMES = ["Predy", "Resid", "Predy_e", "e_Pred"]
@@ -20,15 +21,21 @@ FIELDALIAS = ["Predicted {0}", "Residual", "Predicted {0} (Reduced Form)",
 
 MODELTYPES = ["GMM_COMBO", "GMM_HAC"]
 
+#### Default of the Speculative Parameter (Environment Variable) ####
+SPECULATIVE = bool(OS.environ.get("PYSAL_SPECULATIVE_MODELS"))
+
 class AutoSpace_PySAL(object):
     """Computes linear regression via Ordinary Least Squares using PySAL."""
 
     def __init__(self, ssdo, depVarName, indVarNames, patW,  
                  pValue = 0.1, modelType = "GMM_COMBO", 
-                 kernelType = "Uniform", kernelKNN = 2):
+                 kernelType = "Uniform", kernelKNN = 2, 
+                 speculative = None, ePred = True, reducedForm = None,
+                 diagnostics = "FULL"):
 
         #### Set Initial Attributes ####
         UTILS.assignClassAttr(self, locals())
+        self.diagnostics = RUTILS.diagnosticLevel(diagnostics)
 
         #### Validate Model Type ####
         if modelType not in MODELTYPES:
@@ -36,6 +43,8 @@ class AutoSpace_PySAL(object):
                                                                            ", ".join(MODELTYPES)))
             raise SystemExit()
         self.useCombo = modelType == "GMM_COMBO"
+        if speculative is None:
+            self.speculative = SPECULATIVE
 
         #### Initialize Data ####
         self.initialize()
@@ -58,62 +67,31 @@ class AutoSpace_PySAL(object):
         #### Shorthand Attributes ####
         ssdo = self.ssdo
 
-        #### MasterField Can Not Be The Dependent Variable ####
-        if ssdo.masterField == self.depVarName:
-            ARCPY.AddIDMessage("ERROR", 945, ssdo.masterField, 
-                               ARCPY.GetIDMessage(84112))
-            raise SystemExit()
-
-        #### Remove the MasterField from Independent Vars #### 
-        if ssdo.masterField in self.indVarNames:
-            self.indVarNames.remove(ssdo.masterField)
-            ARCPY.AddIDMessage("Warning", 736, ssdo.masterField)
-
-        #### Remove the Dependent Variable from Independent Vars ####
-        if self.depVarName in self.indVarNames:
-            self.indVarNames.remove(self.depVarName)
-            ARCPY.AddIDMessage("Warning", 850, self.depVarName)
-
-        #### Raise Error If No Independent Vars ####
-        if not len(self.indVarNames):
-            ARCPY.AddIDMessage("Error", 737)
-            raise SystemExit()
-
-        #### Create Dependent Variable ####
+        #### Validate Variables and Load y and X as One Block ####
+        self.y, self.x = RUTILS.loadDesign(ssdo, self.depVarName, 
+                                           self.indVarNames)
         self.allVars = [self.depVarName] + self.indVarNames
-        self.y = ssdo.fields[self.depVarName].returnDouble()
         self.n = ssdo.numObs
-        self.y.shape = (self.n, 1)
-
-        #### Assure that Variance is Larger than Zero ####
-        yVar = NUM.var(self.y)
-        if NUM.isnan(yVar) or yVar <= 0.0:
-            ARCPY.AddIDMessage("Error", 906)
-            raise SystemExit()
+        self.k = len(self.indVarNames) + 1
 
         #### Assure that p-Value is Between 0 and 1 ####
         if self.pValue <= 0 or self.pValue >= 1.0:
             ARCPY.AddIDMessage("Error", 906)
             raise SystemExit()
-        
-        #### Create Design Matrix ####
-        self.k = len(self.indVarNames) + 1
-        self.x = NUM.ones((self.n, self.k - 1), dtype = float)
-        for column, variable in enumerate(self.indVarNames):
-            self.x[:,column] = ssdo.fields[variable].data
 
         #### Set Weights Info ####
         self.w = self.patW.w
         self.wName = self.patW.wName
 
         if self.modelType == "GMM_HAC":
-            import pysal.lib.weights as WEIGHTS
+            import KernelUtils as KUTILS
             self.w.transform = 'r'
             dataArray = self.ssdo.xyCoords
             kernelName = "{0} function with knn = {1}"
             kernelName = kernelName.format(self.kernelType, self.kernelKNN)
-            kernelWeights = WEIGHTS.Kernel(dataArray, fixed = True, k = self.kernelKNN,
-                                           function = self.kernelType, diagonal = True)
+            kernelWeights = KUTILS.buildKernel(dataArray, self.kernelType,
+                                               self.kernelKNN, fixed = True,
+                                               diagonal = True)
             self.gwk = kernelWeights
             self.gwkName = kernelName
         else:
@@ -135,7 +113,11 @@ class AutoSpace_PySAL(object):
                                           name_x = self.indVarNames,
                                           name_w = self.wName,
                                           name_gwk = self.gwkName,
-                                          name_ds = self.ssdo.inputFC)
+                                          name_ds = self.ssdo.inputFC,
+                                          speculative = self.speculative,
+                                          reducedForm = self.reducedForm,
+                                          ePred = self.ePred,
+                                          diagnostics = self.diagnostics)
         except:
             import traceback
             ARCPY.AddError(("There is an error occurred when automatically "
@@ -159,8 +141,11 @@ class AutoSpace_PySAL(object):
             self.oPredy = finalModel.predy
             self.oResid = finalModel.u
             self.oPredy_e = finalModel.predy_e
-            self.oE_Predy = finalModel.e_pred if finalModel.e_pred is not None else \
-                NUM.ones(self.ssdo.numObs) * NUM.nan
+            if getattr(finalModel, "warning", None):
+                ARCPY.AddWarning(finalModel.warning)
+            if self.ePred:
+                self.oE_Predy = finalModel.e_pred if finalModel.e_pred is not None else \
+                    NUM.ones(self.ssdo.numObs) * NUM.nan
             summary = finalModel.summary
             
         elif autoTestResult["final model"].startswith('Spatial Error'):
@@ -179,8 +164,22 @@ class AutoSpace_PySAL(object):
             for i in range(len(FIELDNAMES)):
                 FIELDNAMES[i] = "Het" + FIELDNAMES[i]
        
+        #### Coefficients Alone Below the Standard Level ####
+        if self.diagnostics == "COEFFICIENTS":
+            names = ["CONSTANT"] + self.indVarNames
+            model = olsModel
+            if autoTestResult["final model"].startswith('Spatial Lag'):
+                names = names + ["W_" + self.depVarName]
+                model = finalModel
+            elif autoTestResult["final model"].startswith('Spatial Error'):
+                names = names + ["lambda"]
+                model = finalModel
+            summary = RUTILS.coefficientSummary(autoTestResult["final model"],
+                                                names, 
+                                                model.betas[:len(names)])
+
         #### Print model summary #### 
-        if finalModel:
+        if finalModel and self.diagnostics == "FULL":
             ARCPY.AddMessage("OLS diagnostics:")
             ARCPY.AddMessage(olsModel.summary)
             ARCPY.AddMessage("")
@@ -194,7 +193,7 @@ class AutoSpace_PySAL(object):
         self.olsModel = olsModel
         self.finalModel = finalModel
         
-    def createOutput(self, outputFC):
+    def createOutput(self, outputFC, outFormat = None):
 
         #### Build fields for output table ####
         self.templateDir = OS.path.dirname(SYS.argv[0])
@@ -211,7 +210,7 @@ class AutoSpace_PySAL(object):
                                                              self.oResid.ravel(),
                                                              alias = alias)
         if self.oPredy_e is not None: 
-            fieldOrder = FIELDNAMES
+            fieldOrder = FIELDNAMES if self.oE_Predy is not None else FIELDNAMES[0:3]
             alias = FIELDALIAS[2].format(self.depVarName)
             candidateFields[FIELDNAMES[2]] = SSDO.CandidateField(FIELDNAMES[2],
                                                                  "Double", 
@@ -224,9 +223,8 @@ class AutoSpace_PySAL(object):
                                                                  self.oE_Predy.ravel(),
                                                                  alias = alias)
 
-        self.ssdo.output2NewFC(outputFC, candidateFields, 
-                               appendFields = self.allVars,
-                               fieldOrder = fieldOrder)
+        BULK.output(self.ssdo, outputFC, candidateFields, fieldOrder,
+                    appendFields = self.allVars, outFormat = outFormat)
 
 if __name__ == '__main__':
     setupParameters()
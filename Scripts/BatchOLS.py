@@ -0,0 +1,232 @@
+"""
+Fits OLS with residual spatial diagnostics for many dependent variables and
+one or more sets of explanatory variables, loading the features and the
+weights once and writing every model to a single table.
+
+Each model is a spreg BaseOLS with White standard errors and the LM tests of
+spreg.diagnostics_sp on the weights as loaded, the same estimates as OLS.
+The weights trace of the LM tests is computed once for all models.
+"""
+
+import arcpy as ARCPY
+import numpy as NUM
+import spreg as SPREG
+import spreg.diagnostics as DIAG
+import spreg.diagnostics_sp as DIAGSP
+import SSUtilities as UTILS
+import RegressionUtils as RUTILS
+import BulkOutput as BULK
+
+#### Model Statistics Written per Model ####
+STATFIELDS = [("N", "n", "i4"), ("K", "k", "i4"), ("R2", "r2", "f8"),
+              ("ADJ_R2", "adjR2", "f8"), ("SIGMA2", "sig2", "f8"),
+              ("LM_ERR", "lmErr", "f8"), ("LM_ERR_P", "lmErrP", "f8"),
+              ("LM_LAG", "lmLag", "f8"), ("LM_LAG_P", "lmLagP", "f8"),
+              ("RLM_ERR", "rlmErr", "f8"), ("RLM_ERR_P", "rlmErrP", "f8"),
+              ("RLM_LAG", "rlmLag", "f8"), ("RLM_LAG_P", "rlmLagP", "f8"),
+              ("SARMA", "sarma", "f8"), ("SARMA_P", "sarmaP", "f8")]
+
+#### Coefficient Statistics Written per Explanatory Variable ####
+COEFFIELDS = [("B", "betas"), ("SE", "stdErr"), ("T", "tStat"),
+              ("P", "pValue")]
+
+#### LM Tests of spreg and Their Result Names ####
+LMTESTS = [(DIAGSP.lmErr, "lmErr"), (DIAGSP.lmLag, "lmLag"),
+           (DIAGSP.rlmErr, "rlmErr"), (DIAGSP.rlmLag, "rlmLag"),
+           (DIAGSP.lmSarma, "sarma")]
+
+class BatchCache(DIAGSP.spDcache):
+    """spDcache of one model that reads the weights trace shared by the
+    batch instead of computing it again.
+
+    INPUTS:
+    reg (obj): spreg regression
+    w (PySAL W): spatial weights
+    trace (float): T = tr[(W' + W)W]
+    """
+
+    def __init__(self, reg, w, trace):
+        DIAGSP.spDcache.__init__(self, reg, w)
+        self.trace = trace
+
+    @property
+    def t(self):
+        return self.trace
+
+def weightsTrace(w):
+    """Returns T = tr[(W' + W)W] of the LM tests, from the attached
+    WeightsStats if present.
+
+    INPUTS:
+    w (PySAL W): spatial weights
+
+    RETURN:
+    trace (float): T of the current transformation
+    """
+
+    stats = getattr(w, "stats", None)
+    if stats is not None:
+        return stats.trace
+    return DIAGSP.spDcache(None, w).t
+
+def fitModel(y, xc, w, trace):
+    """Fits OLS with White standard errors and computes the LM tests of
+    the residuals.
+
+    INPUTS:
+    y (array): n x 1 dependent variable
+    xc (array): n x k design matrix with the constant
+    w (PySAL W): spatial weights
+    trace (float): T = tr[(W' + W)W]
+
+    RETURN:
+    result (dict): name to value, with the keys of STATFIELDS and
+                   COEFFIELDS (arrays of k values for the latter)
+    """
+
+    ols = SPREG.BaseOLS(y, xc, robust = 'white')
+    tStats = NUM.array(DIAG.t_stat(ols))
+    result = {"betas": ols.betas.ravel(),
+              "stdErr": NUM.sqrt(ols.vm.diagonal()),
+              "tStat": tStats[:,0], "pValue": tStats[:,1],
+              "n": ols.n, "k": ols.k, "r2": DIAG.r2(ols),
+              "adjR2": DIAG.ar2(ols), "sig2": ols.sig2}
+
+    cache = BatchCache(ols, w, trace)
+    for test, key in LMTESTS:
+        result[key], result[key + "P"] = test(ols, w, cache)
+    return result
+
+class BatchOLS_PySAL(object):
+    """Computes OLS for several dependent variables and specifications
+    using PySAL.
+
+    INPUTS:
+    ssdo (obj): instance of SSDataObject
+    depVarNames (list): dependent variables
+    indVarNames (list): explanatory variables, or a list of such lists with
+                        one per specification
+    patW (obj): instance of PAT_W
+    """
+
+    def __init__(self, ssdo, depVarNames, indVarNames, patW):
+
+        #### Set Initial Attributes ####
+        UTILS.assignClassAttr(self, locals())
+
+        #### Initialize Data ####
+        self.initialize()
+
+        #### Calculate Statistic ####
+        self.calculate()
+
+    def initialize(self):
+        """Performs additional validation and loads every variable into a
+        single block."""
+
+        ARCPY.SetProgressor("default", ("Starting to perform batch OLS "
+                                        "regression. Loading features..."))
+
+        #### Shorthand Attributes ####
+        ssdo = self.ssdo
+
+        #### One or More Specifications ####
+        specs = self.indVarNames
+        if not specs or not isinstance(specs[0], (list, tuple)):
+            specs = [specs]
+        self.specs = [list(spec) for spec in specs]
+
+        #### Validate Each Specification Against Each Dependent Variable ####
+        for spec in self.specs:
+            for depVarName in self.depVarNames:
+                RUTILS.validateVariables(ssdo, depVarName, spec)
+
+        #### Explanatory Variables of Every Specification, in Order ####
+        self.allIndVars = []
+        for spec in self.specs:
+            for varName in spec:
+                if varName not in self.allIndVars:
+                    self.allIndVars.append(varName)
+
+        #### Load All y and X as One Block ####
+        fieldNames = self.depVarNames + self.allIndVars
+        block = RUTILS.designBlock(ssdo, fieldNames)
+        numDeps = len(self.depVarNames)
+        self.y = block[:,:numDeps]
+        self.x = block[:,numDeps:]
+        self.allVars = fieldNames
+        self.n = ssdo.numObs
+
+        #### Assure that Variance is Larger than Zero ####
+        yVar = NUM.var(self.y, axis = 0)
+        if NUM.isnan(yVar).any() or (yVar <= 0.0).any():
+            ARCPY.AddIDMessage("Error", 906)
+            raise SystemExit()
+
+        #### Resolve Weights ####
+        self.w = self.patW.w
+        self.wName = self.patW.wName
+
+    def calculate(self):
+        """Performs OLS and related diagnostics for every dependent
+        variable and specification."""
+
+        ARCPY.SetProgressor("default", "Executing batch OLS regression...")
+
+        trace = weightsTrace(self.w)
+        msg = ("{0} ({1}): R2 = {2:.4f}, LM Error = {3:.4f} (p = {4:.4f}), "
+               "LM Lag = {5:.4f} (p = {6:.4f})")
+
+        #### One Model per Dependent Variable and Specification ####
+        self.results = []
+        for specID, spec in enumerate(self.specs):
+            columns = [self.allIndVars.index(varName) for varName in spec]
+            xc = RUTILS.addConstant(self.x[:,columns])
+            for column, depVarName in enumerate(self.depVarNames):
+                result = fitModel(self.y[:,column:column + 1], xc, self.w,
+                                  trace)
+                self.results.append((depVarName, specID, result))
+                ARCPY.AddMessage(msg.format(depVarName, " + ".join(spec),
+                                            result["r2"], result["lmErr"],
+                                            result["lmErrP"],
+                                            result["lmLag"],
+                                            result["lmLagP"]))
+
+    def createOutput(self, outputTable, outFormat = None):
+        """Writes one row per model to a table, or to an NPZ, Parquet or CSV
+        file by the extension of outputTable.  Coefficients of variables
+        outside of the specification of a row are NaN."""
+
+        ARCPY.SetProgressor("default", "Writing batch OLS results...")
+
+        varNames = ["CONSTANT"] + self.allIndVars
+        specNames = [";".join(spec) for spec in self.specs]
+        dtype = [("DEPVAR", "U%d" % max([len(name) for name in \
+                                         self.depVarNames])),
+                 ("SPEC", "i4"),
+                 ("EXPVARS", "U%d" % max([len(name) for name in \
+                                          specNames]))]
+        for fieldName, key, fieldType in STATFIELDS:
+            dtype.append((fieldName, fieldType))
+        for prefix, key in COEFFIELDS:
+            for varName in varNames:
+                dtype.append((prefix + "_" + varName, "f8"))
+
+        table = NUM.empty(len(self.results), dtype = dtype)
+        for row, (depVarName, specID, result) in enumerate(self.results):
+            record = table[row]
+            record["DEPVAR"] = depVarName
+            record["SPEC"] = specID + 1
+            record["EXPVARS"] = specNames[specID]
+            for fieldName, key, fieldType in STATFIELDS:
+                record[fieldName] = result[key]
+            specVars = ["CONSTANT"] + self.specs[specID]
+            for prefix, key in COEFFIELDS:
+                for varName in varNames:
+                    record[prefix + "_" + varName] = NUM.nan
+                for varName, value in zip(specVars, result[key]):
+                    record[prefix + "_" + varName] = value
+
+        if BULK.outputFormat(outputTable, outFormat) == "FEATURECLASS":
+            outFormat = "TABLE"
+        BULK.writeArray(table, outputTable, outFormat)
@@ -0,0 +1,1168 @@
+"""
+Checks the results of the toolkit against PySAL and spreg, and fails when
+they differ.
+
+Every check builds a result with the toolkit and with the PySAL or spreg
+function it replaces (or with the slower path it shortcuts) on the sample
+data in Data/ca_counties or on generated points, and compares the two.
+Files are written to a scratch folder, which also holds the weights cache
+of the run.  Outside of ArcGIS the stand-ins in the Headless folder take
+the place of arcpy.
+
+    python BehaviorChecks.py
+    python BehaviorChecks.py --check text2Weights --check swm2Weights
+
+The exit status is 1 when a check fails.
+"""
+
+import os as OS
+import sys as SYS
+import time as TIME
+import io as IO
+import shutil as SHUTIL
+import argparse as ARG
+import tempfile as TEMP
+import traceback as TRACE
+import contextlib as CONTEXT
+
+SCRIPTDIR = OS.path.dirname(OS.path.abspath(__file__))
+HEADLESSDIR = OS.path.join(SCRIPTDIR, "Headless")
+DATADIR = OS.path.join(OS.path.dirname(SCRIPTDIR), "Data", "ca_counties")
+
+#### Sample Data ####
+SHAPEFILE = OS.path.join(DATADIR, "shapefiles", "ca_polygons.shp")
+WEIGHTSDIR = OS.path.join(DATADIR, "weights")
+GALFILE = OS.path.join(WEIGHTSDIR, "ca_queen.gal")
+GWTFILE = OS.path.join(WEIGHTSDIR, "ca_queen.gwt")
+SWMFILE = OS.path.join(WEIGHTSDIR, "ca_queen.swm")
+IDFIELD = "MYID"
+
+#### Relative Tolerance of Floating Point Comparisons ####
+TOLERANCE = 1e-7
+
+#### Scratch Folder of the Run (Set by main) ####
+SCRATCHDIR = None
+
+class CheckFailure(Exception):
+    """Raised when the toolkit and the reference disagree."""
+    pass
+
+def expect(condition, message):
+    """Fails the running check with message if condition is False."""
+
+    if not condition:
+        raise CheckFailure(message)
+
+def expectClose(actual, desired, label, tolerance = TOLERANCE):
+    """Fails the running check if two arrays are not equal within a
+    relative tolerance."""
+
+    import numpy as NUM
+    actual = NUM.asarray(actual, dtype = float)
+    desired = NUM.asarray(desired, dtype = float)
+    expect(actual.shape == desired.shape,
+           "{0}: shape {1} != {2}".format(label, actual.shape,
+                                         desired.shape))
+    scale = max(NUM.abs(desired).max() if desired.size else 0.0, 1.0)
+    diff = NUM.abs(actual - desired).max() if desired.size else 0.0
+    expect(diff <= tolerance * scale,
+           "{0}: differs by {1:.3g}".format(label, diff))
+
+def scratchPath(name):
+    """Returns a path in the scratch folder of the run."""
+
+    return OS.path.join(SCRATCHDIR, name)
+
+def weightsLinks(w):
+    """Returns the links of a PySAL W keyed on integer IDs.
+
+    INPUTS:
+    w (PySAL W): spatial weights
+
+    RETURN:
+    links (dict): (id, neighbor id) to weight
+    """
+
+    sparse = w.sparse.tocoo()
+    ids = [int(i) for i in w.id_order]
+    return dict(((ids[i], ids[j]), float(value)) for i, j, value in \
+                zip(sparse.row, sparse.col, sparse.data))
+
+def expectSameLinks(actual, desired, label, tolerance = TOLERANCE):
+    """Fails the running check if two weights (or link dicts) do not have
+    the same links and weights."""
+
+    if not isinstance(actual, dict):
+        actual = weightsLinks(actual)
+    if not isinstance(desired, dict):
+        desired = weightsLinks(desired)
+    missing = set(desired) - set(actual)
+    extra = set(actual) - set(desired)
+    expect(not missing and not extra,
+           "{0}: {1} links missing, {2} extra".format(label, len(missing),
+                                                     len(extra)))
+    keys = sorted(desired)
+    expectClose([actual[key] for key in keys],
+                [desired[key] for key in keys], label + " weights",
+                tolerance = tolerance)
+
+def sampleMaster2Order():
+    """Returns the master ID to order ID mapping of the sample data."""
+
+    import libpysal as LIBPYSAL
+    table = LIBPYSAL.io.open(SHAPEFILE[:-4] + ".dbf")
+    try:
+        return dict((int(masterID), order) for order, masterID in \
+                    enumerate(table.by_col(IDFIELD)))
+    finally:
+        table.close()
+
+def readReference(weightsFile):
+    """Reads a GAL or GWT file with PySAL."""
+
+    import libpysal as LIBPYSAL
+    reader = LIBPYSAL.io.open(weightsFile)
+    try:
+        return reader.read()
+    finally:
+        reader.close()
+
+def sampleData(fieldNames = None):
+    """Returns the SSDataObject of the sample data keyed on IDFIELD."""
+
+    import SSDataObject as SSDO
+    ssdo = SSDO.SSDataObject(SHAPEFILE)
+    ssdo.obtainData(IDFIELD, fieldNames or [])
+    return ssdo
+
+def everyOtherFeature():
+    """Returns the master ID to order ID mapping of every other feature of
+    the sample data, a selection of half the features."""
+
+    return dict((masterID, order) for masterID, order in \
+                sampleMaster2Order().items() if order % 2 == 0)
+
+def subsetLinks(links, selected):
+    """Keeps the links between selected features and divides the weights
+    of each row by their new sum.
+
+    INPUTS:
+    links (dict): (master ID, neighbor master ID) to weight
+    selected (dict): master ID to order ID of the selected features
+
+    RETURN:
+    subset (dict): (order ID, neighbor order ID) to weight
+    """
+
+    subset = dict((key, value) for key, value in links.items() \
+                  if key[0] in selected and key[1] in selected)
+    rowSums = {}
+    for (masterID, neighID), value in subset.items():
+        rowSums[masterID] = rowSums.get(masterID, 0.0) + value
+    return dict(((selected[i], selected[j]), value / rowSums[i]) \
+                for (i, j), value in subset.items())
+
+def randomPoints(numObs, seed):
+    """Returns numObs uniform random points in a 1000 x 1000 square."""
+
+    import numpy as NUM
+    return NUM.random.default_rng(seed).random((numObs, 2)) * 1000.0
+
+def errorModelData(side, lam, seed):
+    """Returns y, X and the row standardized rook weights of a side x side
+    lattice whose errors follow a spatial error process."""
+
+    import numpy as NUM
+    import scipy.sparse as SPARSE
+    import scipy.sparse.linalg as LINALG
+    import libpysal as LIBPYSAL
+
+    w = LIBPYSAL.weights.lat2W(side, side)
+    w.transform = "R"
+    rng = NUM.random.default_rng(seed)
+    x = rng.normal(size = (w.n, 2))
+    system = SPARSE.identity(w.n, format = "csc") - lam * w.sparse.tocsc()
+    errors = LINALG.spsolve(system, rng.normal(size = w.n))
+    y = (1.0 + x.dot([1.0, -0.5]) + errors).reshape(-1, 1)
+    return y, x, w
+
+def latticeKernel(side):
+    """Returns the triangular kernel weights of the HAC estimators on the
+    cell centers of a side x side lattice."""
+
+    import numpy as NUM
+    import libpysal as LIBPYSAL
+
+    coords = NUM.array([[i, j] for i in range(side) for j in range(side)],
+                       dtype = float)
+    return LIBPYSAL.weights.Kernel(coords, k = 5, function = "triangular",
+                                   fixed = True, diagonal = True)
+
+#### Checks ####
+
+def checkText2Weights():
+    """The bulk GAL and GWT parser gives the weights PySAL reads (GAL row
+    standardized), and the subset of a selection matches the
+    restandardized rows of the full weights."""
+
+    import pysal2ArcUtils as AUTILS
+
+    for weightsFile in [GALFILE, GWTFILE]:
+        desired = readReference(weightsFile)
+        if weightsFile.endswith(".gal"):
+            desired.transform = "r"
+        expectSameLinks(AUTILS.text2Weights(weightsFile), desired,
+                        OS.path.basename(weightsFile))
+
+    #### Every Other Feature Selected ####
+    selected = everyOtherFeature()
+    desired = subsetLinks(weightsLinks(readReference(GWTFILE)), selected)
+    w = AUTILS.text2Weights(GWTFILE, master2Order = selected)
+    expectSameLinks(w, desired, "ca_queen.gwt subset")
+    expect(w.n == len(selected),
+           "ca_queen.gwt subset: {0} rows for {1} features".format(
+           w.n, len(selected)))
+
+def checkWeightsCache():
+    """PAT_W stores the parsed weights and reads them back on the next run,
+    an edit of the file or another selection misses, and a full cache
+    evicts the least recently used entry."""
+
+    import numpy as NUM
+    import WeightsCache as WCACHE
+    import pysal2ArcUtils as AUTILS
+
+    ssdo = sampleData()
+    weightsFile = scratchPath("cache_queen.gal")
+    SHUTIL.copy(GALFILE, weightsFile)
+    key = WCACHE.cacheKey(weightsFile, ssdo.master2Order)
+    expect(WCACHE.loadArrays(key) is None, "entry found before the first read")
+    cold = AUTILS.PAT_W(ssdo, weightsFile).w
+    expect(WCACHE.loadArrays(key) is not None, "parsed weights not stored")
+    warm = AUTILS.PAT_W(ssdo, weightsFile).w
+    expectSameLinks(warm, cold, "warm read")
+    expect(warm.transform == cold.transform,
+           "warm read transform {0} != {1}".format(warm.transform,
+                                                   cold.transform))
+
+    #### An Edit of the File or Another Selection Misses ####
+    stat = OS.stat(weightsFile)
+    OS.utime(weightsFile, ns = (stat.st_atime_ns,
+                                stat.st_mtime_ns + 10**9))
+    editKey = WCACHE.cacheKey(weightsFile, ssdo.master2Order)
+    expect(editKey != key and WCACHE.loadArrays(editKey) is None,
+           "edited weights file served from the cache")
+    selected = dict((masterID, order) for masterID, order in \
+                    ssdo.master2Order.items() if order < ssdo.numObs // 2)
+    expect(WCACHE.cacheKey(weightsFile, selected) != editKey,
+           "selection shares the cache key of the full dataset")
+
+    #### Room for Two Entries: the Least Recently Used Goes ####
+    cacheDir = scratchPath("lru")
+    arrays = AUTILS.weights2Arrays(cold)
+    for name in ["a", "b"]:
+        WCACHE.storeArrays(name, arrays, cacheDir = cacheDir)
+    past = TIME.time() - 100.0
+    OS.utime(WCACHE.cachePath("a", cacheDir), (past, past))
+    OS.utime(WCACHE.cachePath("b", cacheDir), (past + 10.0, past + 10.0))
+    WCACHE.loadArrays("a", cacheDir = cacheDir)
+    entry = dict(arrays, varName = NUM.array(arrays["varName"] or ""),
+                 transform = NUM.array(arrays["transform"]))
+    entryBytes = sum([NUM.asarray(value).nbytes \
+                      for value in entry.values()])
+    fileBytes = OS.path.getsize(WCACHE.cachePath("a", cacheDir))
+    WCACHE.storeArrays("c", arrays, cacheDir = cacheDir,
+                       maxBytes = entryBytes + fileBytes + fileBytes // 2)
+    kept = [name for name in ["a", "b", "c"] \
+            if OS.path.isfile(WCACHE.cachePath(name, cacheDir))]
+    expect(kept == ["a", "c"], "entries kept {0}, expected a and c".format(
+                               ", ".join(kept)))
+
+def checkSWM2Weights():
+    """The memory-mapped SWM reader decodes the same records as the
+    per-entry reader, and swm2Weights gives the row standardized queen
+    weights of the GAL file, restandardized on a selection."""
+
+    import numpy as NUM
+    import pysal2ArcUtils as AUTILS
+
+    mapped = AUTILS.readSWMArrays(SWMFILE)
+    expect(mapped is not None, "memory map reader rejected the SWM file")
+    entries = AUTILS.readSWMEntries(SWMFILE)
+    for key in ["masterField", "numObs", "rowStandard"]:
+        expect(mapped[0][key] == entries[0][key],
+               "{0}: {1} != {2}".format(key, mapped[0][key],
+                                        entries[0][key]))
+    names = ["masterIDs", "numNeighs", "neighIDs", "weights",
+             "sumUnstandard"]
+    for name, actual, desired in zip(names, mapped[1:], entries[1:]):
+        expect(NUM.array_equal(actual, desired),
+               "{0} differ from the per-entry reader".format(name))
+
+    reference = readReference(GALFILE)
+    reference.transform = "r"
+    desired = weightsLinks(reference)
+    expectSameLinks(AUTILS.swm2Weights(SWMFILE), desired, "ca_queen.swm")
+
+    selected = everyOtherFeature()
+    w = AUTILS.swm2Weights(SWMFILE, master2Order = selected)
+    expectSameLinks(w, subsetLinks(desired, selected), "ca_queen.swm subset")
+
+def checkSparseW():
+    """SparseW has the neighbors, weights, transformations and statistics of
+    the PySAL W with the same links, and spreg fits a model on it without
+    building the neighbor lists."""
+
+    import numpy as NUM
+    import spreg as SPREG
+    import pysal2ArcUtils as AUTILS
+
+    desired = readReference(GWTFILE)
+    sparse = desired.sparse
+    ids = NUM.array(desired.id_order)
+    w = AUTILS.SparseW(sparse, ids)
+    for transform in ["O", "B", "R", "D", "V"]:
+        #### Fresh W: PySAL Scales D by the s0 of the Prior Transform ####
+        desired = readReference(GWTFILE)
+        w.transform = transform
+        desired.transform = transform
+        label = "transform " + transform
+        expectSameLinks(w, desired, label)
+        for name in ["s0", "s1", "trcW2", "trcWtW", "trcWtW_WW"]:
+            expectClose(getattr(w, name), getattr(desired, name),
+                        "{0} {1}".format(label, name))
+
+    #### spreg Model on the Arrays Only ####
+    w = AUTILS.SparseW(sparse, ids)
+    w.transform = "R"
+    desired.transform = "R"
+    rng = NUM.random.default_rng(0)
+    x = rng.normal(size = (w.n, 2))
+    y = x.dot([[1.0], [-0.5]]) + rng.normal(size = (w.n, 1))
+    actual = SPREG.OLS(y, x, w = w, spat_diag = True)
+    reference = SPREG.OLS(y, x, w = desired, spat_diag = True)
+    expectClose(actual.betas, reference.betas, "OLS betas")
+    expectClose(actual.lm_error, reference.lm_error, "OLS LM error")
+    expectClose(actual.lm_lag, reference.lm_lag, "OLS LM lag")
+    expect(w._neighbors is None, "spreg built the neighbor lists")
+
+def checkSubsetWeights():
+    """Masking the CSR structure of weights in master ID space gives the
+    dense submatrix of the selected features in order ID order, with the
+    rows renormalized when asked."""
+
+    import numpy as NUM
+    import scipy.sparse as SPARSE
+    import pysal2ArcUtils as AUTILS
+
+    rng = NUM.random.default_rng(1)
+    numObs = 200
+    dense = rng.random((numObs, numObs))
+    dense[rng.random((numObs, numObs)) > 0.05] = 0.0
+    NUM.fill_diagonal(dense, 0.0)
+    orderIDs = rng.permutation(numObs).astype(NUM.int64)
+    found = rng.random(numObs) < 0.6
+    extraID = numObs
+
+    keep = NUM.flatnonzero(found)
+    keep = keep[NUM.argsort(orderIDs[keep])]
+    for restandardize in [False, True]:
+        sub = dense[NUM.ix_(keep, keep)]
+        if restandardize:
+            rowSums = sub.sum(axis = 1)
+            sub[rowSums > 0] /= rowSums[rowSums > 0, None]
+        sparse, ids = AUTILS.subsetWeights(SPARSE.csr_matrix(dense),
+                                           orderIDs, found,
+                                           restandardize = restandardize,
+                                           extraIDs = NUM.array([extraID]))
+        label = "restandardized" if restandardize else "masked"
+        expect(NUM.array_equal(ids, NUM.append(NUM.sort(orderIDs[found]),
+                                               extraID)),
+               "{0}: row ids differ".format(label))
+        actual = sparse.toarray()
+        expectClose(actual[:-1,:-1], sub, label)
+        expect(not actual[-1].any() and not actual[:,-1].any(),
+               "{0}: links to the extra id".format(label))
+
+def checkWeightsFileInfo():
+    """The header index reads the ID field and the number of features of
+    every weights format, serves repeated calls from one parse and reads a
+    changed file again."""
+
+    import pysal2ArcUtils as AUTILS
+
+    for weightsFile in [GALFILE, GWTFILE, SWMFILE]:
+        info = AUTILS.getWeightsFileInfo(weightsFile)
+        label = OS.path.basename(weightsFile)
+        expect(info.idField == IDFIELD and info.numObs == 58,
+               "{0}: ID field {1}, {2} features".format(label, info.idField,
+                                                        info.numObs))
+        expect(AUTILS.getWeightsFileInfo(weightsFile) is info,
+               "{0}: header read again".format(label))
+    expect(AUTILS.getWeightsFileInfo(SWMFILE).rowStandard is True,
+           "ca_queen.swm: not row standardized")
+    expect(not AUTILS.isNewGalFormat(GALFILE),
+           "ca_queen.gal: multi-item header taken as the new GAL format")
+
+    #### A Rewritten Header Is Read Again ####
+    weightsFile = scratchPath("info_queen.gal")
+    SHUTIL.copy(GALFILE, weightsFile)
+    expect(AUTILS.getIDFieldFromWeights(weightsFile) == IDFIELD,
+           "copied header: wrong ID field")
+    fi = open(GALFILE, "r")
+    lines = fi.readlines()
+    fi.close()
+    lines[0] = "0 58 COUNTYID UNKNOWN\n"
+    fo = open(weightsFile, "w")
+    fo.writelines(lines)
+    fo.close()
+    stat = OS.stat(weightsFile)
+    OS.utime(weightsFile, ns = (stat.st_atime_ns,
+                                stat.st_mtime_ns + 10**9))
+    expect(AUTILS.getIDFieldFromWeights(weightsFile) == "COUNTYID",
+           "changed header served from the index")
+
+def checkThreshold():
+    """The default threshold of the distance dialog is the minimum distance
+    of PySAL that leaves no island, and the projected link count is that of
+    the distance band when every point is sampled."""
+
+    import libpysal as LIBPYSAL
+    import DistanceUtils as DUTILS
+
+    xyCoords = randomPoints(2000, 2)
+    threshold, numLinks = DUTILS.estimateThreshold(xyCoords)
+    desired = LIBPYSAL.weights.min_threshold_distance(xyCoords)
+    expectClose(threshold, desired, "threshold", tolerance = 1e-6)
+    expect(threshold >= desired, "threshold below the PySAL minimum")
+    band = LIBPYSAL.weights.DistanceBand(xyCoords, threshold,
+                                         silence_warnings = True)
+    expect(not band.islands, "{0} islands".format(len(band.islands)))
+    expect(numLinks == band.nonzero,
+           "{0} links projected, {1} built".format(numLinks, band.nonzero))
+
+def checkExtractPoints():
+    """The bulk point read gives the centroids PySAL reads with the IDs of
+    the ID field, reuses them until the dataset changes on disk and samples
+    points in their original order."""
+
+    import numpy as NUM
+    import libpysal as LIBPYSAL
+    import DistanceUtils as DUTILS
+
+    inputFC = scratchPath("points.shp")
+    base = SHAPEFILE[:-4]
+    for ext in [".shp", ".shx", ".dbf"]:
+        SHUTIL.copy(base + ext, inputFC[:-4] + ext)
+
+    ids, xyCoords = DUTILS.extractPoints(inputFC, IDFIELD)
+    shapes = LIBPYSAL.io.open(inputFC)
+    desired = NUM.array([shape.centroid for shape in shapes])
+    shapes.close()
+    expectClose(xyCoords, desired, "centroids")
+    master2Order = sampleMaster2Order()
+    expect([master2Order[int(masterID)] for masterID in ids] == \
+           list(range(len(ids))), "IDs not in feature order")
+
+    cachedIDs, cachedCoords = DUTILS.extractPoints(inputFC, IDFIELD)
+    expect(cachedCoords is xyCoords, "unchanged dataset read again")
+
+    #### An Edit of the Attribute Table Invalidates the Points ####
+    dbfFile = inputFC[:-4] + ".dbf"
+    stat = OS.stat(dbfFile)
+    OS.utime(dbfFile, ns = (stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    editIDs, editCoords = DUTILS.extractPoints(inputFC, IDFIELD)
+    expect(editCoords is not xyCoords, "edited dataset served from the cache")
+    expectClose(editCoords, desired, "centroids after the edit")
+
+    #### Random Sample Keeps the Original Order ####
+    sampleIDs, sampleCoords = DUTILS.extractPoints(inputFC, IDFIELD,
+                                                   sampleSize = 20)
+    positions = NUM.array([master2Order[int(masterID)] for masterID in \
+                           sampleIDs])
+    expect(len(sampleIDs) == 20 and (NUM.diff(positions) > 0).all(),
+           "sample of {0} points out of order".format(len(sampleIDs)))
+    expectClose(sampleCoords, xyCoords[positions], "sampled centroids")
+
+def checkFindNeighbors():
+    """The tiled process pool search finds the links of the serial search,
+    which are the links of PySAL KNN and DistanceBand."""
+
+    import numpy as NUM
+    import libpysal as LIBPYSAL
+    import NeighborUtils as NUTILS
+
+    xyCoords = randomPoints(3000, 3)
+    threshold = 40.0
+    references = [(4, None, LIBPYSAL.weights.KNN(xyCoords, k = 4)),
+                  (None, threshold,
+                   LIBPYSAL.weights.DistanceBand(xyCoords, threshold,
+                                                 silence_warnings = True))]
+
+    #### Tile Even the Small Input Across the Workers ####
+    minPoints = NUTILS.PARALLELMINPOINTS
+    NUTILS.PARALLELMINPOINTS = 0
+    try:
+        for k, threshold, reference in references:
+            label = "KNN" if k else "distance band"
+            desired = weightsLinks(reference)
+            results = []
+            for numWorkers in [1, 2]:
+                found = NUTILS.findNeighbors(xyCoords, k = k,
+                                             threshold = threshold,
+                                             numWorkers = numWorkers)
+                rows, neighs, dists = found
+                expect((NUM.diff(rows) >= 0).all(),
+                       "{0}: rows out of order".format(label))
+                expectClose(dists, NUM.hypot(*(xyCoords[rows] -
+                                               xyCoords[neighs]).T),
+                            label + " distances")
+                links = dict(((int(i), int(j)), 1.0) for i, j in \
+                             zip(rows, neighs))
+                expectSameLinks(links, desired, label)
+                results.append((rows, neighs))
+            expect(all(NUM.array_equal(a, b) for a, b in \
+                       zip(results[0], results[1])),
+                   "{0}: parallel order differs from serial".format(label))
+    finally:
+        NUTILS.PARALLELMINPOINTS = minPoints
+
+def checkIterBandRows():
+    """Streaming the distance band in blocks far smaller than the data
+    yields the rows of PySAL DistanceBand in id order, and the GAL file
+    written from the stream reads back as those weights."""
+
+    import numpy as NUM
+    import libpysal as LIBPYSAL
+    import NeighborUtils as NUTILS
+    import pysal2ArcUtils as AUTILS
+
+    xyCoords = randomPoints(3000, 4)
+    threshold = 40.0
+    ids = NUM.random.default_rng(4).permutation(len(xyCoords)) + 1000
+    reference = LIBPYSAL.weights.DistanceBand(xyCoords, threshold,
+                                              ids = ids.tolist(),
+                                              silence_warnings = True)
+    desired = weightsLinks(reference)
+
+    #### About Fifty Points per Block ####
+    maxBytes = 50 * NUTILS.LINKBYTES * reference.mean_neighbors
+    rows = list(NUTILS.iterBandRows(xyCoords, ids, threshold,
+                                    maxBytes = maxBytes))
+    rowIDs = [rowID for rowID, neighbors, weights in rows]
+    expect(rowIDs == sorted(ids.tolist()), "rows not in id order")
+    expect(all(neighbors == sorted(neighbors) for rowID, neighbors, \
+               weights in rows), "neighbors not in id order")
+    links = dict(((rowID, neighID), weight) for rowID, neighbors, weights \
+                 in rows for neighID, weight in zip(neighbors, weights))
+    expectSameLinks(links, desired, "streamed rows")
+
+    galFile = scratchPath("band.gal")
+    AUTILS.writeGALRows(iter(rows), galFile, "%s\n" % len(rows))
+    expectSameLinks(readReference(galFile), desired, "streamed GAL file")
+
+def checkHigherOrder():
+    """The breadth-first expansion finds the order-k ring of PySAL
+    higher_order, and every order up to k when cumulative."""
+
+    import libpysal as LIBPYSAL
+    import ContiguityUtils as CUTILS
+
+    queen = LIBPYSAL.weights.Queen.from_shapefile(SHAPEFILE)
+    ids = [int(i) for i in queen.id_order]
+    for order in [2, 3, 5]:
+        for cumulative in [False, True]:
+            ring = CUTILS.higherOrder(queen.sparse, order,
+                                      cumulative = cumulative)
+            desired = LIBPYSAL.weights.higher_order(queen, order,
+                                                    lower_order = cumulative,
+                                                    silence_warnings = True)
+            coo = ring.tocoo()
+            links = dict(((ids[i], ids[j]), value) for i, j, value in \
+                         zip(coo.row, coo.col, coo.data))
+            expectSameLinks(links, desired, "order {0}{1}".format(order,
+                            " cumulative" if cumulative else ""))
+
+def checkContiguity():
+    """Hashing shared vertices and edges gives the queen and rook neighbors
+    PySAL finds in the shapefile, keyed on the ID field."""
+
+    import libpysal as LIBPYSAL
+    import ContiguityUtils as CUTILS
+
+    contiguity = [("QUEEN", LIBPYSAL.weights.Queen),
+                  ("ROOK", LIBPYSAL.weights.Rook)]
+    neighborDicts = CUTILS.polygonNeighborDict(SHAPEFILE, IDFIELD,
+                                               [cType for cType, weights \
+                                                in contiguity])
+    for cType, weights in contiguity:
+        desired = weights.from_shapefile(SHAPEFILE, idVariable = IDFIELD)
+        neighborDict = neighborDicts[cType]
+        expect(sorted(neighborDict) == sorted(desired.neighbors),
+               "{0}: features differ".format(cType.lower()))
+        links = dict(((int(i), int(j)), 1.0) for i in neighborDict \
+                     for j in neighborDict[i])
+        expectSameLinks(links, desired, cType.lower())
+
+def checkTiledKeyPairs():
+    """Hashing tile by tile in worker processes and reconciling the seams
+    finds the pairs of the single pass, for a generated lattice whose
+    shared vertices and edges cross every seam."""
+
+    import numpy as NUM
+    import NeighborUtils as NUTILS
+    import ContiguityUtils as CUTILS
+
+    #### 40 x 40 Lattice of Unit Squares, One Ring Each ####
+    side = 40
+    corners = NUM.array([[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]])
+    cells = NUM.array([[col, row] for row in range(side) \
+                       for col in range(side)])
+    xyCoords = (cells[:,None,:] + corners[None,:,:]).reshape(-1, 2)
+    shapeIDs = NUM.repeat(NUM.arange(len(cells)), len(corners))
+    vertexKeys = CUTILS.quantize(xyCoords.astype(float))
+
+    minPoints = NUTILS.PARALLELMINPOINTS
+    NUTILS.PARALLELMINPOINTS = 0
+    try:
+        for cType, numPairs in [("QUEEN", 2 * (side - 1) * (2 * side - 1)),
+                                ("ROOK", 2 * side * (side - 1))]:
+            keys, keyShapes = CUTILS.hashKeys(vertexKeys, shapeIDs,
+                                              shapeIDs, cType)
+            desired = CUTILS.sharedKeyPairs(keys, keyShapes)
+            expect(len(desired) == numPairs,
+                   "{0}: {1} pairs, expected {2}".format(cType.lower(),
+                                                         len(desired),
+                                                         numPairs))
+            pairs = CUTILS.tiledKeyPairs(keys, keyShapes, numWorkers = 2)
+            expect(NUM.array_equal(pairs, desired),
+                   "{0}: tiled pairs differ".format(cType.lower()))
+    finally:
+        NUTILS.PARALLELMINPOINTS = minPoints
+
+def checkKernel():
+    """The KD-tree kernel gives the weights of PySAL Kernel for every kernel
+    function, and a second build of the same kernel is served from the
+    session memo."""
+
+    import libpysal as LIBPYSAL
+    import KernelUtils as KUTILS
+
+    xyCoords = randomPoints(500, 5)
+    for kernelType in KUTILS.KERNELTYPES:
+        desired = LIBPYSAL.weights.Kernel(xyCoords, k = 6,
+                                          function = kernelType.lower(),
+                                          fixed = True, diagonal = True)
+        w = KUTILS.buildKernel(xyCoords, kernelType, 6, fixed = True,
+                               diagonal = True, useCache = False)
+        expect(isinstance(w, LIBPYSAL.weights.Kernel),
+               "{0}: not a PySAL Kernel".format(kernelType.lower()))
+        expectSameLinks(w, desired, kernelType.lower())
+
+    #### Memo Hit Returns the Same Weights in a Fresh Object ####
+    KUTILS.KERNELCACHE.clear()
+    first = KUTILS.buildKernel(xyCoords, "QUARTIC", 6, diagonal = True)
+    key = KUTILS.kernelKey(xyCoords, "QUARTIC", 6, True, True)
+    expect(key in KUTILS.KERNELCACHE, "kernel not memoized")
+    first.transform = "R"
+    second = KUTILS.buildKernel(xyCoords, "QUARTIC", 6, diagonal = True)
+    expect(second is not first and second.transform == "O",
+           "memo hit shares the transformed kernel")
+    first.transform = "O"
+    expectSameLinks(second, first, "memoized kernel")
+
+def checkAdaptiveKernel():
+    """The adaptive kernel gives the weights of PySAL Kernel with a
+    bandwidth per feature, and capping the links keeps the nearest links of
+    each row with the weights of the uncapped kernel."""
+
+    import numpy as NUM
+    import libpysal as LIBPYSAL
+    import KernelUtils as KUTILS
+
+    xyCoords = randomPoints(500, 6)
+    for kernelType in ["TRIANGULAR", "GAUSSIAN"]:
+        desired = LIBPYSAL.weights.Kernel(xyCoords, k = 8,
+                                          function = kernelType.lower(),
+                                          fixed = False, diagonal = True)
+        w = KUTILS.buildKernel(xyCoords, kernelType, 8, fixed = False,
+                               diagonal = True, useCache = False)
+        expectSameLinks(w, desired, "adaptive " + kernelType.lower())
+
+    #### Capped Rows Are the Nearest Links of the Full Rows ####
+    maxLinks = 4
+    for fixed in [True, False]:
+        label = "capped {0}".format("fixed" if fixed else "adaptive")
+        full = KUTILS.buildKernel(xyCoords, "QUADRATIC", 8, fixed = fixed,
+                                  useCache = False)
+        capped = KUTILS.buildKernel(xyCoords, "QUADRATIC", 8, fixed = fixed,
+                                    useCache = False, maxLinks = maxLinks)
+        counts = NUM.diff(capped.indptr)
+        expect(counts.max() <= maxLinks + 1,
+               "{0}: {1} links in a row".format(label, counts.max()))
+        fullLinks = weightsLinks(full)
+        cappedLinks = weightsLinks(capped)
+        expect(set(cappedLinks) <= set(fullLinks),
+               "{0}: links outside the bandwidth".format(label))
+        keys = sorted(cappedLinks)
+        expectClose([cappedLinks[key] for key in keys],
+                    [fullLinks[key] for key in keys], label + " weights")
+
+        #### Farthest Kept Link Within the Nearest Dropped Link ####
+        kept, dropped = {}, {}
+        for key in fullLinks:
+            dist = NUM.hypot(*(xyCoords[key[0]] - xyCoords[key[1]]))
+            if key in cappedLinks:
+                kept[key[0]] = max(kept.get(key[0], 0.0), dist)
+            else:
+                dropped[key[0]] = min(dropped.get(key[0], NUM.inf), dist)
+        expect(all(kept[row] <= dist for row, dist in dropped.items()),
+               "{0}: a nearer link was dropped".format(label))
+
+def checkDesignBlock():
+    """The design block holds the field values in one column-major array,
+    float fields become views of it, and fields of another type (or every
+    field of a float32 block) keep their own array and values."""
+
+    import numpy as NUM
+    import RegressionUtils as RUTILS
+
+    fieldNames = ["GROWTH", "LOGPCR69", "POP1969", "PERCVACANT"]
+    for dtype in [NUM.float64, NUM.float32]:
+        label = NUM.dtype(dtype).name
+        ssdo = sampleData(fieldNames)
+        fields = [ssdo.fields[fieldName] for fieldName in fieldNames]
+        originals = [field.data for field in fields]
+        copies = [field.data.copy() for field in fields]
+        block = RUTILS.designBlock(ssdo, fieldNames, dtype = dtype)
+        expect(block.dtype == dtype and block.flags.f_contiguous,
+               "{0}: block is {1}, not column-major".format(label,
+                                                          block.dtype))
+        expectClose(block, NUM.column_stack(copies), label + " block",
+                    tolerance = 1e-6 if dtype == NUM.float32 else TOLERANCE)
+        for column, field in enumerate(fields):
+            name = "{0} {1}".format(label, field.name)
+            expect(NUM.array_equal(field.data, copies[column]),
+                   name + ": field values changed")
+            isView = NUM.shares_memory(field.data, block)
+            expect(isView == (originals[column].dtype == dtype),
+                   name + (": kept its own array" if not isView else
+                           ": {0} field is a view of the block".format(
+                           originals[column].dtype)))
+
+    #### y and X Are Views of One Block ####
+    ssdo = sampleData(fieldNames)
+    y, x = RUTILS.loadDesign(ssdo, "GROWTH", ["LOGPCR69", "PERCVACANT"])
+    expect(y.shape == (ssdo.numObs, 1) and x.shape == (ssdo.numObs, 2),
+           "design shapes {0} and {1}".format(y.shape, x.shape))
+    expect(y.base is not None and y.base is x.base,
+           "y and X do not share a block")
+
+def checkBatchOLS():
+    """Every model of the batch has the estimates and LM tests of spreg OLS
+    with White standard errors, on text and SWM weights, and the output
+    leaves the coefficients outside a specification empty."""
+
+    import numpy as NUM
+    import spreg as SPREG
+    import pysal2ArcUtils as AUTILS
+    import BatchOLS as BATCH
+
+    depVarNames = ["GROWTH", "PERCVACANT"]
+    specs = [["LOGPCR69", "PERCPOV69"], ["LOGPCR69"]]
+    for weightsFile in [GWTFILE, SWMFILE]:
+        ssdo = sampleData(depVarNames + specs[0])
+        patW = AUTILS.PAT_W(ssdo, weightsFile)
+        batch = BATCH.BatchOLS_PySAL(ssdo, depVarNames, specs, patW)
+        expect(len(batch.results) == len(depVarNames) * len(specs),
+               "{0} models fit".format(len(batch.results)))
+        for depVarName, specID, result in batch.results:
+            label = "{0} {1} ~ {2}".format(OS.path.basename(weightsFile),
+                                           depVarName,
+                                           " + ".join(specs[specID]))
+            y = ssdo.fields[depVarName].data.reshape(-1, 1)
+            x = NUM.column_stack([ssdo.fields[varName].data for varName \
+                                  in specs[specID]])
+            ols = SPREG.OLS(y, x, w = patW.w, spat_diag = True,
+                            robust = "white")
+            desired = {"betas": ols.betas.ravel(), "stdErr": ols.std_err,
+                       "pValue": NUM.array(ols.t_stat)[:,1], "r2": ols.r2,
+                       "adjR2": ols.ar2, "lmErr": ols.lm_error[0],
+                       "lmLag": ols.lm_lag[0], "rlmErr": ols.rlm_error[0],
+                       "rlmLag": ols.rlm_lag[0], "sarma": ols.lm_sarma[0]}
+            for key, value in desired.items():
+                expectClose(result[key], value, "{0} {1}".format(label, key))
+
+    #### One Row per Model, NaN Outside the Specification ####
+    outputFile = scratchPath("batch.npz")
+    batch.createOutput(outputFile)
+    table = NUM.load(outputFile)
+    expect(list(table["SPEC"]) == [1, 1, 2, 2],
+           "output specifications {0}".format(list(table["SPEC"])))
+    expect(NUM.isnan(table["B_PERCPOV69"][2:]).all() and \
+           not NUM.isnan(table["B_PERCPOV69"][:2]).any(),
+           "coefficients outside the specification are not empty")
+    expectClose(table["B_LOGPCR69"],
+                [result["betas"][1] for depVarName, specID, result in \
+                 batch.results], "output coefficients")
+
+def checkSpeculative():
+    """Fitting the likely candidates in worker processes while the OLS runs
+    chooses and returns the model of the sequential search."""
+
+    import pysal2ArcUtils as AUTILS
+
+    y, x, w = errorModelData(15, 0.6, 7)
+    gwk = latticeKernel(15)
+    for combo in [False, True]:
+        desired = AUTILS.autospace(y, x, w, gwk, combo = combo)
+        actual = AUTILS.autospace(y, x, w, gwk, combo = combo,
+                                  speculative = True, numWorkers = 2)
+        label = "combo" if combo else "HAC"
+        expect(desired["final model"].startswith("Spatial Error"),
+               "{0}: sequential search chose {1}".format(label,
+                                                desired["final model"]))
+        expect(actual["final model"] == desired["final model"],
+               "{0}: chose {1}, not {2}".format(label, actual["final model"],
+                                               desired["final model"]))
+        expectClose(actual["regression2"].betas,
+                    desired["regression2"].betas, label + " betas")
+        expectClose(actual["regression2"].std_err,
+                    desired["regression2"].std_err, label + " std errors")
+
+def checkWeightsStats():
+    """The statistics of every transformation are those of the PySAL W,
+    the trace is the T of the spreg LM tests, and a later run on the same
+    weights file reads them back instead of computing them."""
+
+    import spreg.diagnostics_sp as DIAGSP
+    import pysal2ArcUtils as AUTILS
+    import WeightsStats as WSTATS
+
+    names = ["s0", "s1", "diagW2", "diagWtW", "diagWtW_WW", "trcW2",
+             "trcWtW", "trcWtW_WW"]
+    for transform in ["O", "R", "B"]:
+        desired = readReference(GWTFILE)
+        desired.transform = transform
+        stats = WSTATS.computeStats(desired.sparse)
+        for name in names:
+            expectClose(stats[name], getattr(desired, name),
+                        "{0} {1}".format(transform, name))
+
+    #### Shared by the LM Tests and Stored With the Weights ####
+    weightsFile = scratchPath("stats_queen.gwt")
+    SHUTIL.copy(GWTFILE, weightsFile)
+    ssdo = sampleData()
+    patW = AUTILS.PAT_W(ssdo, weightsFile)
+    patW.w.transform = "R"
+    reference = readReference(GWTFILE)
+    reference.transform = "R"
+    expectClose(patW.stats.trace, DIAGSP.spDcache(None, reference).t,
+                "LM trace")
+    trace = patW.stats.trace
+
+    computeStats = WSTATS.computeStats
+    def recompute(sparse):
+        raise CheckFailure("statistics computed again on a cached run")
+    WSTATS.computeStats = recompute
+    try:
+        warm = AUTILS.PAT_W(ssdo, weightsFile)
+        warm.w.transform = "R"
+        expectClose(warm.stats.trace, trace, "cached trace")
+        expectClose(warm.w.s1, reference.s1, "cached s1")
+    finally:
+        WSTATS.computeStats = computeStats
+
+def checkLogDet():
+    """The lag and error models match spreg ML_Lag and ML_Error with the
+    full log-determinant, exactly with the LU method and closely with the
+    approximations, whose standard errors come from estimated traces."""
+
+    import numpy as NUM
+    import scipy.sparse as SPARSE
+    import scipy.sparse.linalg as LINALG
+    import spreg as SPREG
+    import MLUtils as MLUTILS
+
+    y, x, w = errorModelData(15, 0.6, 7)
+    system = SPARSE.identity(w.n, format = "csc") - 0.5 * w.sparse.tocsc()
+    rng = NUM.random.default_rng(8)
+    yLag = LINALG.spsolve(system, 1.0 + x.dot([1.0, -0.5]) +
+                          rng.normal(size = w.n)).reshape(-1, 1)
+
+    models = [("lag", yLag, MLUTILS.ML_Lag, SPREG.ML_Lag),
+              ("error", y, MLUTILS.ML_Error, SPREG.ML_Error)]
+    for label, depVar, model, reference in models:
+        desired = reference(depVar, x, w = w, method = "full")
+        for method in MLUTILS.LOGDETMETHODS:
+            name = "{0} {1}".format(label, method)
+            exact = method == "LU"
+            actual = model(depVar, x, w, method = method)
+            expectClose(actual.betas, desired.betas, name + " betas",
+                        tolerance = 1e-6 if exact else 1e-2)
+            expectClose(actual.logll, desired.logll, name + " logll",
+                        tolerance = 1e-6 if exact else 1e-3)
+            ratio = NUM.sqrt(actual.vm.diagonal()) / desired.std_err
+            expectClose(ratio, NUM.ones(len(ratio)), name + " std errors",
+                        tolerance = 0.05)
+
+def checkReducedForm():
+    """The power series and the sparse solve give (I - rho W)^-1 X of a
+    dense inverse, the series falling back on the solve when it diverges,
+    and the lag model has the estimates and predictions of spreg GM_Lag."""
+
+    import numpy as NUM
+    import spreg as SPREG
+    import RegressionUtils as RUTILS
+
+    y, x, w = errorModelData(15, 0.5, 9)
+    rng = NUM.random.default_rng(9)
+    data = rng.normal(size = (w.n, 3))
+    for transform, rho in [("R", 0.5), ("R", -0.7), ("R", 0.95),
+                           ("B", 0.3)]:
+        w.transform = transform
+        dense = NUM.identity(w.n) - rho * w.full()[0]
+        desired = NUM.linalg.solve(dense, data)
+        for method in ["SERIES", "SOLVE"]:
+            actual = RUTILS.reducedForm(w, data, rho, method)
+            expectClose(actual, desired, "{0} {1} rho {2}".format(method,
+                        transform, rho), tolerance = 1e-8)
+
+    #### Lag Model Without the Power Series of spreg ####
+    w.transform = "R"
+    desired = SPREG.GM_Lag(y, x, w = w, robust = "white")
+    for method in ["SERIES", "SOLVE"]:
+        lag = RUTILS.fitGMLag(y, x, w, robust = "white",
+                              reducedForm = method)
+        for name in ["betas", "vm", "predy", "predy_e", "e_pred"]:
+            expectClose(getattr(lag, name), getattr(desired, name),
+                        "{0} {1}".format(method, name), tolerance = 1e-6)
+        expectClose([lag.ak_test.ak, lag.ak_test.p], desired.ak_test,
+                    method + " Anselin-Kelejian test")
+
+def checkDiagnosticLevels():
+    """The spreg base classes fit below FULL give the estimates of the full
+    spreg models, the OLS that drives the model search has the tests of
+    spreg OLS, and the search chooses the same model at every level."""
+
+    import spreg as SPREG
+    import RegressionUtils as RUTILS
+    import pysal2ArcUtils as AUTILS
+
+    y, x, w = errorModelData(15, 0.6, 10)
+    for model in sorted(RUTILS.GMERRORMODELS):
+        full = RUTILS.fitGMError(y, x, w, model = model)
+        for level in ["STANDARD", "COEFFICIENTS"]:
+            label = "{0} {1}".format(model, level)
+            fit = RUTILS.fitGMError(y, x, w, model = model,
+                                    diagnostics = level)
+            expect(fit.summary, label + ": no summary")
+            expectClose(fit.betas, full.betas, label + " betas")
+            if model.startswith("GM_Combo"):
+                expectClose(fit.predy_e, full.predy_e, label + " predy_e",
+                            tolerance = 1e-6)
+            if level == "STANDARD":
+                size = min(len(fit.vm), len(full.vm))
+                expectClose(fit.vm[:size,:size], full.vm[:size,:size],
+                            label + " variance")
+
+    #### Tests of the Model Search ####
+    desired = SPREG.OLS(y, x, w = w, spat_diag = True)
+    options = {"name_y": None, "name_x": None, "diagnostics": "STANDARD"}
+    ols = AUTILS.choiceOLS(y, x, w, options)
+    expectClose(ols.betas, desired.betas, "OLS betas")
+    expectClose(ols.koenker_bassett["kb"], desired.koenker_bassett["kb"],
+                "Koenker-Bassett")
+    for name in ["lm_error", "lm_lag", "rlm_error", "rlm_lag"]:
+        expectClose(getattr(ols, name), getattr(desired, name), name)
+
+    gwk = latticeKernel(15)
+    for combo in [False, True]:
+        full = AUTILS.autospace(y, x, w, gwk, combo = combo)
+        for level in ["STANDARD", "COEFFICIENTS"]:
+            label = "{0}{1}".format(level, " combo" if combo else "")
+            results = AUTILS.autospace(y, x, w, gwk, combo = combo,
+                                       diagnostics = level)
+            expect(results["final model"] == full["final model"],
+                   "{0}: chose {1}, not {2}".format(label,
+                                                   results["final model"],
+                                                   full["final model"]))
+            expectClose(results["regression2"].betas,
+                        full["regression2"].betas, label + " search betas")
+
+def checkBulkOutput():
+    """The results written to CSV, NPZ and dBASE tables read back with the
+    master ID of each feature and the exact values, and the master IDs are
+    in order whatever the order of the ID dictionary."""
+
+    import numpy as NUM
+    import libpysal as LIBPYSAL
+    import SSDataObject as SSDO
+    import BulkOutput as BULK
+
+    ssdo = sampleData(["GROWTH"])
+    rng = NUM.random.default_rng(11)
+    values = [rng.normal(size = ssdo.numObs), rng.random(ssdo.numObs)]
+    fieldOrder = ["PREDICTED", "RESIDUAL"]
+    candidateFields = dict((name, SSDO.CandidateField(name, "DOUBLE", data))
+                           for name, data in zip(fieldOrder, values))
+    master2Order = sampleMaster2Order()
+    desiredIDs = sorted(master2Order, key = master2Order.get)
+
+    for ext in [".csv", ".npz", ".dbf"]:
+        outputPath = scratchPath("results" + ext)
+        BULK.output(ssdo, outputPath, candidateFields, fieldOrder)
+        if ext == ".csv":
+            table = NUM.genfromtxt(outputPath, delimiter = ",", names = True)
+        elif ext == ".npz":
+            table = NUM.load(outputPath)
+        else:
+            dbf = LIBPYSAL.io.open(outputPath)
+            table = dict((name, NUM.array(dbf.by_col(name))) for name in \
+                         dbf.header)
+            dbf.close()
+        expect([int(masterID) for masterID in table[IDFIELD]] == \
+               desiredIDs, ext + ": master IDs differ")
+        for name, data in zip(fieldOrder, values):
+            expectClose(table[name], data, "{0} {1}".format(ext, name),
+                        tolerance = 1e-9 if ext == ".dbf" else 0.0)
+
+    #### ID Dictionary Filled in Any Order ####
+    shuffled = list(ssdo.order2Master.items())
+    rng.shuffle(shuffled)
+    ssdo.order2Master = dict(shuffled)
+    expect(BULK.masterIDs(ssdo).tolist() == desiredIDs,
+           "master IDs follow the dictionary order")
+
+def checkHeadlessRunner():
+    """Commands of the headless runner write the contiguity weights of
+    PySAL and the OLS results of spreg, and a tool error gives exit
+    status 1."""
+
+    import numpy as NUM
+    import libpysal as LIBPYSAL
+    import spreg as SPREG
+    import HeadlessRunner as RUNNER
+
+    galFile = scratchPath("runner_queen.gal")
+    status = RUNNER.main(["-q", "contw", SHAPEFILE, galFile, "--id",
+                          IDFIELD])
+    expect(status == 0, "contw exit status {0}".format(status))
+    desired = LIBPYSAL.weights.Queen.from_shapefile(SHAPEFILE,
+                                                    idVariable = IDFIELD)
+    expectSameLinks(readReference(galFile), desired, "contw")
+
+    outputFile = scratchPath("runner_ols.npz")
+    status = RUNNER.main(["-q", "ols", SHAPEFILE, "GROWTH", "LOGPCR69",
+                          "PERCPOV69", "-w", galFile, "-o", outputFile])
+    expect(status == 0, "ols exit status {0}".format(status))
+    table = NUM.load(outputFile)
+    fieldNames = ["GROWTH", "LOGPCR69", "PERCPOV69"]
+    data = sampleData(fieldNames)
+    columns = [data.fields[fieldName].data for fieldName in fieldNames]
+    ols = SPREG.OLS(columns[0].reshape(-1, 1), NUM.column_stack(columns[1:]))
+    master2Order = sampleMaster2Order()
+    order = [master2Order[int(masterID)] for masterID in table[IDFIELD]]
+    expectClose(table["Predy"], ols.predy.ravel()[order], "ols predictions")
+    expectClose(table["Resid"], ols.u.ravel()[order], "ols residuals")
+
+    #### Missing Field Reported as an Error ####
+    status = RUNNER.main(["-q", "ols", SHAPEFILE, "GROWTH", "NOSUCHFIELD",
+                          "-w", galFile, "-o", scratchPath("bad.npz")])
+    expect(status == 1, "missing field exit status {0}".format(status))
+
+def checkLazyImports():
+    """Opening and validating the toolbox, and importing the distance
+    helpers of its dialog, in a fresh process leaves PySAL, spreg and the
+    SciPy spatial and stats packages unimported."""
+
+    import StartupBenchmark as BENCH
+
+    bodies = [("toolbox", BENCH.TOOLBOXCODE.format(toolbox = BENCH.TOOLBOX)),
+              ("DistanceUtils", "import DistanceUtils")]
+    for label, body in bodies:
+        elapsed, modules = BENCH.timeChild(body, repeat = 1)
+        found = BENCH.forbiddenModules(modules, BENCH.DIALOGMODULES)
+        expect(not found, "{0} imports {1}".format(label, ", ".join(found)))
+
+CHECKS = [("text2Weights", checkText2Weights),
+          ("WeightsCache", checkWeightsCache),
+          ("swm2Weights", checkSWM2Weights),
+          ("SparseW", checkSparseW),
+          ("subsetWeights", checkSubsetWeights),
+          ("WeightsFileInfo", checkWeightsFileInfo),
+          ("threshold", checkThreshold),
+          ("extractPoints", checkExtractPoints),
+          ("findNeighbors", checkFindNeighbors),
+          ("iterBandRows", checkIterBandRows),
+          ("higherOrder", checkHigherOrder),
+          ("contiguity", checkContiguity),
+          ("tiledKeyPairs", checkTiledKeyPairs),
+          ("kernel", checkKernel),
+          ("adaptiveKernel", checkAdaptiveKernel),
+          ("designBlock", checkDesignBlock),
+          ("batchOLS", checkBatchOLS),
+          ("speculative", checkSpeculative),
+          ("WeightsStats", checkWeightsStats),
+          ("logDet", checkLogDet),
+          ("reducedForm", checkReducedForm),
+          ("diagnosticLevels", checkDiagnosticLevels),
+          ("bulkOutput", checkBulkOutput),
+          ("headlessRunner", checkHeadlessRunner),
+          ("lazyImports", checkLazyImports)]
+
+def runChecks(names = None):
+    """Runs the checks (all if names is None), returns the number of
+    failures."""
+
+    failures = 0
+    for name, check in CHECKS:
+        if names and name not in names:
+            continue
+        start = TIME.perf_counter()
+        try:
+            #### spreg Prints the Class of Every Model Summary ####
+            with CONTEXT.redirect_stdout(IO.StringIO()):
+                check()
+            status = "ok"
+        except CheckFailure as err:
+            status = "FAILED  {0}".format(err)
+        except Exception:
+            status = "FAILED  " + TRACE.format_exc().strip().splitlines()[-1]
+        elapsed = (TIME.perf_counter() - start) * 1000.0
+        failures += status != "ok"
+        print("{0:<22} {1:>9.1f} ms  {2}".format(name, elapsed, status))
+    return failures
+
+def main(argv = None):
+    """Runs the checks in a scratch folder, returns the exit status."""
+
+    global SCRATCHDIR
+
+    parser = ARG.ArgumentParser(prog = "BehaviorChecks",
+                                description = "Checks the PySAL toolbox "
+                                              "against PySAL and spreg.")
+    parser.add_argument("--check", dest = "names", action = "append",
+                        choices = [name for name, check in CHECKS],
+                        help = "check to run, repeat for several, all if "
+                               "not given")
+    args = parser.parse_args(argv)
+
+    SCRATCHDIR = TEMP.mkdtemp(prefix = "PySALChecks")
+    OS.environ["PYSAL_WEIGHTS_CACHE"] = scratchPath("cache")
+    SYS.path.insert(0, SCRIPTDIR)
+    try:
+        import arcpy
+    except ImportError:
+        SYS.path.insert(0, HEADLESSDIR)
+        import arcpy
+        arcpy.QUIET = True
+
+    try:
+        failures = runChecks(args.names)
+    finally:
+        SHUTIL.rmtree(SCRATCHDIR, ignore_errors = True)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    SYS.exit(main())
@@ -0,0 +1,155 @@
+"""
+Columnar output of the regression results keyed on the master ID.
+
+Instead of copying the input feature class row by row, the predictions and
+residuals of a model are written in one operation as a join-ready table, a
+columnar NPZ or Parquet file, or a CSV file.  The format follows from the
+extension of the output path unless it is given explicitly or through the
+PYSAL_OUTPUT_FORMAT environment variable; any other path is treated as a
+feature class and written with output2NewFC as before.
+"""
+
+import os as OS
+import numpy as NUM
+import arcpy as ARCPY
+
+OUTPUTFORMATS = ["FEATURECLASS", "TABLE", "NPZ", "PARQUET", "CSV"]
+EXTFORMATS = {".npz": "NPZ", ".parquet": "PARQUET", ".csv": "CSV",
+              ".txt": "CSV", ".dbf": "TABLE"}
+
+#### Master ID Field Name When the Data Has None ####
+DEFAULTIDFIELD = "MASTER_ID"
+
+def outputFormat(outputPath, outFormat = None):
+    """Resolves the output format of a results path.
+
+    INPUTS:
+    outputPath (str): path to the output
+    outFormat {str, None}: item in OUTPUTFORMATS, from the extension if None
+
+    RETURN:
+    outFormat (str): item in OUTPUTFORMATS
+    """
+
+    if outFormat is None:
+        outFormat = OS.environ.get("PYSAL_OUTPUT_FORMAT")
+    if not outFormat:
+        ext = OS.path.splitext(outputPath)[1].lower()
+        return EXTFORMATS.get(ext, "FEATURECLASS")
+
+    outFormat = outFormat.upper()
+    if outFormat not in OUTPUTFORMATS:
+        ARCPY.AddError("The output format {0} is not in {1}".format(
+                       outFormat, ", ".join(OUTPUTFORMATS)))
+        raise SystemExit()
+    return outFormat
+
+def masterIDs(ssdo):
+    """Returns the master ID of each observation in order.
+
+    INPUTS:
+    ssdo (obj): instance of SSDataObject
+
+    RETURN:
+    ids (array): numObs master IDs
+    """
+
+    #### Scatter the IDs to Their Order, Whatever the Dict Order ####
+    order2Master = ssdo.order2Master
+    orders = NUM.fromiter(order2Master.keys(), dtype = NUM.int64,
+                          count = ssdo.numObs)
+    ids = NUM.array(list(order2Master.values()))
+    ordered = NUM.empty_like(ids)
+    ordered[orders] = ids
+    return ordered
+
+def resultsArray(ssdo, candidateFields, fieldOrder):
+    """Builds a structured array of the master ID and result fields.
+
+    INPUTS:
+    ssdo (obj): instance of SSDataObject
+    candidateFields (dict): field name to SSDO.CandidateField
+    fieldOrder (list): result field names in output order
+
+    RETURN:
+    table (structured array): one record per observation
+    """
+
+    idField = ssdo.masterField or DEFAULTIDFIELD
+    ids = masterIDs(ssdo)
+    dtype = [(idField, ids.dtype)]
+    for fieldName in fieldOrder:
+        dtype.append((fieldName, "f8"))
+
+    table = NUM.empty(ssdo.numObs, dtype = dtype)
+    table[idField] = ids
+    for fieldName in fieldOrder:
+        table[fieldName] = NUM.asarray(candidateFields[fieldName].data).ravel()
+    return table
+
+def writeArray(table, outputPath, outFormat = None):
+    """Writes a structured array in a single columnar operation.
+
+    INPUTS:
+    table (structured array): records to write
+    outputPath (str): path to the output
+    outFormat {str, None}: TABLE, NPZ, PARQUET or CSV, from the extension
+                           if None
+    """
+
+    outFormat = outputFormat(outputPath, outFormat)
+    names = table.dtype.names
+
+    if outFormat == "NPZ":
+        NUM.savez(outputPath, **dict((name, table[name]) for name in names))
+
+    elif outFormat == "CSV":
+        #### Shortest Round-Trip Representation of Each Value ####
+        NUM.savetxt(outputPath, table, fmt = "%s", delimiter = ",",
+                    header = ",".join(names), comments = "")
+
+    elif outFormat == "PARQUET":
+        try:
+            import pyarrow as ARROW
+            import pyarrow.parquet as PARQUET
+        except ImportError:
+            ARCPY.AddError("Parquet output requires the pyarrow package.")
+            raise SystemExit()
+        columns = [table[name] for name in names]
+        PARQUET.write_table(ARROW.Table.from_arrays(columns,
+                                                    names = list(names)),
+                            outputPath)
+
+    else:
+        #### Field Names Valid for the Output Workspace ####
+        workspace = OS.path.dirname(outputPath)
+        validNames = [ARCPY.ValidateFieldName(name, workspace) \
+                      for name in names]
+        if list(validNames) != list(names):
+            table = table.copy()
+            table.dtype.names = validNames
+        ARCPY.da.NumPyArrayToTable(table, outputPath)
+
+def output(ssdo, outputPath, candidateFields, fieldOrder,
+           appendFields = None, outFormat = None):
+    """Writes the results of a regression tool, as a feature class copy of
+    the input or as a columnar file keyed on the master ID.
+
+    INPUTS:
+    ssdo (obj): instance of SSDataObject
+    outputPath (str): path to the output
+    candidateFields (dict): field name to SSDO.CandidateField
+    fieldOrder (list): result field names in output order
+    appendFields {list, None}: input fields copied to a feature class output
+    outFormat {str, None}: item in OUTPUTFORMATS, from the extension if None
+    """
+
+    outFormat = outputFormat(outputPath, outFormat)
+    if outFormat == "FEATURECLASS":
+        ssdo.output2NewFC(outputPath, candidateFields,
+                          appendFields = appendFields,
+                          fieldOrder = fieldOrder)
+    else:
+        ARCPY.SetProgressor("default", "Writing results...")
+        table = resultsArray(ssdo, candidateFields, fieldOrder)
+        writeArray(table, outputPath, outFormat)
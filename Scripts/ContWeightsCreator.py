@@ -5,17 +5,21 @@ Author(s): Mark Janikas, Xing Kang, Sergio Rey, Xun Li
 """
 
 import arcpy as ARCPY
-import pysal as PYSAL
-import pysal.lib.io as FileIO
-import pysal.lib.weights as WEIGHTS
+import os as OS
+import numpy as NUM
+import libpysal.io as FileIO
 import SSUtilities as UTILS
 import SSDataObject as SSDO
 import pysal2ArcUtils as AUTILS
 import WeightsUtilities as WU
+import ContiguityUtils as CUTILS
 
 EXTENSIONS = ['GAL', 'GWT', 'SWM']
 WEIGHTTYPE = ['ROOK', 'QUEEN']
 
+#### Contiguity Engine for Shapefiles (NATIVE or ARCGIS) ####
+CONTIGUITYENGINE = OS.environ.get("PYSAL_CONTIGUITY_ENGINE", "NATIVE").upper()
+
 def setupParameters():
     
     #### Get User Provided Inputs ####
@@ -91,6 +95,14 @@ class ContW_PySAL(object):
         ssdo.obtainData(masterField)
         self.masterField = masterField
         
+    def useNativeEngine(self):
+        """Returns True if contiguity is found by hashing the vertices of a
+        shapefile (ContiguityUtils) instead of using ArcGIS."""
+
+        return CONTIGUITYENGINE == "NATIVE" and \
+               self.inputFC.lower().endswith(".shp") and \
+               OS.path.isfile(self.inputFC)
+
     def buildWeights(self):
         """Performs Contiguity-based Weights Creation."""
         ARCPY.SetProgressor("default", "Constructing spatial weights object...")
@@ -102,14 +114,25 @@ class ContW_PySAL(object):
         
         #### Get Neighbor Dictionary for All Polygons #### 
         master2Order = ssdo.master2Order
-        polyNeighborDict = WU.polygonNeighborDict(self.inputFC, \
+        if self.useNativeEngine():
+            polyNeighborDict = CUTILS.polygonNeighborDict(self.inputFC, \
+                                            self.masterField, \
+                                            contiguityType=self.weightType)
+
+            #### Keep Only Features in the SSDataObject ####
+            polyNeighborDict = {key : [item for item in neighs \
+                                       if item in master2Order] \
+                                for key, neighs in polyNeighborDict.items() \
+                                if key in master2Order}
+        else:
+            polyNeighborDict = WU.polygonNeighborDict(self.inputFC, \
                                                   self.masterField, \
                                                   contiguityType=self.weightType)
         
         #### Assign empty list to polygons without neighbors ####
         if ssdo.numObs > len(polyNeighborDict):
             for masterKey in master2Order.keys():
-                if not polyNeighborDict.has_key(masterKey):
+                if masterKey not in polyNeighborDict:
                     polyNeighborDict[masterKey] = []
         
         #### Convert DefaultDict to Real Dict ?####
@@ -122,20 +145,25 @@ class ContW_PySAL(object):
                         append(master2Order[item])
             polyNeighborDict = polyNeighborCopy
        
-        #### Create a PySAL W Object ####
-        weightObj = WEIGHTS.W(polyNeighborDict)
+        #### Create a CSR-Backed PySAL W Object ####
+        rowIDs = NUM.fromiter(polyNeighborDict.keys(), dtype = NUM.int64,
+                              count = len(polyNeighborDict))
+        numNeighs = [len(polyNeighborDict[key]) for key in rowIDs]
+        rows = NUM.repeat(rowIDs, numNeighs)
+        neighs = NUM.fromiter((item for key in rowIDs \
+                               for item in polyNeighborDict[key]), 
+                              dtype = NUM.int64, count = len(rows))
+        sparse, ids = AUTILS.links2CSR(rowIDs, rows, neighs, 
+                                       NUM.ones(len(rows)))
+        del rows, neighs
             
-        #### Building up Lower Order Spatial Weights ####
+        #### Expand to Higher (and Lower) Orders in One Pass ####
         if weightOrder > 1:
             ARCPY.SetProgressor("default", \
                                 "Building up Lower Order Spatial Weights...")
-            origWeight = weightObj
-            weightObj = WEIGHTS.higher_order(weightObj, weightOrder)
-            if isLowOrder:
-                for order in range(weightOrder-1, 1, -1):
-                    lowOrderW = WEIGHTS.higher_order(origWeight, order)
-                    weightObj = WEIGHTS.w_union(weightObj, lowOrderW)
-                weightObj = WEIGHTS.w_union(weightObj, origWeight)        
+            sparse = CUTILS.higherOrder(sparse, weightOrder, 
+                                        cumulative = isLowOrder)
+        weightObj = AUTILS.SparseW(sparse, ids = ids, varName = self.idField)
     
         #### Save weightObj Class Object for Writing Result #### 
         self.weightObj = weightObj
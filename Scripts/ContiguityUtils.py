@@ -0,0 +1,322 @@
+"""
+Helper functions for contiguity-based spatial weights.
+"""
+
+import numpy as NUM
+import scipy.sparse as SPARSE
+import concurrent.futures as FUTURES
+import libpysal.io as FileIO
+import NeighborUtils as NUTILS
+
+#### Snapping Distance of Vertices Hashed as Shared ####
+QUANTIZETOLERANCE = 1e-7
+
+def higherOrder(sparse, order, cumulative = False):
+    """Finds the neighbors of every feature up to a contiguity order with a
+    single breadth-first expansion of the sparse frontier.  A feature is an
+    order-k neighbor if the shortest path to it has k steps.
+
+    INPUTS:
+    sparse (csr_matrix): first order contiguity matrix
+    order (int): contiguity order
+    cumulative {bool, False}: return every order from 1 to order instead of
+                              the order-k ring alone
+
+    RETURN:
+    ring (csr_matrix): binary matrix of the order-k neighbors, or of the
+                       neighbors of order 1 to k if cumulative
+    """
+
+    adjacency = SPARSE.csr_matrix(sparse, dtype = bool)
+    adjacency.setdiag(False)
+    adjacency.eliminate_zeros()
+    numObs = adjacency.shape[0]
+
+    #### Features Reached So Far (Self Included) ####
+    visited = (adjacency + SPARSE.identity(numObs, dtype = bool,
+                                           format = "csr")).tocsr()
+    frontier = adjacency
+    for step in range(2, int(order) + 1):
+        if not frontier.nnz:
+            break
+        reach = (frontier * adjacency).astype(NUM.int8)
+        frontier = (reach - reach.multiply(visited)).tocsr()
+        frontier.eliminate_zeros()
+        frontier = frontier.astype(bool)
+        visited = visited + frontier
+        del reach
+
+    if cumulative:
+        ring = visited.astype(float)
+        ring.setdiag(0)
+    else:
+        ring = frontier.astype(float)
+    ring = SPARSE.csr_matrix(ring)
+    ring.eliminate_zeros()
+    ring.sort_indices()
+    return ring
+
+def readPolygonVertices(inputFile):
+    """Reads the rings of every polygon in a file through pysal IO.
+
+    INPUTS:
+    inputFile (str): path to a shapefile (or any polygon source pysal reads)
+
+    RETURN:
+    xyCoords (array): N x 2 array of the vertices of every ring
+    shapeIDs (array): 0-based index of the polygon of each vertex
+    ringIDs (array): running index of the ring of each vertex
+    numShapes (int): number of polygons
+    """
+
+    shapes = FileIO.open(inputFile, 'r')
+    coordList = []
+    shapeList = []
+    ringList = []
+    numShapes = 0
+    numRings = 0
+    for shape in shapes:
+        rings = list(shape.parts)
+        holes = getattr(shape, "holes", None)
+        if holes:
+            rings.extend([hole for hole in holes if hole])
+        for ring in rings:
+            ring = NUM.asarray(ring, dtype = float).reshape(-1, 2)
+            coordList.append(ring)
+            shapeList.append(NUM.repeat(numShapes, len(ring)))
+            ringList.append(NUM.repeat(numRings, len(ring)))
+            numRings += 1
+        numShapes += 1
+    shapes.close()
+
+    if not coordList:
+        empty = NUM.zeros(0, dtype = NUM.int64)
+        return NUM.zeros((0, 2)), empty, empty, numShapes
+    return (NUM.concatenate(coordList), NUM.concatenate(shapeList),
+            NUM.concatenate(ringList), numShapes)
+
+def quantize(xyCoords, tolerance = QUANTIZETOLERANCE):
+    """Snaps coordinates to a grid so shared vertices hash equally.
+
+    INPUTS:
+    xyCoords (array): N x 2 array of coordinates
+    tolerance {float, QUANTIZETOLERANCE}: grid spacing
+
+    RETURN:
+    keys (array): N x 2 array of integer grid cells
+    """
+
+    return NUM.round(xyCoords / tolerance).astype(NUM.int64)
+
+def sharedKeyPairs(keys, shapeIDs):
+    """Finds the pairs of shapes that share at least one hash key.
+
+    INPUTS:
+    keys (array): N x m integer array, one key per row
+    shapeIDs (array): shape of each key
+
+    RETURN:
+    pairs (array): P x 2 array of unique pairs of shapes, lower index first
+    """
+
+    if not len(keys):
+        return NUM.zeros((0, 2), dtype = NUM.int64)
+
+    #### One Entry per (Key, Shape), Sorted by Key Then Shape ####
+    keyIDs = NUM.unique(keys, axis = 0, return_inverse = True)[1].ravel()
+    entries = NUM.unique(NUM.column_stack([keyIDs, shapeIDs]), axis = 0)
+    keyIDs, shapeIDs = entries[:,0], entries[:,1]
+
+    #### Pair Every Shape With the Others Holding the Same Key ####
+    pairList = []
+    offset = 1
+    while offset < len(keyIDs):
+        same = NUM.flatnonzero(keyIDs[offset:] == keyIDs[:-offset])
+        if not len(same):
+            break
+        pairList.append(NUM.column_stack([shapeIDs[same],
+                                          shapeIDs[same + offset]]))
+        offset += 1
+
+    if not pairList:
+        return NUM.zeros((0, 2), dtype = NUM.int64)
+    return NUM.unique(NUM.concatenate(pairList), axis = 0)
+
+def hashKeys(vertexKeys, shapeIDs, ringIDs, contiguityType = "QUEEN"):
+    """Builds the hash keys shared by contiguous shapes.
+
+    INPUTS:
+    vertexKeys (array): N x 2 array of quantized vertices
+    shapeIDs (array): shape of each vertex
+    ringIDs (array): ring of each vertex
+    contiguityType {str, QUEEN}: QUEEN (vertex keys) or ROOK (edge keys)
+
+    RETURN:
+    keys (array): one key per row, the first two columns locate the key
+    keyShapes (array): shape of each key
+    """
+
+    if contiguityType.upper() != "ROOK":
+        return vertexKeys, shapeIDs
+
+    #### Edges Between Consecutive Vertices of the Same Ring ####
+    sameRing = ringIDs[1:] == ringIDs[:-1]
+    start = vertexKeys[:-1][sameRing]
+    stop = vertexKeys[1:][sameRing]
+    edgeShapes = shapeIDs[:-1][sameRing]
+
+    #### Direction Independent Edge Keys, Degenerate Edges Dropped ####
+    swap = (start[:,0] > stop[:,0]) | \
+           ((start[:,0] == stop[:,0]) & (start[:,1] > stop[:,1]))
+    lower = NUM.where(swap[:,None], stop, start)
+    upper = NUM.where(swap[:,None], start, stop)
+    valid = (lower != upper).any(1)
+    return NUM.column_stack([lower, upper])[valid], edgeShapes[valid]
+
+def tiledKeyPairs(keys, keyShapes, numWorkers = None):
+    """Finds the shapes sharing hash keys tile by tile in worker processes.
+    Keys are assigned to the tile that contains them, so every copy of a
+    key meets in the same tile.  Shapes that cross a seam are found by the
+    tiles on each side and are reconciled by keeping unique pairs.
+
+    INPUTS:
+    keys (array): one key per row, the first two columns locate the key
+    keyShapes (array): shape of each key
+    numWorkers {int, None}: number of processes, defaults to
+                            NeighborUtils.NUMWORKERS
+
+    RETURN:
+    pairs (array): P x 2 array of unique pairs of shapes, lower index first
+    """
+
+    if numWorkers is None:
+        numWorkers = NUTILS.NUMWORKERS
+    if numWorkers <= 1 or len(keys) < NUTILS.PARALLELMINPOINTS:
+        return sharedKeyPairs(keys, keyShapes)
+
+    tiles = NUTILS.spatialTiles(keys[:,:2].astype(float),
+                                numWorkers * NUTILS.TILESPERWORKER)
+    with FUTURES.ProcessPoolExecutor(max_workers = numWorkers,
+                                     mp_context = NUTILS.processContext()) \
+         as pool:
+        results = list(pool.map(sharedKeyPairs,
+                                [keys[tile] for tile in tiles],
+                                [keyShapes[tile] for tile in tiles]))
+
+    #### Reconcile Pairs Found on Both Sides of a Seam ####
+    return NUM.unique(NUM.concatenate(results), axis = 0)
+
+def contiguityLinks(inputFile, contiguityType = "QUEEN",
+                    tolerance = QUANTIZETOLERANCE, numWorkers = None):
+    """Finds the contiguity neighbors of the polygons in a file by hashing
+    quantized vertices (queen) or edges (rook).
+
+    INPUTS:
+    inputFile (str): path to a polygon shapefile
+    contiguityType {str, list, QUEEN}: QUEEN, ROOK or a list of both to
+                                       find them from one read of the file
+    tolerance {float, QUANTIZETOLERANCE}: snapping distance of vertices
+    numWorkers {int, None}: number of processes for large inputs
+
+    RETURN:
+    links (dict): contiguity type to (rows, neighs), the 0-based index of
+                  the focal and neighboring polygon of each link (a tuple
+                  instead of a dict if contiguityType is a string)
+    numShapes (int): number of polygons
+    """
+
+    xyCoords, shapeIDs, ringIDs, numShapes = readPolygonVertices(inputFile)
+    vertexKeys = quantize(xyCoords, tolerance)
+    del xyCoords
+
+    if isinstance(contiguityType, str):
+        contiguityTypes = [contiguityType]
+    else:
+        contiguityTypes = contiguityType
+
+    links = {}
+    for cType in contiguityTypes:
+        keys, keyShapes = hashKeys(vertexKeys, shapeIDs, ringIDs, cType)
+        pairs = tiledKeyPairs(keys, keyShapes, numWorkers)
+        del keys, keyShapes
+        rows = NUM.concatenate([pairs[:,0], pairs[:,1]])
+        neighs = NUM.concatenate([pairs[:,1], pairs[:,0]])
+        links[cType] = (rows, neighs)
+
+    if isinstance(contiguityType, str):
+        return links[contiguityType], numShapes
+    return links, numShapes
+
+def polygonNeighborDict(inputFile, masterField, contiguityType = "QUEEN",
+                        tolerance = QUANTIZETOLERANCE, numWorkers = None):
+    """Native replacement of WU.polygonNeighborDict for shapefiles.
+
+    INPUTS:
+    inputFile (str): path to a polygon shapefile
+    masterField (str): unique ID field in the attribute table
+    contiguityType {str, list, QUEEN}: QUEEN, ROOK or a list of both
+    tolerance {float, QUANTIZETOLERANCE}: snapping distance of vertices
+    numWorkers {int, None}: number of processes for large inputs
+
+    RETURN:
+    neighborDict (dict): master ID to list of neighboring master IDs, for
+                         every polygon (islands have an empty list).  A dict
+                         of these per contiguity type if a list is given.
+    """
+
+    links, numShapes = contiguityLinks(inputFile, contiguityType,
+                                       tolerance, numWorkers)
+    masterIDs = readMasterIDs(inputFile, masterField, numShapes)
+    if isinstance(contiguityType, str):
+        return links2NeighborDict(links[0], links[1], masterIDs)
+    return dict((cType, links2NeighborDict(rows, neighs, masterIDs))
+                for cType, (rows, neighs) in links.items())
+
+def links2NeighborDict(rows, neighs, masterIDs):
+    """Groups links into a neighbor dictionary keyed on master IDs.
+
+    INPUTS:
+    rows (array): 0-based index of the focal polygon of each link
+    neighs (array): 0-based index of the neighboring polygon of each link
+    masterIDs (array): unique ID of each polygon
+
+    RETURN:
+    neighborDict (dict): master ID to list of neighboring master IDs
+    """
+
+    numShapes = len(masterIDs)
+    sortOrder = NUM.lexsort((neighs, rows))
+    rows, neighs = rows[sortOrder], neighs[sortOrder]
+    bounds = NUM.searchsorted(rows, NUM.arange(numShapes + 1))
+    neighIDs = masterIDs[neighs].tolist()
+    idList = masterIDs.tolist()
+    return dict((idList[shape], neighIDs[bounds[shape]:bounds[shape + 1]])
+                for shape in range(numShapes))
+
+def readMasterIDs(inputFile, masterField, numShapes):
+    """Reads the unique IDs of the polygons from the attribute table.
+
+    INPUTS:
+    inputFile (str): path to a polygon shapefile
+    masterField (str): unique ID field, the 0-based record order is used if
+                       the field is not in the table (e.g. the object ID)
+    numShapes (int): number of polygons
+
+    RETURN:
+    masterIDs (array): unique ID of each polygon
+    """
+
+    dbfFile = inputFile.rsplit('.', 1)[0] + ".dbf"
+    try:
+        table = FileIO.open(dbfFile, 'r')
+    except (IOError, OSError):
+        return NUM.arange(numShapes)
+
+    fieldNames = [name.upper() for name in table.header]
+    if masterField and masterField.upper() in fieldNames:
+        column = table.by_col(table.header[fieldNames.index(
+                              masterField.upper())])
+        table.close()
+        return NUM.asarray(column)
+    table.close()
+    return NUM.arange(numShapes)
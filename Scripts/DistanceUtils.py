@@ -0,0 +1,263 @@
+"""
+Helper functions for distance-based spatial weights.
+
+The toolbox dialog imports this module while validating parameters, so
+scipy.spatial is only imported once a KD-tree is actually built.
+"""
+
+import os as OS
+import numpy as NUM
+import arcpy as ARCPY
+
+#### Number of Points Used to Project the Link Count ####
+LINKSAMPLESIZE = 10000
+
+#### Relative Padding so Float Round-Off Never Drops the Nearest Neighbor ####
+THRESHOLDPADDING = 1e-7
+
+#### KD-Trees of Recently Validated Datasets ####
+TREECACHE = {}
+
+#### Average Number of Neighbors Above Which the Dialog Warns ####
+MAXMEANNEIGHBORS = 500
+
+#### Point Sets of Recently Read Datasets ####
+POINTCACHE = {}
+
+def buildTree(xyCoords):
+    """Returns a KD-tree of the given coordinates.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+
+    RETURN:
+    tree (cKDTree): spatial index of the coordinates
+    """
+
+    import scipy.spatial as SPATIAL
+    return SPATIAL.cKDTree(NUM.asarray(xyCoords, dtype = float))
+
+def minimumThreshold(tree):
+    """Returns the smallest distance band that gives every feature at least
+    one neighbor, i.e. the largest nearest neighbor distance.
+
+    INPUTS:
+    tree (cKDTree): spatial index of the coordinates
+
+    RETURN:
+    threshold (float): distance threshold, None if there are fewer than
+                       two features
+    """
+
+    if tree.n < 2:
+        return None
+
+    dist, ind = tree.query(tree.data, k = 2)
+    threshold = dist[:,1].max()
+    return threshold * (1.0 + THRESHOLDPADDING)
+
+def projectLinkCount(tree, threshold, sampleSize = LINKSAMPLESIZE,
+                     seed = 100):
+    """Projects the number of links a distance band would produce from the
+    neighbor counts of a random sample of the features.
+
+    INPUTS:
+    tree (cKDTree): spatial index of the coordinates
+    threshold (float): distance threshold
+    sampleSize {int, LINKSAMPLESIZE}: number of features sampled
+    seed {int, 100}: seed of the random sample
+
+    RETURN:
+    numLinks (int): projected number of links (excluding self links)
+    """
+
+    import NeighborUtils as NUTILS
+    meanNeighs = NUTILS.meanNeighborCount(tree, threshold, 
+                                          sampleSize = sampleSize, 
+                                          seed = seed)
+    return int(round(meanNeighs * tree.n))
+
+def estimateThreshold(xyCoords, sampleSize = LINKSAMPLESIZE):
+    """Estimates the default distance threshold of the weights dialog from
+    every feature, one k = 2 query of the KD-tree.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+    sampleSize {int, LINKSAMPLESIZE}: points sampled to project the links
+
+    RETURN:
+    threshold (float): minimum threshold giving every feature a neighbor,
+                       None if there are fewer than two features
+    numLinks (int): projected number of links at that threshold
+    """
+
+    tree = buildTree(xyCoords)
+    threshold = minimumThreshold(tree)
+    if threshold is None:
+        return None, 0
+    numLinks = projectLinkCount(tree, threshold, sampleSize = sampleSize)
+    return threshold, numLinks
+
+def cachedTree(key, xyCoords = None):
+    """Returns the KD-tree stored for a dataset, building and storing it
+    when coordinates are provided.
+
+    INPUTS:
+    key (str): dataset path
+    xyCoords {array, None}: n x 2 array of coordinates
+
+    RETURN:
+    tree (cKDTree): spatial index, None if not available
+    """
+
+    if xyCoords is not None:
+        TREECACHE.clear()
+        TREECACHE[key] = buildTree(xyCoords)
+    return TREECACHE.get(key)
+
+def linkCountWarning(numLinks, numObs):
+    """Returns a warning message if a distance band is projected to be too
+    dense, else None.
+
+    INPUTS:
+    numLinks (int): projected number of links
+    numObs (int): number of features
+
+    RETURN:
+    msg (str): warning message or None
+    """
+
+    if not numObs:
+        return None
+    meanNeighs = numLinks * 1.0 / numObs
+    if meanNeighs <= MAXMEANNEIGHBORS:
+        return None
+    msg = ("The threshold distance is projected to create about {0} links "
+           "({1:.0f} neighbors per feature).  Building and using these "
+           "weights may require a large amount of time and memory.")
+    return msg.format(numLinks, meanNeighs)
+
+def datasetStamp(inputFC):
+    """Returns a stamp that changes whenever a dataset on disk is edited.
+
+    INPUTS:
+    inputFC (str): path to a shapefile or to a file geodatabase feature
+                   class
+
+    RETURN:
+    stamp (tuple): modification times and sizes of the files backing the
+                   dataset, None for anything else (layers, whose selection
+                   or definition query may change, and in-memory data)
+    """
+
+    if not inputFC:
+        return None
+    if OS.path.isfile(inputFC):
+        #### Shapefile: Geometry and Attribute Files ####
+        base, ext = OS.path.splitext(OS.path.abspath(inputFC))
+        stamp = []
+        for ext in [ext, ".dbf", ".shx"]:
+            fileName = base + ext
+            if OS.path.isfile(fileName):
+                stat = OS.stat(fileName)
+                stamp.append((stat.st_mtime, stat.st_size))
+        return tuple(stamp)
+
+    #### File Geodatabase Feature Class: Files of the Geodatabase ####
+    if not OS.path.isabs(inputFC):
+        return None
+    workspace = OS.path.dirname(OS.path.normpath(inputFC))
+    while not workspace.lower().endswith(".gdb"):
+        parent = OS.path.dirname(workspace)
+        if parent == workspace:
+            return None
+        workspace = parent
+    if not OS.path.isdir(workspace):
+        return None
+
+    stamp = []
+    for fileName in OS.listdir(workspace):
+        try:
+            stat = OS.stat(OS.path.join(workspace, fileName))
+        except OSError:
+            continue
+        stamp.append((stat.st_mtime, stat.st_size))
+    return (workspace, max(stamp) if stamp else None, len(stamp),
+            sum([size for mtime, size in stamp]))
+
+def extractPoints(inputFC, idField = None, sampleSize = None, seed = 100):
+    """Reads the coordinates of a feature class in bulk.  Points are used
+    as is, the centroids of multipoints, lines and polygons are used for
+    the other shape types.  Shapefiles and file geodatabase feature classes
+    are cached and reused until they change on disk, layers are read every
+    time (see datasetStamp).
+
+    INPUTS:
+    inputFC (str): path to the feature class
+    idField {str, None}: field read along with the coordinates, the object
+                         IDs are returned if not provided
+    sampleSize {int, None}: maximum number of points returned, a random
+                            sample is taken from larger inputs
+    seed {int, 100}: seed of the random sample
+
+    RETURN:
+    ids (array): values of idField (or object IDs) of each point
+    xyCoords (array): n x 2 array of coordinates
+    """
+
+    stamp = datasetStamp(inputFC)
+    cacheKey = OS.path.normcase(OS.path.abspath(inputFC))
+    cached = POINTCACHE.get(cacheKey)
+    if stamp is not None and cached is not None and cached[0] == stamp:
+        columns = cached[1]
+    else:
+        #### Single Bulk Read of Object IDs and Centroids ####
+        data = ARCPY.da.FeatureClassToNumPyArray(inputFC,
+                                                 ["OID@", "SHAPE@XY"],
+                                                 skip_nulls = True)
+        columns = {"OID@": data["OID@"],
+                   "SHAPE@XY": NUM.ascontiguousarray(data["SHAPE@XY"],
+                                                     dtype = float)}
+        columns["SHAPE@XY"] = columns["SHAPE@XY"].reshape(-1, 2)
+        del data
+        POINTCACHE.clear()
+        if stamp is not None:
+            POINTCACHE[cacheKey] = (stamp, columns)
+
+    idName = idField if idField else "OID@"
+    if idName not in columns:
+        #### Attribute-Only Read Aligned on Object IDs ####
+        data = ARCPY.da.FeatureClassToNumPyArray(inputFC, ["OID@", idName])
+        sortOrder = NUM.argsort(data["OID@"], kind = "mergesort")
+        pos = NUM.searchsorted(data["OID@"], columns["OID@"],
+                               sorter = sortOrder)
+        columns[idName] = data[idName][sortOrder[pos]]
+        del data
+
+    ids = columns[idName]
+    xyCoords = columns["SHAPE@XY"]
+    if sampleSize is not None:
+        ids, xyCoords = samplePoints(ids, xyCoords, sampleSize, seed = seed)
+    return ids, xyCoords
+
+def samplePoints(ids, xyCoords, sampleSize, seed = 100):
+    """Returns a random sample of the points, in their original order.
+
+    INPUTS:
+    ids (array): ID of each point
+    xyCoords (array): n x 2 array of coordinates
+    sampleSize (int): maximum number of points returned
+    seed {int, 100}: seed of the random sample
+
+    RETURN:
+    ids (array): ID of each sampled point
+    xyCoords (array): coordinates of the sampled points
+    """
+
+    numObs = len(ids)
+    if numObs <= sampleSize:
+        return ids, xyCoords
+
+    randomState = NUM.random.RandomState(seed)
+    sample = NUM.sort(randomState.choice(numObs, sampleSize, replace = False))
+    return ids[sample], xyCoords[sample]
@@ -0,0 +1,5 @@
+"""
+Stand-in for ErrorUtils when the toolkit runs outside of ArcGIS (see
+HeadlessRunner.py).  The toolkit imports the module but reports its errors
+through arcpy, so nothing else is needed.
+"""
@@ -0,0 +1,393 @@
+"""
+Stand-in for SSDataObject when the toolkit runs outside of ArcGIS (see
+HeadlessRunner.py).
+
+Features are read from shapefiles, and attributes from their dBASE tables,
+through pysal IO.  A dBASE table on its own can be used by the regression
+tools when the spatial weights come from a file.  The object ID of a record
+is its 0-based position in the table, as in the FID of a shapefile.
+"""
+
+import os as OS
+import numpy as NUM
+import arcpy as ARCPY
+import libpysal.io as FileIO
+
+#### Object ID Field of Shapefiles and dBASE Tables ####
+OIDNAME = "FID"
+
+#### Shape Types by the Code in the Shapefile Header (Z/M Included) ####
+SHAPETYPES = {1: "Point", 3: "Polyline", 5: "Polygon", 8: "Multipoint"}
+
+#### dBASE Field Specs of Written Columns ####
+FLOATSPEC = ("N", 24, 15)
+INTSPEC = ("N", 20, 0)
+MAXNAMELENGTH = 10
+
+def splitPath(inputFC):
+    """Returns the shapefile and dBASE table paths of a dataset.
+
+    INPUTS:
+    inputFC (str): path to a shapefile or a dBASE table
+
+    RETURN:
+    shapeFile {str, None}: path to the shapefile, None for a table
+    tableFile (str): path to the dBASE table
+    """
+
+    base, ext = OS.path.splitext(inputFC)
+    if ext.lower() == ".dbf":
+        return None, inputFC
+    return base + ".shp", base + ".dbf"
+
+def fieldType(spec):
+    """Returns the field type name of a dBASE field spec."""
+
+    kind, length, decimals = spec
+    if kind == "N":
+        return "Double" if decimals else "Integer"
+    if kind == "F":
+        return "Double"
+    if kind == "D":
+        return "Date"
+    if kind == "L":
+        return "Boolean"
+    return "String"
+
+def readCentroids(shapeFile):
+    """Reads the point, or the centroid, of every shape in a shapefile.
+    The vertices of lines and multipoints are averaged.
+
+    INPUTS:
+    shapeFile (str): path to the shapefile
+
+    RETURN:
+    xyCoords (array): n x 2 array, NaN for null shapes
+    """
+
+    shapes = FileIO.open(shapeFile, 'r')
+    xyCoords = NUM.empty((len(shapes), 2), dtype = float)
+    for record, shape in enumerate(shapes):
+        if shape is None:
+            xyCoords[record] = NUM.nan
+        elif hasattr(shape, "centroid"):
+            xyCoords[record] = shape.centroid
+        elif hasattr(shape, "vertices"):
+            xyCoords[record] = NUM.asarray(shape.vertices,
+                                           dtype = float).mean(0)
+        else:
+            xyCoords[record] = tuple(shape)[:2]
+    shapes.close()
+    return xyCoords
+
+def readColumns(inputFC, fieldNames):
+    """Reads whole columns of a dataset.  OID@ (or FID) returns the object
+    IDs and SHAPE@XY the centroids.
+
+    INPUTS:
+    inputFC (str): path to a shapefile or a dBASE table
+    fieldNames (list): names of the columns (case insensitive)
+
+    RETURN:
+    columns (dict): field name to array
+    """
+
+    shapeFile, tableFile = splitPath(inputFC)
+    table = FileIO.open(tableFile, 'r')
+    header = [name.upper() for name in table.header]
+    numRecords = len(table)
+
+    columns = {}
+    for fieldName in fieldNames:
+        upperName = fieldName.upper()
+        if upperName in ["OID@", OIDNAME] and upperName not in header:
+            columns[fieldName] = NUM.arange(numRecords)
+        elif upperName == "SHAPE@XY":
+            if shapeFile is None:
+                ARCPY.AddError("{0} has no shapes.".format(inputFC))
+                raise SystemExit()
+            columns[fieldName] = readCentroids(shapeFile)
+        elif upperName in header:
+            position = header.index(upperName)
+            values = table.by_col(table.header[position])
+            if fieldType(table.field_spec[position]) in ["Double",
+                                                         "Integer"]:
+                values = NUM.array([NUM.nan if value is None else value \
+                                    for value in values], dtype = float)
+                if fieldType(table.field_spec[position]) == "Integer" and \
+                   not NUM.isnan(values).any():
+                    values = values.astype(NUM.int64)
+            else:
+                values = NUM.array(values, dtype = object)
+            columns[fieldName] = values
+        else:
+            table.close()
+            ARCPY.AddIDMessage("ERROR", 728, fieldName, inputFC)
+            raise SystemExit()
+    table.close()
+    return columns
+
+def nullMask(values):
+    """Returns True for the null values of a column."""
+
+    if values.dtype.kind == "f":
+        bad = NUM.isnan(values)
+        if values.ndim > 1:
+            bad = bad.any(1)
+        return bad
+    if values.dtype.kind == "O":
+        return NUM.array([value is None for value in values], dtype = bool)
+    return NUM.zeros(len(values), dtype = bool)
+
+def readArray(inputFC, fieldNames, skipNulls = False):
+    """Reads columns into a structured array, as arcpy.da does.
+
+    INPUTS:
+    inputFC (str): path to a shapefile or a dBASE table
+    fieldNames (list): names of the columns, OID@ and SHAPE@XY included
+    skipNulls {bool, False}: drop the records with a null value
+
+    RETURN:
+    array (structured array): one record per feature
+    """
+
+    columns = readColumns(inputFC, fieldNames)
+    numRecords = len(columns[fieldNames[0]])
+    keep = NUM.ones(numRecords, dtype = bool)
+    if skipNulls:
+        for fieldName in fieldNames:
+            keep &= ~nullMask(columns[fieldName])
+
+    dtype = []
+    for fieldName in fieldNames:
+        values = columns[fieldName]
+        if values.ndim > 1:
+            dtype.append((fieldName, values.dtype, values.shape[1:]))
+        elif values.dtype.kind == "O":
+            dtype.append((fieldName, "U%d" % max([len(str(value)) \
+                                                  for value in values] + [1])))
+        else:
+            dtype.append((fieldName, values.dtype))
+    array = NUM.empty(int(keep.sum()), dtype = dtype)
+    for fieldName in fieldNames:
+        values = columns[fieldName][keep]
+        if values.dtype.kind == "O":
+            values = [str(value) for value in values]
+        array[fieldName] = values
+    return array
+
+def writeDBF(tableFile, names, columns):
+    """Writes columns to a dBASE table.
+
+    INPUTS:
+    tableFile (str): path to the dBASE table
+    names (list): field names, cut to ten characters
+    columns (list): array of each field
+    """
+
+    specs = []
+    for values in columns:
+        kind = NUM.asarray(values).dtype.kind
+        if kind == "f":
+            specs.append(FLOATSPEC)
+        elif kind in "iub":
+            specs.append(INTSPEC)
+        else:
+            length = max([len(str(value)) for value in values] + [1])
+            specs.append(("C", min(length, 254), 0))
+
+    table = FileIO.open(tableFile, 'w')
+    table.header = [name[:MAXNAMELENGTH] for name in names]
+    table.field_spec = specs
+    for row in zip(*columns):
+        table.write([None if isinstance(value, float) and value != value \
+                     else value for value in row])
+    table.close()
+
+def writeTable(array, outputTable):
+    """Writes a structured array to a dBASE table, or to a CSV, NPZ or
+    Parquet file by the extension of outputTable."""
+
+    import BulkOutput as BULK
+    outFormat = BULK.outputFormat(outputTable)
+    if outFormat not in ["TABLE", "FEATURECLASS"]:
+        BULK.writeArray(array, outputTable, outFormat)
+        return
+
+    if not OS.path.splitext(outputTable)[1]:
+        outputTable = outputTable + ".dbf"
+    names = array.dtype.names
+    writeDBF(outputTable, names, [array[name] for name in names])
+
+class FCField(object):
+    """Field of the dataset, with the data read by obtainData."""
+
+    def __init__(self, name, type, alias = None, length = None,
+                 data = None):
+        self.name = name
+        self.baseName = name
+        self.type = type
+        self.alias = alias if alias else name
+        self.length = length
+        self.data = data
+
+class CandidateField(object):
+    """Result field written to the output by output2NewFC."""
+
+    def __init__(self, name, type, data, alias = None, precision = None,
+                 length = None, checkNullValues = False, **kwargs):
+        self.name = name
+        self.type = type
+        self.data = data
+        self.alias = alias if alias else name
+        self.precision = precision
+        self.length = length
+        self.checkNullValues = checkNullValues
+
+class SSDataObject(object):
+    """Features of a shapefile or records of a dBASE table read through
+    pysal IO, with the interface of the ArcGIS SSDataObject used by the
+    toolkit."""
+
+    def __init__(self, inputFC, templateFC = None, explicitSpatialRef = None,
+                 silentWarnings = False, useChordal = False, **kwargs):
+
+        self.shapeFile, self.tableFile = splitPath(inputFC)
+        if not OS.path.isfile(self.tableFile) or \
+           (self.shapeFile and not OS.path.isfile(self.shapeFile)):
+            ARCPY.AddIDMessage("ERROR", 110, inputFC)
+            raise SystemExit()
+
+        self.inputFC = inputFC
+        self.inPath, self.inName = OS.path.split(inputFC)
+        self.templateFC = templateFC
+        self.silentWarnings = silentWarnings
+        self.oidName = OIDNAME
+
+        #### Shape Type and Spatial Reference ####
+        self.shapeType = None
+        self.spatialRefName = "Unknown"
+        if self.shapeFile:
+            shapes = FileIO.open(self.shapeFile, 'r')
+            code = shapes.header["Shape Type"] % 10
+            shapes.close()
+            self.shapeType = SHAPETYPES.get(code, "Polygon")
+            prjFile = OS.path.splitext(self.shapeFile)[0] + ".prj"
+            if OS.path.isfile(prjFile):
+                wkt = open(prjFile).read()
+                if '"' in wkt:
+                    self.spatialRefName = wkt.split('"')[1]
+
+        #### Fields of the Table ####
+        table = FileIO.open(self.tableFile, 'r')
+        self.totalNumObs = len(table)
+        self.allFields = {OIDNAME: FCField(OIDNAME, "OID")}
+        for name, spec in zip(table.header, table.field_spec):
+            self.allFields[name.upper()] = FCField(name, fieldType(spec),
+                                                   length = spec[1])
+        table.close()
+
+        self.masterField = None
+        self.numObs = 0
+        self.master2Order = {}
+        self.order2Master = {}
+        self.fields = {}
+        self.xyCoords = None
+        self.recordIDs = None
+
+    def obtainData(self, masterField, fields = [], types = None,
+                   minNumObs = 0, warnNumObs = 0, dateStr = False,
+                   explicitBadRecordID = None, **kwargs):
+        """Reads the master IDs, the fields and the centroids.  Records
+        with a null value or shape are left out."""
+
+        columns = readColumns(self.inputFC, [masterField] + list(fields))
+        masterIDs = columns[masterField]
+        keep = ~nullMask(masterIDs)
+        for fieldName in fields:
+            keep &= ~nullMask(columns[fieldName])
+        if self.shapeFile:
+            xyCoords = readCentroids(self.shapeFile)
+            keep &= ~nullMask(xyCoords)
+
+        #### Report Bad Records ####
+        numBad = int((~keep).sum())
+        if numBad and not self.silentWarnings:
+            ARCPY.AddIDMessage("WARNING", 642, numBad)
+        numObs = int(keep.sum())
+        if numObs < minNumObs:
+            ARCPY.AddIDMessage("ERROR", 641, minNumObs)
+            raise SystemExit()
+        if warnNumObs and numObs < warnNumObs:
+            ARCPY.AddIDMessage("WARNING", 1164, warnNumObs)
+
+        #### Unique Master IDs ####
+        masterIDs = masterIDs[keep]
+        if len(NUM.unique(masterIDs)) != numObs:
+            ARCPY.AddIDMessage("ERROR", 644, masterField)
+            raise SystemExit()
+
+        self.masterField = masterField
+        self.numObs = numObs
+        self.recordIDs = NUM.flatnonzero(keep)
+        masterIDs = masterIDs.tolist()
+        self.order2Master = dict(enumerate(masterIDs))
+        self.master2Order = dict((masterID, order) \
+                                 for order, masterID in enumerate(masterIDs))
+        for fieldName in fields:
+            info = self.allFields.get(fieldName.upper())
+            self.fields[fieldName] = FCField(fieldName,
+                                             info.type if info else "Double",
+                                             data = columns[fieldName][keep])
+        if self.shapeFile:
+            self.xyCoords = xyCoords[keep]
+
+    def output2NewFC(self, outputFC, candidateFields, appendFields = [],
+                     fieldOrder = [], **kwargs):
+        """Writes the kept features with the master ID, the appended input
+        fields and the result fields.  A shapefile output copies the shapes,
+        any other output is written as a table."""
+
+        names = [self.masterField]
+        columns = [NUM.asarray([self.order2Master[order] \
+                                for order in range(self.numObs)])]
+        for fieldName in appendFields:
+            if fieldName in self.fields and fieldName not in names:
+                names.append(fieldName)
+                columns.append(self.fields[fieldName].data)
+        resultNames = list(fieldOrder) + [name for name in candidateFields \
+                                          if name not in fieldOrder]
+        for fieldName in resultNames:
+            names.append(fieldName)
+            columns.append(NUM.asarray(candidateFields[fieldName].data,
+                                       dtype = float).ravel())
+
+        base, ext = OS.path.splitext(outputFC)
+        if ext.lower() == ".shp" and not self.shapeFile:
+            ARCPY.AddWarning("{0} has no shapes, the results are written to "
+                             "{1}.dbf".format(self.inputFC, base))
+            outputFC = base + ".dbf"
+        if ext.lower() != ".shp" or not self.shapeFile:
+            array = NUM.empty(self.numObs, dtype = [(name, NUM.asarray(
+                              column).dtype if NUM.asarray(column).dtype.kind \
+                              != "O" else "U254") for name, column in \
+                              zip(names, columns)])
+            for name, column in zip(names, columns):
+                array[name] = column
+            writeTable(array, outputFC)
+            return
+
+        #### Copy the Shapes of the Kept Records ####
+        keep = set(self.recordIDs.tolist())
+        shapes = FileIO.open(self.shapeFile, 'r')
+        output = FileIO.open(outputFC, 'w')
+        for record, shape in enumerate(shapes):
+            if record in keep:
+                output.write(shape)
+        output.close()
+        shapes.close()
+        prjFile = OS.path.splitext(self.shapeFile)[0] + ".prj"
+        if OS.path.isfile(prjFile):
+            with open(prjFile) as source, open(base + ".prj", "w") as target:
+                target.write(source.read())
+        writeDBF(base + ".dbf", names, columns)
@@ -0,0 +1,43 @@
+"""
+Stand-in for SSUtilities when the toolkit runs outside of ArcGIS (see
+HeadlessRunner.py).
+"""
+
+import arcpy as ARCPY
+
+#### Render Type of Each Shape Type (Point, Line, Polygon) ####
+renderType = {"POINT": 0, "MULTIPOINT": 0, "POLYLINE": 1, "POLYGON": 2}
+
+def assignClassAttr(classInstance, argDict):
+    """Assigns the arguments of a constructor as attributes."""
+
+    for key, value in argDict.items():
+        if key != "self":
+            setattr(classInstance, key, value)
+
+def getTextParameter(index, parameters = None, fieldName = False):
+    """Returns the text of a parameter, None if it is empty."""
+
+    if parameters is not None:
+        value = parameters[index].valueAsText
+    else:
+        value = ARCPY.GetParameterAsText(index)
+    if value in [None, "", "#"]:
+        return None
+    return value
+
+def getNumericParameter(index, parameters = None):
+    """Returns the number of a parameter, None if it is empty."""
+
+    value = getTextParameter(index, parameters)
+    if value is None:
+        return None
+    number = float(value)
+    return int(number) if number.is_integer() and "." not in value \
+           else number
+
+def setUniqueIDField(ssdo, weightsFile = None):
+    """Returns the object ID field, the master field of records that have
+    no unique ID."""
+
+    return ssdo.oidName
@@ -0,0 +1,112 @@
+"""
+Stand-in for WeightsUtilities when the toolkit runs outside of ArcGIS (see
+HeadlessRunner.py).
+
+SWM files are written and read in the binary layout decoded by
+pysal2ArcUtils.readSWMArrays, and polygon contiguity comes from the vertex
+hashing in ContiguityUtils.
+"""
+
+import numpy as NUM
+import arcpy as ARCPY
+
+#### Version Written in the SWM Header ####
+SWMVERSION = "10.1"
+
+class SWMRecords(object):
+    """Reads or writes the records of an open SWM file."""
+
+    def __init__(self, fo, fixedWeights = False):
+        self.fo = fo
+        self.fixedWeights = fixedWeights
+
+    def writeEntry(self, masterID, neighbors, weights):
+        """Writes the record of a feature.
+
+        INPUTS:
+        masterID (int): master ID of the feature
+        neighbors (list): master IDs of the neighbors
+        weights (list): weight of each neighbor
+        """
+
+        numNeighs = len(neighbors)
+        NUM.array([masterID, numNeighs], dtype = "<i4").tofile(self.fo)
+        if numNeighs:
+            NUM.asarray(neighbors, dtype = "<i4").tofile(self.fo)
+            weights = NUM.asarray(weights, dtype = "<f8")
+            if self.fixedWeights:
+                weights[:1].tofile(self.fo)
+            else:
+                weights.tofile(self.fo)
+            NUM.array([weights.sum()], dtype = "<f8").tofile(self.fo)
+
+    def readEntry(self):
+        """Reads the record of the next feature.
+
+        RETURN:
+        masterID (int): master ID of the feature
+        numNeighs (int): number of neighbors
+        neighbors (array): master IDs of the neighbors
+        weights (array): weight of each neighbor
+        sumUnstandard (array): sum of the unstandardized weights
+        """
+
+        masterID, numNeighs = NUM.fromfile(self.fo, dtype = "<i4",
+                                           count = 2)
+        if not numNeighs:
+            return masterID, 0, [], [], NUM.array([0.0])
+        neighbors = NUM.fromfile(self.fo, dtype = "<i4", count = numNeighs)
+        if self.fixedWeights:
+            weights = NUM.fromfile(self.fo, dtype = "<f8", count = 1)
+            weights = NUM.repeat(weights, numNeighs)
+        else:
+            weights = NUM.fromfile(self.fo, dtype = "<f8", count = numNeighs)
+        sumUnstandard = NUM.fromfile(self.fo, dtype = "<f8", count = 1)
+        return masterID, numNeighs, neighbors, weights, sumUnstandard
+
+class SWMWriter(object):
+    """Writes an SWM file, one record per feature."""
+
+    def __init__(self, outputFile, masterField, spatialRefName, numObs,
+                 rowStandard, inputFC = "#", wType = "#",
+                 fixedWeights = False, **kwargs):
+        self.fo = open(outputFile, "wb")
+        header = ("VERSION@{0};UNIQUEID@{1};SPATIALREFNAME@{2};INPUTFC@{3};"
+                  "WTYPE@{4};FIXEDWEIGHTS@{5}\n")
+        header = header.format(SWMVERSION, masterField, spatialRefName,
+                               inputFC, wType, fixedWeights)
+        self.fo.write(header.encode("utf-8"))
+        NUM.array([numObs, int(bool(rowStandard))],
+                  dtype = "<i4").tofile(self.fo)
+        self.swm = SWMRecords(self.fo, fixedWeights)
+
+    def close(self):
+        self.fo.close()
+
+class SWMReader(object):
+    """Reads an SWM file, one record per feature."""
+
+    def __init__(self, swmFile):
+        import pysal2ArcUtils as AUTILS
+        self.fo = open(swmFile, "rb")
+        info = AUTILS.parseSWMHeader(self.fo.readline())
+        self.masterField = info["masterField"]
+        self.fixedWeights = info["fixedWeights"]
+        self.numObs, self.rowStandard = [int(value) for value in \
+                                         NUM.fromfile(self.fo, dtype = "<i4",
+                                                      count = 2)]
+        self.swm = SWMRecords(self.fo, self.fixedWeights)
+
+    def close(self):
+        self.fo.close()
+
+def polygonNeighborDict(inputFC, masterField, contiguityType = "QUEEN",
+                        **kwargs):
+    """Returns the contiguity neighbors of the polygons of a shapefile."""
+
+    import ContiguityUtils as CUTILS
+    if not inputFC.lower().endswith(".shp"):
+        ARCPY.AddError("Contiguity outside of ArcGIS requires a shapefile.")
+        raise SystemExit()
+    return CUTILS.polygonNeighborDict(inputFC, masterField,
+                                      contiguityType = contiguityType)
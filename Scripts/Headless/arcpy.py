@@ -0,0 +1,173 @@
+"""
+Stand-in for the parts of arcpy used by the toolkit when it runs outside of
+ArcGIS (see HeadlessRunner.py).
+
+Messages go to the standard streams, progressors are ignored, and the data
+access functions read shapefiles and dBASE tables through pysal IO.
+"""
+
+import os as OS
+import sys as SYS
+import tempfile as TEMP
+import re as RE
+
+#### Message Levels Written (Set by the Runner) ####
+QUIET = False
+
+#### Number of Errors Reported During the Run ####
+ERRORCOUNT = 0
+
+#### Parameters of GetParameterAsText/GetParameter ####
+PARAMETERS = []
+
+class Environment(object):
+    """Geoprocessing environment settings read by the toolkit."""
+
+    def __init__(self):
+        self.overwriteOutput = True
+        self.workspace = None
+        self.scratchFolder = TEMP.gettempdir()
+        self.scratchWorkspace = self.scratchFolder
+
+env = Environment()
+
+def AddMessage(message):
+    if not QUIET:
+        SYS.stdout.write("{0}\n".format(message))
+
+def AddWarning(message):
+    SYS.stderr.write("WARNING: {0}\n".format(message))
+
+def AddError(message):
+    global ERRORCOUNT
+    ERRORCOUNT += 1
+    SYS.stderr.write("ERROR: {0}\n".format(message))
+
+def GetIDMessage(messageID):
+    return "Message {0}".format(messageID)
+
+def AddIDMessage(messageType, messageID, *args):
+    message = GetIDMessage(messageID)
+    if args:
+        message = "{0}: {1}".format(message, ", ".join([str(arg) \
+                                                         for arg in args]))
+    messageType = messageType.upper()
+    if messageType == "ERROR":
+        AddError(message)
+    elif messageType == "WARNING":
+        AddWarning(message)
+    else:
+        AddMessage(message)
+
+def SetProgressor(*args, **kwargs):
+    pass
+
+def SetProgressorLabel(*args, **kwargs):
+    pass
+
+def SetProgressorPosition(*args, **kwargs):
+    pass
+
+def ResetProgressor(*args, **kwargs):
+    pass
+
+def GetParameterAsText(index):
+    if index < len(PARAMETERS) and PARAMETERS[index] is not None:
+        return str(PARAMETERS[index])
+    return ""
+
+def GetParameter(index):
+    if index < len(PARAMETERS):
+        return PARAMETERS[index]
+    return None
+
+class Filter(object):
+    """Value filter of a tool parameter."""
+
+    def __init__(self):
+        self.type = "ValueList"
+        self.list = []
+
+    @property
+    def List(self):
+        return self.list
+
+    @List.setter
+    def List(self, value):
+        self.list = value
+
+class Parameter(object):
+    """Tool parameter of the .pyt toolbox, enough to load the toolbox and
+    run its validation outside of ArcGIS."""
+
+    def __init__(self, name = None, displayName = None, direction = None,
+                 datatype = None, parameterType = None, enabled = True,
+                 category = None, symbology = None, multiValue = False):
+        self.name = name
+        self.displayName = displayName
+        self.direction = direction
+        self.datatype = datatype
+        self.parameterType = parameterType
+        self.enabled = enabled
+        self.category = category
+        self.symbology = symbology
+        self.multiValue = multiValue
+        self.value = None
+        self.filter = Filter()
+        self.parameterDependencies = []
+        self.controlCLSID = None
+        self.altered = False
+        self.hasBeenValidated = False
+        self.message = ""
+
+    @property
+    def Value(self):
+        return self.value
+
+    @Value.setter
+    def Value(self, value):
+        self.value = value
+
+    @property
+    def Filter(self):
+        return self.filter
+
+    @property
+    def valueAsText(self):
+        if self.value is None:
+            return None
+        return str(self.value)
+
+    def setWarningMessage(self, message):
+        self.message = message
+
+    def setErrorMessage(self, message):
+        self.message = message
+
+    def clearMessage(self):
+        self.message = ""
+
+def ValidateFieldName(name, workspace = None):
+    """Replaces the characters not allowed in a field name."""
+
+    name = RE.sub(r"[^0-9A-Za-z_]", "_", name)
+    if not name or name[0].isdigit():
+        name = "F" + name
+    return name
+
+def Exists(dataset):
+    return OS.path.exists(dataset)
+
+class DataAccess(object):
+    """Stand-in for arcpy.da on shapefiles and dBASE tables."""
+
+    def FeatureClassToNumPyArray(self, inputFC, fieldNames,
+                                 skip_nulls = False, **kwargs):
+        import SSDataObject as SSDO
+        return SSDO.readArray(inputFC, fieldNames, skipNulls = skip_nulls)
+
+    def NumPyArrayToTable(self, array, outputTable):
+        import SSDataObject as SSDO
+        SSDO.writeTable(array, outputTable)
+
+da = DataAccess()
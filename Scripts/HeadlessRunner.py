@@ -0,0 +1,319 @@
+"""
+Runs the tools of the toolkit from the command line, without ArcGIS.
+
+The stand-ins in the Headless folder take the place of arcpy, SSDataObject,
+SSUtilities and WeightsUtilities, so shapefiles and dBASE tables are read
+through pysal IO.  Each command runs one tool of the toolbox; the batch
+command runs a file of commands, one per line, in worker processes.
+
+    python HeadlessRunner.py contw columbus.shp columbus.gal --id POLYID
+    python HeadlessRunner.py ols columbus.shp HOVAL INC CRIME \\
+        --weights columbus.gal --output columbus_ols.csv
+    python HeadlessRunner.py batch jobs.txt --workers 8
+
+Results of the regression tools are written by the extension of --output:
+a shapefile copies the features, a .dbf, .csv, .npz or .parquet file holds
+the master ID and the result fields only.  The exit status is 1 when a tool
+reports an error.
+"""
+
+import os as OS
+import sys as SYS
+import math as MATH
+import argparse as ARG
+import shlex as SHLEX
+import concurrent.futures as FUTURES
+
+#### Stand-ins First, Then the Toolkit ####
+SCRIPTDIR = OS.path.dirname(OS.path.abspath(__file__))
+HEADLESSDIR = OS.path.join(SCRIPTDIR, "Headless")
+for path in [SCRIPTDIR, HEADLESSDIR]:
+    if path in SYS.path:
+        SYS.path.remove(path)
+    SYS.path.insert(0, path)
+
+#### Distance Methods by Command Line Name ####
+DISTANCEMETHODS = {"THRESHOLD": "THRESHOLD DISTANCE",
+                   "KNN": "K NEAREST NEIGHBORS",
+                   "INVERSE": "INVERSE DISTANCE"}
+
+def loadRegressionData(args):
+    """Reads the features and the weights of a regression command.
+
+    RETURN:
+    ssdo (obj): SSDataObject stand-in holding the variables
+    patW (obj): PAT_W of the weights file
+    """
+
+    import SSDataObject as SSDO
+    import pysal2ArcUtils as AUTILS
+
+    depVarName = args.dependent.upper()
+    indVarNames = [name.upper() for name in args.explanatory]
+    ssdo = SSDO.SSDataObject(args.input, templateFC = args.output)
+    masterField = AUTILS.setUniqueIDField(ssdo, args.weights)
+    ssdo.obtainData(masterField, [depVarName] + indVarNames, minNumObs = 5)
+    patW = AUTILS.PAT_W(ssdo, args.weights)
+    return ssdo, depVarName, indVarNames, patW
+
+def runContW(args):
+    import ContWeightsCreator as CONT
+    contW = CONT.ContW_PySAL(args.input, args.output, args.id,
+                             args.type.upper(), args.order, args.lowerOrders)
+    contW.createOutput(args.rowStandard)
+
+def runDistW(args):
+    import DistWeightsCreator as DIST
+    distanceType = DISTANCEMETHODS[args.method.upper()]
+    isKNN = args.method.upper() == "KNN"
+    threshold, knnNum = args.threshold, args.k
+    if (threshold is None and not isKNN) or (knnNum is None and isKNN):
+        import arcpy as ARCPY
+        import DistanceUtils as DUTILS
+        ids, xyCoords = DUTILS.extractPoints(args.input, args.id)
+        if isKNN:
+            #### Cubic Root of the Number of Features, as in the Dialog ####
+            knnNum = int(MATH.ceil(len(ids) ** (1.0 / 3)))
+        else:
+            threshold, numLinks = DUTILS.estimateThreshold(xyCoords)
+            msg = DUTILS.linkCountWarning(numLinks, len(ids))
+            if msg:
+                ARCPY.AddWarning(msg)
+    distW = DIST.DistW_PySAL(args.input, args.output, args.id, distanceType,
+                             threshold, knnNum, args.power)
+    distW.createOutput(args.rowStandard)
+
+def runKernelW(args):
+    import KernelWeightsCreator as KERNEL
+    kernW = KERNEL.KernelW_PySAL(args.input, args.output, args.id,
+                                 args.kernel.upper(), args.k,
+                                 bandwidthType = args.bandwidth.upper(),
+                                 maxLinks = args.maxLinks)
+    kernW.createOutput(args.rowStandard)
+
+def runConvert(args):
+    import shutil as SHUTIL
+    import pysal2ArcUtils as AUTILS
+    import WeightConvertor as CONVERT
+    inputExt = AUTILS.returnWeightFileType(args.input)
+    outputExt = AUTILS.returnWeightFileType(args.output)
+    if not args.features and not args.id and inputExt == outputExt:
+        SHUTIL.copyfile(args.input, args.output)
+        return
+    convertor = CONVERT.WeightConvertor(args.input, args.output,
+                                        args.features, args.id,
+                                        inputExt, outputExt)
+    convertor.createOutput(args.rowStandard)
+
+def runOLS(args):
+    import OLSPySAL as OLS_PYSAL
+    ssdo, depVarName, indVarNames, patW = loadRegressionData(args)
+    ols = OLS_PYSAL.OLS_PySAL(ssdo, depVarName, indVarNames, patW,
+                              diagnostics = args.diagnostics)
+    ols.createOutput(args.output, outFormat = args.format)
+
+def runError(args):
+    import SpError as ERROR
+    ssdo, depVarName, indVarNames, patW = loadRegressionData(args)
+    error = ERROR.Error_PySAL(ssdo, depVarName, indVarNames, patW,
+                              args.estimator.upper(),
+                              mlMethod = args.mlMethod,
+                              diagnostics = args.diagnostics)
+    error.createOutput(args.output, outFormat = args.format)
+
+def runLag(args):
+    import SpLag as LAG
+    ssdo, depVarName, indVarNames, patW = loadRegressionData(args)
+    lag = LAG.Lag_PySAL(ssdo, depVarName, indVarNames, patW,
+                        modelType = args.estimator.upper(),
+                        kernelType = args.kernel, kernelKNN = args.k,
+                        mlMethod = args.mlMethod, ePred = args.ePred,
+                        diagnostics = args.diagnostics)
+    lag.createOutput(args.output, outFormat = args.format)
+
+def runAuto(args):
+    import AutoModel as AUTO
+    ssdo, depVarName, indVarNames, patW = loadRegressionData(args)
+    auto = AUTO.AutoSpace_PySAL(ssdo, depVarName, indVarNames, patW,
+                                pValue = args.pValue,
+                                modelType = args.estimator.upper(),
+                                kernelType = args.kernel, kernelKNN = args.k,
+                                ePred = args.ePred,
+                                diagnostics = args.diagnostics,
+                                speculative = args.speculative)
+    auto.createOutput(args.output, outFormat = args.format)
+
+def runBatch(args):
+    """Runs every command of a jobs file, one per line, in worker
+    processes.  Blank lines and lines starting with # are skipped."""
+
+    jobs = []
+    with open(args.jobs) as jobsFile:
+        for line in jobsFile:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                jobs.append(line)
+
+    numFailed = 0
+    with FUTURES.ProcessPoolExecutor(max_workers = args.workers) as pool:
+        for job, status in zip(jobs, pool.map(runJob, jobs)):
+            if status:
+                numFailed += 1
+                SYS.stderr.write("FAILED: {0}\n".format(job))
+    if numFailed:
+        SYS.stderr.write("{0} of {1} jobs failed\n".format(numFailed,
+                                                           len(jobs)))
+        raise SystemExit(1)
+
+def runJob(line):
+    """Runs one line of a jobs file, returns the exit status."""
+
+    return main(SHLEX.split(line))
+
+def addRegressionArguments(parser):
+    parser.add_argument("input", help = "shapefile or dBASE table")
+    parser.add_argument("dependent", help = "dependent variable")
+    parser.add_argument("explanatory", nargs = "+",
+                        help = "explanatory variables")
+    parser.add_argument("--weights", "-w", required = True,
+                        help = "GAL, GWT, KWT or SWM weights file")
+    parser.add_argument("--output", "-o", required = True,
+                        help = "shapefile, dBASE, CSV, NPZ or Parquet file")
+    parser.add_argument("--format", default = None,
+                        help = "TABLE, NPZ, PARQUET or CSV, by the "
+                               "extension of the output if not given")
+    parser.add_argument("--diagnostics", default = "FULL",
+                        choices = ["COEFFICIENTS", "STANDARD", "FULL"])
+
+def buildParser():
+    parser = ARG.ArgumentParser(prog = "HeadlessRunner",
+                                description = "Runs the PySAL toolkit "
+                                              "without ArcGIS.")
+    parser.add_argument("--quiet", "-q", action = "store_true",
+                        help = "only report warnings and errors")
+    commands = parser.add_subparsers(dest = "command")
+    commands.required = True
+
+    #### Weights ####
+    contw = commands.add_parser("contw", help = "contiguity weights")
+    contw.add_argument("input")
+    contw.add_argument("output", help = "GAL, GWT or SWM file")
+    contw.add_argument("--id", default = None, help = "unique ID field")
+    contw.add_argument("--type", default = "QUEEN",
+                       choices = ["QUEEN", "ROOK"])
+    contw.add_argument("--order", type = int, default = 1)
+    contw.add_argument("--lower-orders", dest = "lowerOrders",
+                       action = "store_true")
+    contw.add_argument("--row-standard", dest = "rowStandard",
+                       action = "store_true")
+    contw.set_defaults(run = runContW)
+
+    distw = commands.add_parser("distw", help = "distance-based weights")
+    distw.add_argument("input")
+    distw.add_argument("output", help = "GAL, GWT or SWM file")
+    distw.add_argument("--id", default = None, help = "unique ID field")
+    distw.add_argument("--method", default = "THRESHOLD",
+                       choices = sorted(DISTANCEMETHODS))
+    distw.add_argument("--threshold", type = float, default = None,
+                       help = "distance band, the smallest giving every "
+                              "feature a neighbor if not given")
+    distw.add_argument("--k", type = int, default = None,
+                       help = "number of nearest neighbors, the cubic "
+                              "root of the number of features if not given")
+    distw.add_argument("--power", type = float, default = 1.0,
+                       help = "power of the inverse distance")
+    distw.add_argument("--row-standard", dest = "rowStandard",
+                       action = "store_true")
+    distw.set_defaults(run = runDistW)
+
+    kernelw = commands.add_parser("kernelw", help = "kernel weights")
+    kernelw.add_argument("input")
+    kernelw.add_argument("output", help = "KWT or SWM file")
+    kernelw.add_argument("--id", required = True, help = "unique ID field")
+    kernelw.add_argument("--kernel", default = "UNIFORM")
+    kernelw.add_argument("--k", type = int, default = 2,
+                         help = "number of neighbors of the bandwidth")
+    kernelw.add_argument("--bandwidth", default = "FIXED",
+                         choices = ["FIXED", "ADAPTIVE"])
+    kernelw.add_argument("--max-links", dest = "maxLinks", type = int,
+                         default = None)
+    kernelw.add_argument("--row-standard", dest = "rowStandard",
+                         action = "store_true")
+    kernelw.set_defaults(run = runKernelW)
+
+    convert = commands.add_parser("convert", help = "convert weights files")
+    convert.add_argument("input", help = "GAL, GWT, KWT or SWM file")
+    convert.add_argument("output", help = "GAL, GWT, KWT or SWM file")
+    convert.add_argument("--features", default = None,
+                         help = "dataset of the weights, for GAL files "
+                                "without a unique ID field")
+    convert.add_argument("--id", default = None, help = "unique ID field")
+    convert.add_argument("--row-standard", dest = "rowStandard",
+                         action = "store_true")
+    convert.set_defaults(run = runConvert)
+
+    #### Regression ####
+    ols = commands.add_parser("ols", help = "ordinary least squares")
+    addRegressionArguments(ols)
+    ols.set_defaults(run = runOLS)
+
+    error = commands.add_parser("error", help = "spatial error model")
+    addRegressionArguments(error)
+    error.add_argument("--estimator", default = "GMM",
+                       choices = ["GMM", "GMM_HAC", "ML"])
+    error.add_argument("--ml-method", dest = "mlMethod", default = "AUTO")
+    error.set_defaults(run = runError)
+
+    lag = commands.add_parser("lag", help = "spatial lag model")
+    addRegressionArguments(lag)
+    lag.add_argument("--estimator", default = "GMM_COMBO",
+                     choices = ["GMM_COMBO", "GMM_HAC", "ML"])
+    lag.add_argument("--kernel", default = "UNIFORM")
+    lag.add_argument("--k", type = int, default = 2,
+                     help = "number of neighbors of the HAC kernel")
+    lag.add_argument("--ml-method", dest = "mlMethod", default = "AUTO")
+    lag.add_argument("--no-reduced-form-error", dest = "ePred",
+                     action = "store_false")
+    lag.set_defaults(run = runLag)
+
+    auto = commands.add_parser("auto", help = "automatic model search")
+    addRegressionArguments(auto)
+    auto.add_argument("--p-value", dest = "pValue", type = float,
+                      default = 0.1)
+    auto.add_argument("--estimator", default = "GMM_COMBO",
+                      choices = ["GMM_COMBO", "GMM_HAC"])
+    auto.add_argument("--kernel", default = "UNIFORM")
+    auto.add_argument("--k", type = int, default = 2,
+                      help = "number of neighbors of the HAC kernel")
+    auto.add_argument("--no-reduced-form-error", dest = "ePred",
+                      action = "store_false")
+    auto.add_argument("--speculative", action = "store_true",
+                      default = None,
+                      help = "fit the likely candidates in parallel")
+    auto.set_defaults(run = runAuto)
+
+    #### Many Jobs ####
+    batch = commands.add_parser("batch", help = "run a file of commands")
+    batch.add_argument("jobs", help = "one command line per line")
+    batch.add_argument("--workers", type = int, default = None)
+    batch.set_defaults(run = runBatch)
+
+    return parser
+
+def main(argv = None):
+    """Runs a command, returns the exit status."""
+
+    import arcpy as ARCPY
+    try:
+        args = buildParser().parse_args(argv)
+        ARCPY.QUIET = ARCPY.QUIET or args.quiet
+        args.run(args)
+    except SystemExit as exitError:
+        #### Tools Raise SystemExit() After Reporting an Error ####
+        if exitError.code is None:
+            return 1
+        return exitError.code
+    return 0
+
+if __name__ == '__main__':
+    SYS.exit(main())
@@ -0,0 +1,201 @@
+"""
+KD-tree backed sparse kernel weights shared by the kernel weights tool and
+the HAC estimators of the regression tools.
+
+Kernel weights are memoized on a digest of the coordinates and the kernel
+parameters, in memory for the current session and on disk through
+WeightsCache, so re-running a HAC specification on the same features skips
+the kernel construction entirely.
+"""
+
+import hashlib as HASH
+import numpy as NUM
+import scipy.spatial as SPATIAL
+import pysal2ArcUtils as AUTILS
+import WeightsCache as WCACHE
+from libpysal.weights import Kernel
+
+KERNELTYPES = ['UNIFORM', 'TRIANGULAR', 'QUADRATIC', 'QUARTIC', 'GAUSSIAN']
+
+#### Bandwidth Inflation so the K-th Neighbor Gets a Positive Weight ####
+BANDWIDTHEPS = 1.0000001
+
+#### Kernels Kept in Memory for the Session ####
+KERNELCACHE = {}
+MAXKERNELCACHE = 4
+
+class KernelW(AUTILS.SparseW, Kernel):
+    """SparseW that is also a PySAL Kernel.
+
+    spreg only accepts Kernel instances as the kernel weights of the HAC
+    estimators; the weights themselves still live in the CSR arrays.
+    """
+
+    def __init__(self, sparse, ids = None, kernelType = "UNIFORM", k = 2,
+                 fixed = True, varName = None):
+        AUTILS.SparseW.__init__(self, sparse, ids = ids, varName = varName)
+        self.function = kernelType.lower()
+        self.k = int(k)
+        self.fixed = fixed
+
+def kernelFunction(z, kernelType):
+    """Evaluates a kernel function on standardized distances.
+
+    INPUTS:
+    z (array): distances divided by the bandwidth
+    kernelType (str): one of KERNELTYPES
+
+    RETURN:
+    values (array): kernel value of each distance
+    """
+
+    kernelType = kernelType.upper()
+    if kernelType == 'TRIANGULAR':
+        return 1.0 - z
+    elif kernelType == 'UNIFORM':
+        return NUM.ones(z.shape) * 0.5
+    elif kernelType == 'QUADRATIC':
+        return (3.0 / 4) * (1.0 - z**2)
+    elif kernelType == 'QUARTIC':
+        return (15.0 / 16) * (1.0 - z**2)**2
+    elif kernelType == 'GAUSSIAN':
+        return (2.0 * NUM.pi)**(-0.5) * NUM.exp(-(z**2) / 2.0)
+    raise ValueError("Unsupported kernel function %s" % kernelType)
+
+def kernelKey(xyCoords, kernelType, k, fixed, diagonal, maxLinks = None):
+    """Builds the memoization key of a kernel.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+    kernelType (str): one of KERNELTYPES
+    k (int): number of nearest neighbors defining the bandwidth
+    fixed (bool): fixed (True) or adaptive (False) bandwidth
+    diagonal (bool): set the weight of each feature on itself to one
+    maxLinks {int, None}: cap on the number of neighbors of each feature
+
+    RETURN:
+    key (str): hex digest
+    """
+
+    xyCoords = NUM.ascontiguousarray(xyCoords, dtype = float)
+    items = [WCACHE.CACHEVERSION, "KERNEL", kernelType.upper(), str(int(k)),
+             str(bool(fixed)), str(bool(diagonal)), str(maxLinks),
+             str(xyCoords.shape)]
+    digest = HASH.sha1("|".join(items).encode("utf-8"))
+    digest.update(xyCoords.tobytes())
+    return digest.hexdigest()
+
+def kernelLinks(xyCoords, kernelType, k, fixed = True, maxLinks = None):
+    """Finds the links and kernel values of every feature.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+    kernelType (str): one of KERNELTYPES
+    k (int): number of nearest neighbors defining the bandwidth
+    fixed {bool, True}: one bandwidth for all features (the largest k-th
+                        neighbor distance) or one per feature (adaptive)
+    maxLinks {int, None}: keep only the nearest maxLinks neighbors within
+                          the bandwidth, bounding memory by n * maxLinks
+
+    RETURN:
+    rows (array): index of the focal feature of each link (self included)
+    neighs (array): index of the neighbor of each link
+    values (array): kernel weight of each link
+    """
+
+    xyCoords = NUM.ascontiguousarray(xyCoords, dtype = float)
+    numObs = len(xyCoords)
+    tree = SPATIAL.cKDTree(xyCoords)
+    numNeighs = min(int(k) + 1, numObs)
+    dists, neighs = tree.query(xyCoords, k = numNeighs)
+    dists = dists.reshape(numObs, numNeighs)
+    neighs = neighs.reshape(numObs, numNeighs)
+
+    if fixed and maxLinks:
+        #### Nearest Neighbors Within the Bandwidth, at Most maxLinks ####
+        bandwidth = dists.max() * BANDWIDTHEPS
+        numNeighs = min(int(maxLinks) + 1, numObs)
+        dists, neighs = tree.query(xyCoords, k = numNeighs,
+                                   distance_upper_bound = bandwidth)
+        dists = dists.reshape(numObs, numNeighs)
+        neighs = neighs.reshape(numObs, numNeighs)
+        found = neighs < numObs
+        rows = NUM.repeat(NUM.arange(numObs), found.sum(1))
+        neighs = neighs[found]
+        z = dists[found] / bandwidth
+    elif fixed:
+        bandwidth = dists.max() * BANDWIDTHEPS
+        links = tree.sparse_distance_matrix(tree, bandwidth,
+                                            output_type = "ndarray")
+        rows = links["i"]
+        neighs = links["j"]
+        z = links["v"] / bandwidth
+        del links
+    else:
+        #### Per-Feature Bandwidth, Nearest Links Kept if Capped ####
+        bandwidth = dists.max(1) * BANDWIDTHEPS
+        if maxLinks and int(maxLinks) + 1 < numNeighs:
+            numNeighs = int(maxLinks) + 1
+            dists = dists[:,:numNeighs]
+            neighs = neighs[:,:numNeighs]
+        rows = NUM.repeat(NUM.arange(numObs), numNeighs)
+        z = (dists / bandwidth[:,None]).ravel()
+        neighs = neighs.ravel()
+
+    values = kernelFunction(z, kernelType)
+    sortOrder = NUM.lexsort((neighs, rows))
+    return rows[sortOrder], neighs[sortOrder], values[sortOrder]
+
+def buildKernel(xyCoords, kernelType, k, fixed = True, diagonal = False,
+                ids = None, useCache = True, maxLinks = None):
+    """Returns sparse kernel weights, memoized on the coordinates and the
+    kernel parameters.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+    kernelType (str): one of KERNELTYPES
+    k (int): number of nearest neighbors defining the bandwidth
+    fixed {bool, True}: fixed or adaptive bandwidth
+    diagonal {bool, False}: set the weight of each feature on itself to one
+    ids {array, None}: id of each feature, 0-based order if None
+    useCache {bool, True}: look up and store the kernel in the caches
+    maxLinks {int, None}: cap on the number of neighbors of each feature
+
+    RETURN:
+    w (KernelW): kernel weights
+    """
+
+    key = kernelKey(xyCoords, kernelType, k, fixed, diagonal, maxLinks)
+    arrays = None
+    if useCache:
+        arrays = KERNELCACHE.get(key)
+        if arrays is None:
+            arrays = WCACHE.loadArrays(key)
+
+    if arrays is None:
+        rows, neighs, values = kernelLinks(xyCoords, kernelType, k, fixed,
+                                           maxLinks)
+        if diagonal:
+            values[rows == neighs] = 1.0
+        sparse, order = AUTILS.links2CSR(NUM.arange(len(xyCoords)), rows,
+                                         neighs, values)
+        del rows, neighs, values
+        arrays = AUTILS.weights2Arrays(AUTILS.SparseW(sparse, ids = order))
+        if useCache:
+            WCACHE.storeArrays(key, arrays)
+
+    if useCache:
+        if key not in KERNELCACHE and len(KERNELCACHE) >= MAXKERNELCACHE:
+            KERNELCACHE.pop(next(iter(KERNELCACHE)))
+        KERNELCACHE[key] = arrays
+
+    #### Fresh Object per Call, Transforms Never Leak Between Runs ####
+    w = AUTILS.arrays2Weights(arrays)
+    sparse, order = w.sparse, w.id_order
+    if ids is not None:
+        ids = NUM.asarray(ids)
+        sparse = sparse.tocoo()
+        sparse, order = AUTILS.links2CSR(ids, ids[sparse.row],
+                                         ids[sparse.col], sparse.data)
+    return KernelW(sparse, ids = order, kernelType = kernelType, k = k,
+                   fixed = fixed)
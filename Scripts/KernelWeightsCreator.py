@@ -5,16 +5,16 @@ Author(s): Xun Li, Xing Kang, Sergio Rey
 """
 
 import arcpy as ARCPY
-import pysal as PYSAL
-import pysal.lib.io as FileIO
-import pysal.lib.weights as WEIGHTS
+import libpysal.io as FileIO
 import SSDataObject as SSDO
 import SSUtilities as UTILS
 import pysal2ArcUtils as AUTILS
 import WeightsUtilities as WU
+import KernelUtils as KUTILS
 
 EXTENSIONS = ['KWT', 'SWM']
 KERNELTYPE = ['UNIFORM', 'TRIANGULAR', 'QUADRATIC', 'QUARTIC', 'GAUSSIAN']
+BANDWIDTHTYPE = ['FIXED', 'ADAPTIVE']
 
 def setupParameters():
     """ Setup Parameters for Kernel-based Weights Creation """
@@ -23,13 +23,24 @@ def setupParameters():
     kernelType = ARCPY.GetParameterAsText(2).upper()
     neighborNum = UTILS.getNumericParameter(3)
     idField = UTILS.getTextParameter(4)
+    bandwidthType = UTILS.getTextParameter(5)
+    maxLinks = UTILS.getNumericParameter(6)
 
     if kernelType not in KERNELTYPE:
         ARCPY.AddError("Kernel type is not in the predefined list...")
         raise SystemExit()
 
+    #### Validate Input of Bandwidth Type ####
+    bandwidthType = bandwidthType.upper() if bandwidthType else \
+                    BANDWIDTHTYPE[0]
+    if bandwidthType not in BANDWIDTHTYPE:
+        ARCPY.AddError("Bandwidth type can only be Fixed or Adaptive...")
+        raise SystemExit()
+
     #### Run Kernel Weights Creation ####
-    kernW = KernelW_PySAL(inputFC, outputFile, kernelType, neighborNum, idField)
+    kernW = KernelW_PySAL(inputFC, outputFile, idField, kernelType, 
+                          neighborNum, bandwidthType = bandwidthType,
+                          maxLinks = maxLinks)
     
     #### Create Output ####
     kernW.createOutput()
@@ -37,7 +48,8 @@ def setupParameters():
 class KernelW_PySAL(object):
     """ Create Kernel-based Spatial Weights Using PySAL """
     
-    def __init__(self, inputFC, outputFile, idField, kernelType, neighborNum):
+    def __init__(self, inputFC, outputFile, idField, kernelType, neighborNum,
+                 bandwidthType = 'FIXED', maxLinks = None):
         
         #### Set Initial Attributes ####
         UTILS.assignClassAttr(self, locals())
@@ -92,11 +104,14 @@ class KernelW_PySAL(object):
         
         #### Create Kernel-based WeightObj (0-based IDs) ####
         dataArray = ssdo.xyCoords
-        masterIDs = range(ssdo.numObs)
+        masterIDs = list(range(ssdo.numObs))
         if idField: 
             masterIDs = [ssdo.order2Master[i] for i in masterIDs]
-        weightObj = WEIGHTS.Kernel(dataArray, fixed=True, k=neighborNum, \
-                                   function=kernelType, ids=masterIDs)
+        fixed = self.bandwidthType.upper() != BANDWIDTHTYPE[1]
+        maxLinks = int(self.maxLinks) if self.maxLinks else None
+        weightObj = KUTILS.buildKernel(dataArray, kernelType, neighborNum, \
+                                       fixed=fixed, ids=masterIDs, \
+                                       maxLinks=maxLinks)
     
         #### Save weightObj Class Object for Writing Result #### 
         self.weightObj = weightObj 
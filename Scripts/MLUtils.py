@@ -0,0 +1,430 @@
+"""
+Maximum likelihood spatial lag and error models that scale to large inputs.
+The log-determinant of (I - rho W) in the concentrated likelihood comes from
+a sparse LU factorization, a Monte-Carlo estimate of the traces of the
+powers of W (Barry and Pace 1999), a Chebyshev expansion (Pace and LeSage
+2004) or a table of exact values over a grid of rho.  The traces of the
+information matrix are estimated from random vectors, so no n x n matrix is
+ever formed.
+"""
+
+import numpy as NUM
+import scipy.sparse as SPARSE
+import scipy.sparse.linalg as SLINALG
+import scipy.optimize as OPT
+import scipy.interpolate as INTERP
+import scipy.stats as STATS
+import arcpy as ARCPY
+import RegressionUtils as RUTILS
+
+#### Log-Determinant Methods ####
+LOGDETMETHODS = ["LU", "CHEBYSHEV", "MONTECARLO", "GRID"]
+
+#### Terms of the Monte-Carlo Series and of the Chebyshev Expansion ####
+NUMPOWERS = 50
+CHEBYSHEVORDER = 30
+
+#### Random Vectors of the Trace Estimates, Handled in Blocks ####
+NUMVECTORS = 40
+VECTORBLOCK = 10
+SEED = 100
+
+#### Grid of the Table Method ####
+GRIDPOINTS = 41
+GRIDLIMIT = 0.99
+
+#### Bounds and Tolerance of the Search for the Spatial Coefficient ####
+RHOBOUNDS = (-0.99, 0.99)
+RHOTOLERANCE = 1e-7
+
+def sparseWeights(w):
+    """Returns the weights as a CSR matrix."""
+
+    return SPARSE.csr_matrix(getattr(w, "sparse", w), dtype = float)
+
+def randomBlocks(numObs, numVectors = NUMVECTORS, seed = SEED):
+    """Yields blocks of random +1/-1 vectors (Hutchinson), the same vectors
+    on every call with the same seed."""
+
+    state = NUM.random.RandomState(seed)
+    remaining = numVectors
+    while remaining > 0:
+        size = min(remaining, VECTORBLOCK)
+        yield state.choice([-1.0, 1.0], size = (numObs, size))
+        remaining -= size
+
+def exactTraces(wSparse):
+    """Returns the exact traces of W and W^2."""
+
+    return wSparse.diagonal().sum(), wSparse.multiply(wSparse.T).sum()
+
+def powerTraces(wSparse, numPowers = NUMPOWERS, numVectors = NUMVECTORS):
+    """Estimates the traces of W, W^2, ..., W^numPowers.
+
+    INPUTS:
+    wSparse (csr_matrix): n x n spatial weights
+    numPowers {int, NUMPOWERS}: highest power
+    numVectors {int, NUMVECTORS}: random vectors of the estimate
+
+    RETURN:
+    traces (array): numPowers traces, the first two exact
+    """
+
+    traces = NUM.zeros(numPowers)
+    for block in randomBlocks(wSparse.shape[0], numVectors):
+        power = block
+        for j in range(numPowers):
+            power = wSparse * power
+            traces[j] += (block * power).sum()
+    traces /= numVectors
+    traces[:2] = exactTraces(wSparse)[:min(numPowers, 2)]
+    return traces
+
+def chebyshevTraces(wSparse, order = CHEBYSHEVORDER,
+                    numVectors = NUMVECTORS):
+    """Estimates the traces of the Chebyshev polynomials T_0(W), ...,
+    T_order(W), from the recurrence T_j+1 = 2 W T_j - T_j-1.
+
+    RETURN:
+    traces (array): order + 1 traces, the first three exact
+    """
+
+    numObs = wSparse.shape[0]
+    traces = NUM.zeros(order + 1)
+    for block in randomBlocks(numObs, numVectors):
+        previous, current = block, wSparse * block
+        for j in range(2, order + 1):
+            previous, current = current, 2.0 * (wSparse * current) - previous
+            traces[j] += (block * current).sum()
+    traces /= numVectors
+    traceW, traceW2 = exactTraces(wSparse)
+    traces[:3] = [numObs, traceW, 2.0 * traceW2 - numObs][:order + 1]
+    return traces
+
+def luLogDet(wSparse, rho):
+    """Returns log|I - rho W| from a sparse LU factorization, -inf if the
+    matrix is singular."""
+
+    system = SPARSE.identity(wSparse.shape[0], format = "csc") - \
+             rho * wSparse.tocsc()
+    try:
+        factor = SLINALG.splu(system)
+    except RuntimeError:
+        return -NUM.inf
+    return NUM.log(NUM.abs(factor.U.diagonal())).sum()
+
+def logDetFunction(w, method):
+    """Prepares the log-determinant of (I - rho W) as a function of rho.
+
+    INPUTS:
+    w (PySAL W): spatial weights, eigenvalues in [-1, 1] for the Chebyshev
+                 and Monte-Carlo methods (e.g. row standardized)
+    method (str): one of LOGDETMETHODS
+
+    RETURN:
+    logDet (function): rho -> log|I - rho W|
+    """
+
+    wSparse = sparseWeights(w)
+    numObs = wSparse.shape[0]
+
+    if method == "LU":
+        return lambda rho: luLogDet(wSparse, rho)
+
+    if method == "MONTECARLO":
+        traces = powerTraces(wSparse)
+        powers = NUM.arange(1, len(traces) + 1)
+        weights = traces / powers
+        return lambda rho: -NUM.dot(weights, rho ** powers)
+
+    if method == "CHEBYSHEV":
+        traces = chebyshevTraces(wSparse)
+        order = len(traces) - 1
+        angles = NUM.pi * (NUM.arange(1, order + 2) - 0.5) / (order + 1)
+        nodes = NUM.cos(angles)
+        basis = NUM.cos(NUM.outer(NUM.arange(order + 1), angles))
+        def logDet(rho):
+            coefs = 2.0 / (order + 1) * NUM.dot(basis,
+                                                NUM.log(1.0 - rho * nodes))
+            return NUM.dot(coefs, traces) - coefs[0] * numObs / 2.0
+        return logDet
+
+    #### Table of Exact Values, Interpolated Between Grid Points ####
+    grid = NUM.linspace(-GRIDLIMIT, GRIDLIMIT, GRIDPOINTS)
+    table = NUM.array([luLogDet(wSparse, rho) for rho in grid])
+    spline = INTERP.CubicSpline(grid, table)
+    return lambda rho: float(spline(rho))
+
+def informationTraces(w, rho, method = None):
+    """Estimates the traces of the information matrix of the lag and error
+    models, with A = W (I - rho W)^-1: tr(A), tr(A A) and tr(A'A).
+
+    INPUTS:
+    w (PySAL W): spatial weights
+    rho (float): spatial coefficient
+    method {str, None}: reduced form method, see RegressionUtils.reducedForm
+
+    RETURN:
+    traceA, traceAA, traceAtA (float): the three traces
+    """
+
+    wSparse = sparseWeights(w)
+    traceA, traceAA, traceAtA = 0.0, 0.0, 0.0
+    for block in randomBlocks(wSparse.shape[0]):
+        aBlock = wSparse * RUTILS.reducedForm(wSparse, block, rho, method)
+        aaBlock = wSparse * RUTILS.reducedForm(wSparse, aBlock, rho, method)
+        traceA += (block * aBlock).sum()
+        traceAA += (block * aaBlock).sum()
+        traceAtA += (aBlock * aBlock).sum()
+    return (traceA / NUMVECTORS, traceAA / NUMVECTORS,
+            traceAtA / NUMVECTORS)
+
+def maximizeConcentrated(negLogLik):
+    """Returns the spatial coefficient minimizing a concentrated negative
+    log-likelihood and the minimum."""
+
+    result = OPT.minimize_scalar(negLogLik, bounds = RHOBOUNDS,
+                                 method = "bounded",
+                                 options = {"xatol": RHOTOLERANCE})
+    return float(result.x), float(result.fun)
+
+def logMethod(method):
+    """Validates a log-determinant method of MLUtils."""
+
+    method = method.upper()
+    if method not in LOGDETMETHODS:
+        ARCPY.AddError("The log-determinant method {0} is not in {1}".format(
+                       method, ", ".join(LOGDETMETHODS)))
+        raise SystemExit()
+    return method
+
+def likelihoodRatio(logLik, olsSSR, numObs):
+    """Returns the likelihood ratio test of a zero spatial coefficient.
+
+    INPUTS:
+    logLik (float): log-likelihood of the spatial model
+    olsSSR (float): sum of squared OLS residuals
+    numObs (int): number of features
+
+    RETURN:
+    lr (tuple): statistic and its chi-square (1 df) p-value
+    """
+
+    olsLogLik = -numObs / 2.0 * (NUM.log(2.0 * NUM.pi) + 1.0 +
+                                 NUM.log(olsSSR / numObs))
+    stat = max(2.0 * (logLik - olsLogLik), 0.0)
+    return stat, float(STATS.chi2.sf(stat, 1))
+
+class ML_Lag(object):
+    """Maximum likelihood spatial lag model, y = rho W y + X b + e.
+
+    INPUTS:
+    y (array): n x 1 dependent variable
+    x (array): n x (k - 1) explanatory variables, without the constant
+    w (PySAL W): spatial weights
+    method {str, CHEBYSHEV}: one of LOGDETMETHODS
+    diagnostics {str, FULL}: COEFFICIENTS fits the estimates only,
+                             STANDARD adds the variance and the summary,
+                             FULL adds the likelihood ratio test of rho
+    reducedForm {str, None}: see RegressionUtils.reducedFormPredictions
+    ePred {bool, True}: keep the reduced form residuals
+    nameY {str, y}: name of the dependent variable
+    nameX {list, None}: names of the explanatory variables
+
+    ATTRIBUTES:
+    betas, rho, u, predy, predy_e, e_pred, sig2, logll and, above
+    COEFFICIENTS, vm, aic, schwarz, pr2, pr2_e; summary
+    """
+
+    def __init__(self, y, x, w, method = "CHEBYSHEV", diagnostics = "FULL",
+                 reducedForm = None, ePred = True, nameY = "y",
+                 nameX = None):
+
+        self.method = logMethod(method)
+        diagnostics = RUTILS.diagnosticLevel(diagnostics)
+        wSparse = sparseWeights(w)
+        self.y = NUM.asarray(y, dtype = float).reshape(-1, 1)
+        self.x = RUTILS.addConstant(x)
+        self.n, numX = self.x.shape
+        self.k = numX + 1
+
+        #### Residuals of y and Wy on X ####
+        xtxi = NUM.linalg.inv(NUM.dot(self.x.T, self.x))
+        yLag = wSparse * self.y
+        b0 = NUM.dot(xtxi, NUM.dot(self.x.T, self.y))
+        b1 = NUM.dot(xtxi, NUM.dot(self.x.T, yLag))
+        e0 = self.y - NUM.dot(self.x, b0)
+        e1 = yLag - NUM.dot(self.x, b1)
+        e0e0, e0e1, e1e1 = (NUM.dot(e0.T, e0).item(), NUM.dot(e0.T, e1).item(),
+                            NUM.dot(e1.T, e1).item())
+
+        #### Concentrated Likelihood ####
+        logDet = logDetFunction(wSparse, self.method)
+        n = self.n
+        def negLogLik(rho):
+            sig2 = (e0e0 - 2.0 * rho * e0e1 + rho * rho * e1e1) / n
+            return n / 2.0 * NUM.log(sig2) - logDet(rho)
+        self.rho, minimum = maximizeConcentrated(negLogLik)
+        self.logll = -minimum - n / 2.0 * (NUM.log(2.0 * NUM.pi) + 1.0)
+
+        b = b0 - self.rho * b1
+        self.betas = NUM.vstack((b, [[self.rho]]))
+        self.u = e0 - self.rho * e1
+        self.predy = self.y - self.u
+        self.sig2 = NUM.dot(self.u.T, self.u).item() / n
+        self.warning = RUTILS.reducedFormPredictions(self, wSparse,
+                                                     method = reducedForm,
+                                                     ePred = ePred)
+
+        if nameX is None:
+            nameX = ["var_{0}".format(i + 1) for i in range(numX - 1)]
+        names = ["CONSTANT"] + list(nameX) + ["W_" + nameY]
+        title = ("MAXIMUM LIKELIHOOD SPATIAL LAG "
+                 "(METHOD = {0})").format(self.method)
+        if diagnostics == "COEFFICIENTS":
+            self.summary = RUTILS.coefficientSummary(title, names, self.betas)
+            return
+
+        #### Information Matrix of b, rho and sigma2 ####
+        traceA, traceAA, traceAtA = informationTraces(wSparse, self.rho,
+                                                      reducedForm)
+        wPredy = wSparse * RUTILS.reducedForm(wSparse, NUM.dot(self.x, b),
+                                              self.rho, reducedForm)
+        xtwp = NUM.dot(self.x.T, wPredy)
+        info = NUM.zeros((self.k + 1, self.k + 1))
+        info[:numX,:numX] = NUM.dot(self.x.T, self.x) / self.sig2
+        info[:numX,numX] = info[numX,:numX] = xtwp.ravel() / self.sig2
+        info[numX,numX] = traceAA + traceAtA + \
+                          NUM.dot(wPredy.T, wPredy).item() / self.sig2
+        info[numX,numX + 1] = info[numX + 1,numX] = traceA / self.sig2
+        info[numX + 1,numX + 1] = n / (2.0 * self.sig2 ** 2)
+        self.vm = NUM.linalg.inv(info)[:-1,:-1]
+
+        self.aic = -2.0 * self.logll + 2.0 * self.k
+        self.schwarz = -2.0 * self.logll + self.k * NUM.log(n)
+        self.pr2 = RUTILS.pseudoR2(self.y, self.predy)
+        self.pr2_e = RUTILS.pseudoR2(self.y, self.predy_e)
+        summaryInfo = [("Dependent Variable", nameY),
+                       ("Number of Observations", int(n)),
+                       ("Number of Variables", int(self.k)),
+                       ("Pseudo R-squared", self.pr2),
+                       ("Spatial Pseudo R-squared", self.pr2_e),
+                       ("Sigma-square ML", self.sig2),
+                       ("Log Likelihood", self.logll),
+                       ("Akaike Info Criterion", self.aic),
+                       ("Schwarz Criterion", self.schwarz)]
+        tests = None
+        if diagnostics == "FULL":
+            self.lr = likelihoodRatio(self.logll, e0e0, n)
+            tests = [("Likelihood Ratio Test", self.lr[0], self.lr[1])]
+        self.summary = RUTILS.inferenceSummary(title, names, self.betas,
+                                               self.vm, info = summaryInfo,
+                                               tests = tests)
+
+class ML_Error(object):
+    """Maximum likelihood spatial error model, y = X b + u with
+    u = lambda W u + e.
+
+    INPUTS:
+    y (array): n x 1 dependent variable
+    x (array): n x (k - 1) explanatory variables, without the constant
+    w (PySAL W): spatial weights
+    method {str, CHEBYSHEV}: one of LOGDETMETHODS
+    diagnostics {str, FULL}: COEFFICIENTS fits the estimates only,
+                             STANDARD adds the variance and the summary,
+                             FULL adds the likelihood ratio test of lambda
+    nameY {str, y}: name of the dependent variable
+    nameX {list, None}: names of the explanatory variables
+
+    ATTRIBUTES:
+    betas, lam, u, predy, e_filtered, sig2, logll and, above COEFFICIENTS,
+    vm, aic, schwarz, pr2; summary
+    """
+
+    def __init__(self, y, x, w, method = "CHEBYSHEV", diagnostics = "FULL",
+                 nameY = "y", nameX = None):
+
+        self.method = logMethod(method)
+        diagnostics = RUTILS.diagnosticLevel(diagnostics)
+        wSparse = sparseWeights(w)
+        self.y = NUM.asarray(y, dtype = float).reshape(-1, 1)
+        self.x = RUTILS.addConstant(x)
+        self.n, numX = self.x.shape
+        self.k = numX + 1
+
+        #### Cross Products of the Filtered Data, Quadratic in lambda ####
+        yLag = wSparse * self.y
+        xLag = wSparse * self.x
+        yy = NUM.dot(self.y.T, self.y).item()
+        yyl = NUM.dot(self.y.T, yLag).item()
+        ylyl = NUM.dot(yLag.T, yLag).item()
+        xx, xxl = NUM.dot(self.x.T, self.x), NUM.dot(self.x.T, xLag)
+        xlxl = NUM.dot(xLag.T, xLag)
+        xy, xyl = NUM.dot(self.x.T, self.y), NUM.dot(self.x.T, yLag)
+        xly, xlyl = NUM.dot(xLag.T, self.y), NUM.dot(xLag.T, yLag)
+
+        def filtered(lam):
+            ysys = yy - 2.0 * lam * yyl + lam * lam * ylyl
+            xsxs = xx - lam * (xxl + xxl.T) + lam * lam * xlxl
+            xsys = xy - lam * (xyl + xly) + lam * lam * xlyl
+            return ysys, xsxs, xsys
+
+        #### Concentrated Likelihood ####
+        logDet = logDetFunction(wSparse, self.method)
+        n = self.n
+        def negLogLik(lam):
+            ysys, xsxs, xsys = filtered(lam)
+            try:
+                b = NUM.linalg.solve(xsxs, xsys)
+            except NUM.linalg.LinAlgError:
+                return NUM.inf
+            sig2 = (ysys - NUM.dot(xsys.T, b).item()) / n
+            return n / 2.0 * NUM.log(sig2) - logDet(lam)
+        self.lam, minimum = maximizeConcentrated(negLogLik)
+        self.logll = -minimum - n / 2.0 * (NUM.log(2.0 * NUM.pi) + 1.0)
+
+        ysys, xsxs, xsys = filtered(self.lam)
+        xsxsi = NUM.linalg.inv(xsxs)
+        b = NUM.dot(xsxsi, xsys)
+        self.betas = NUM.vstack((b, [[self.lam]]))
+        self.u = self.y - NUM.dot(self.x, b)
+        self.predy = self.y - self.u
+        self.e_filtered = self.u - self.lam * (wSparse * self.u)
+        self.sig2 = NUM.dot(self.e_filtered.T, self.e_filtered).item() / n
+
+        if nameX is None:
+            nameX = ["var_{0}".format(i + 1) for i in range(numX - 1)]
+        names = ["CONSTANT"] + list(nameX) + ["lambda"]
+        title = ("MAXIMUM LIKELIHOOD SPATIAL ERROR "
+                 "(METHOD = {0})").format(self.method)
+        if diagnostics == "COEFFICIENTS":
+            self.summary = RUTILS.coefficientSummary(title, names, self.betas)
+            return
+
+        #### Variance of b, Information Matrix of lambda and sigma2 ####
+        traceA, traceAA, traceAtA = informationTraces(wSparse, self.lam)
+        info = NUM.array([[traceAA + traceAtA, traceA / self.sig2],
+                          [traceA / self.sig2, n / (2.0 * self.sig2 ** 2)]])
+        self.vm = NUM.zeros((self.k, self.k))
+        self.vm[:numX,:numX] = self.sig2 * xsxsi
+        self.vm[numX,numX] = NUM.linalg.inv(info)[0,0]
+
+        self.aic = -2.0 * self.logll + 2.0 * self.k
+        self.schwarz = -2.0 * self.logll + self.k * NUM.log(n)
+        self.pr2 = RUTILS.pseudoR2(self.y, self.predy)
+        summaryInfo = [("Dependent Variable", nameY),
+                       ("Number of Observations", int(n)),
+                       ("Number of Variables", int(self.k)),
+                       ("Pseudo R-squared", self.pr2),
+                       ("Sigma-square ML", self.sig2),
+                       ("Log Likelihood", self.logll),
+                       ("Akaike Info Criterion", self.aic),
+                       ("Schwarz Criterion", self.schwarz)]
+        tests = None
+        if diagnostics == "FULL":
+            e0e0 = yy - NUM.dot(xy.T, NUM.linalg.solve(xx, xy)).item()
+            self.lr = likelihoodRatio(self.logll, e0e0, n)
+            tests = [("Likelihood Ratio Test", self.lr[0], self.lr[1])]
+        self.summary = RUTILS.inferenceSummary(title, names, self.betas,
+                                               self.vm, info = summaryInfo,
+                                               tests = tests)
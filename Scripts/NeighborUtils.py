@@ -0,0 +1,303 @@
+"""
+Parallel K nearest neighbor and distance band searches.
+
+The points are split into spatial tiles and each tile is queried against a
+KD-tree of every point from a pool of processes.  The per-tile neighbor
+arrays are merged into one set of links, ordered exactly as a serial search
+orders them, so the weights do not depend on the number of processes.  This
+module only depends on NumPy and SciPy so worker processes start quickly.
+"""
+
+import os as OS
+import sys as SYS
+import numpy as NUM
+import scipy.spatial as SPATIAL
+import concurrent.futures as FUTURES
+import multiprocessing as MP
+
+#### Number of Processes (Override With Environment Variable) ####
+NUMWORKERS = int(OS.environ.get("PYSAL_NUM_WORKERS", OS.cpu_count() or 1))
+
+#### Inputs Smaller Than This Are Searched in the Calling Process ####
+PARALLELMINPOINTS = 50000
+
+#### Number of Tiles Handed Out per Process ####
+TILESPERWORKER = 4
+
+#### Memory Budget of Streamed Searches (Override With Environment Variable) ####
+MEMORYBUDGET = int(OS.environ.get("PYSAL_MEMORY_BUDGET_MB", 1024)) * 2**20
+
+#### Working Memory per Link of a Streamed Block ####
+LINKBYTES = 128
+
+#### KD-Tree Shared by the Searches of a Worker Process ####
+WORKERTREE = None
+
+#### Multiprocessing Context of the Worker Pools, See processContext ####
+PROCESSCONTEXT = None
+
+def initWorker(tree):
+    """Stores the KD-tree in a worker process."""
+
+    global WORKERTREE
+    WORKERTREE = tree
+
+def spatialTiles(xyCoords, numTiles):
+    """Splits the points into a grid of spatial tiles.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+    numTiles (int): approximate number of tiles
+
+    RETURN:
+    tiles (list): array of point indices for each non-empty tile
+    """
+
+    numObs = len(xyCoords)
+    numCells = max(int(NUM.ceil(NUM.sqrt(numTiles))), 1)
+    if numCells == 1 or numObs == 0:
+        return [NUM.arange(numObs)]
+
+    minXY = xyCoords.min(0)
+    extent = xyCoords.max(0) - minXY
+    extent[extent == 0] = 1.0
+    cells = NUM.floor((xyCoords - minXY) / extent * numCells).astype(NUM.int64)
+    NUM.clip(cells, 0, numCells - 1, out = cells)
+    tileIDs = cells[:,0] * numCells + cells[:,1]
+
+    sortOrder = NUM.argsort(tileIDs, kind = "mergesort")
+    breaks = NUM.flatnonzero(NUM.diff(tileIDs[sortOrder])) + 1
+    return NUM.split(sortOrder, breaks)
+
+def knnTile(tree, points, k):
+    """Finds the K nearest neighbors of a tile of points.
+
+    INPUTS:
+    tree (cKDTree): spatial index of every point
+    points (array): indices of the points in the tile
+    k (int): number of neighbors
+
+    RETURN:
+    rows (array): index of the focal point of each link
+    neighs (array): index of the neighbor of each link
+    dists (array): distance of each link
+    """
+
+    numPoints = len(points)
+    dists, neighs = tree.query(tree.data[points], k = k + 1)
+    dists = dists.reshape(numPoints, k + 1)
+    neighs = neighs.reshape(numPoints, k + 1)
+
+    #### Drop Self (or the Farthest if Self Ties With Duplicates) ####
+    isSelf = neighs == points[:,None]
+    noSelf = ~isSelf.any(1)
+    isSelf[noSelf, -1] = True
+    keep = ~isSelf
+
+    rows = NUM.repeat(points, k)
+    return rows, neighs[keep], dists[keep]
+
+def bandTile(tree, points, threshold):
+    """Finds the neighbors within a distance of a tile of points.
+
+    INPUTS:
+    tree (cKDTree): spatial index of every point
+    points (array): indices of the points in the tile
+    threshold (float): distance threshold
+
+    RETURN:
+    rows (array): index of the focal point of each link
+    neighs (array): index of the neighbor of each link
+    dists (array): distance of each link
+    """
+
+    tileTree = SPATIAL.cKDTree(tree.data[points])
+    links = tileTree.sparse_distance_matrix(tree, threshold,
+                                            output_type = "ndarray")
+    rows = points[links["i"]]
+    neighs = links["j"].astype(NUM.int64)
+    keep = rows != neighs
+    rows, neighs, dists = rows[keep], neighs[keep], links["v"][keep]
+
+    #### Neighbors in Index Order Within Each Row ####
+    sortOrder = NUM.lexsort((neighs, rows))
+    return rows[sortOrder], neighs[sortOrder], dists[sortOrder]
+
+def meanNeighborCount(tree, threshold, sampleSize = 10000, seed = 100):
+    """Estimates the average number of neighbors within a distance from the
+    neighbor counts of a random sample of the points.
+
+    INPUTS:
+    tree (cKDTree): spatial index of every point
+    threshold (float): distance threshold
+    sampleSize {int, 10000}: number of points sampled
+    seed {int, 100}: seed of the random sample
+
+    RETURN:
+    meanNeighs (float): average number of neighbors (excluding self)
+    """
+
+    numObs = tree.n
+    if numObs < 2 or threshold is None:
+        return 0.0
+
+    if numObs > sampleSize:
+        randomState = NUM.random.RandomState(seed)
+        sample = randomState.choice(numObs, sampleSize, replace = False)
+        points = tree.data[sample]
+    else:
+        points = tree.data
+    counts = NUM.asarray(tree.query_ball_point(points, threshold,
+                                               return_length = True))
+    return float((counts - 1).mean())
+
+def searchTile(points, k, threshold):
+    """Searches a tile against the KD-tree of the worker process."""
+
+    if k is not None:
+        return knnTile(WORKERTREE, points, k)
+    return bandTile(WORKERTREE, points, threshold)
+
+def pythonExecutable():
+    """Returns the Python interpreter used to spawn worker processes, which
+    differs from sys.executable when running inside an application."""
+
+    if OS.path.basename(SYS.executable).lower().startswith("python"):
+        return SYS.executable
+    for name in ["python.exe", "python", "bin/python"]:
+        path = OS.path.join(SYS.exec_prefix, name)
+        if OS.path.isfile(path):
+            return path
+    return SYS.executable
+
+def processContext():
+    """Returns the multiprocessing context of the worker pools.  The
+    interpreter that spawns the workers is set the first time a pool is
+    created, and only when it differs from sys.executable, rather than by
+    every pool.
+    """
+
+    global PROCESSCONTEXT
+    if PROCESSCONTEXT is None:
+        PROCESSCONTEXT = MP.get_context()
+        executable = pythonExecutable()
+        if executable != SYS.executable:
+            PROCESSCONTEXT.set_executable(executable)
+    return PROCESSCONTEXT
+
+def findNeighbors(xyCoords, k = None, threshold = None, numWorkers = None):
+    """Finds the K nearest neighbors or the neighbors within a distance band
+    of every point, in parallel for large inputs.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+    k {int, None}: number of nearest neighbors
+    threshold {float, None}: distance threshold, used if k is not provided
+    numWorkers {int, None}: number of processes, defaults to NUMWORKERS
+
+    RETURN:
+    rows (array): index of the focal point of each link
+    neighs (array): index of the neighbor of each link
+    dists (array): distance of each link
+
+    Links are grouped by focal point in index order.  Nearest neighbors are
+    sorted by distance, distance band neighbors by index.
+    """
+
+    xyCoords = NUM.ascontiguousarray(xyCoords, dtype = float)
+    numObs = len(xyCoords)
+    if numWorkers is None:
+        numWorkers = NUMWORKERS
+    if k is not None:
+        k = min(int(k), numObs - 1)
+    if numObs < 2 or (k is not None and k < 1):
+        empty = NUM.zeros(0, dtype = NUM.int64)
+        return empty, empty, NUM.zeros(0)
+
+    tree = SPATIAL.cKDTree(xyCoords)
+    if numWorkers <= 1 or numObs < PARALLELMINPOINTS:
+        points = NUM.arange(numObs)
+        if k is not None:
+            results = [knnTile(tree, points, k)]
+        else:
+            results = [bandTile(tree, points, threshold)]
+    else:
+        tiles = spatialTiles(xyCoords, numWorkers * TILESPERWORKER)
+        with FUTURES.ProcessPoolExecutor(max_workers = numWorkers,
+                                         mp_context = processContext(),
+                                         initializer = initWorker,
+                                         initargs = (tree,)) as pool:
+            results = list(pool.map(searchTile, tiles,
+                                    [k] * len(tiles),
+                                    [threshold] * len(tiles)))
+
+    #### Merge Tiles Into Point Order (Stable Keeps Per-Row Order) ####
+    rows = NUM.concatenate([result[0] for result in results])
+    neighs = NUM.concatenate([result[1] for result in results])
+    dists = NUM.concatenate([result[2] for result in results])
+    del results
+    sortOrder = NUM.argsort(rows, kind = "mergesort")
+    return rows[sortOrder], neighs[sortOrder], dists[sortOrder]
+
+def bandBlockSize(numLinksPerPoint, maxBytes):
+    """Returns the number of points whose links fit in a memory budget."""
+
+    blockBytes = max(numLinksPerPoint, 1.0) * LINKBYTES
+    return max(int(maxBytes // blockBytes), 1)
+
+def iterBandRows(xyCoords, ids, threshold, maxBytes = None, tree = None):
+    """Yields the distance band rows of every point in id order, searching
+    one block of points at a time so memory is bounded by a budget rather
+    than by the number of links.
+
+    INPUTS:
+    xyCoords (array): n x 2 array of coordinates
+    ids (array): unique id of each point
+    threshold (float): distance threshold
+    maxBytes {int, None}: memory budget of a block, defaults to MEMORYBUDGET
+    tree {cKDTree, None}: spatial index of the coordinates, built if None
+
+    RETURN:
+    rows (generator): (id, neighbor ids, weights) for each point, neighbors
+                      in id order
+    """
+
+    if maxBytes is None:
+        maxBytes = MEMORYBUDGET
+
+    xyCoords = NUM.ascontiguousarray(xyCoords, dtype = float)
+    ids = NUM.asarray(ids)
+    numObs = len(xyCoords)
+    if tree is None:
+        tree = SPATIAL.cKDTree(xyCoords)
+
+    #### Visit Points in Id Order So Rows Stream Out Sorted ####
+    idOrder = NUM.argsort(ids, kind = "mergesort")
+    blockSize = bandBlockSize(meanNeighborCount(tree, threshold), maxBytes)
+
+    start = 0
+    while start < numObs:
+        points = idOrder[start:start + blockSize]
+        rows, neighs, dists = bandTile(tree, points, threshold)
+        weights = NUM.ones(len(rows))
+        del dists
+
+        #### Group Links by Focal Point, Neighbors in Id Order ####
+        neighIDs = ids[neighs]
+        pointSort = NUM.argsort(points)
+        rowPos = pointSort[NUM.searchsorted(points, rows, sorter = pointSort)]
+        sortOrder = NUM.lexsort((neighIDs, rowPos))
+        rowPos = rowPos[sortOrder]
+        neighIDs = neighIDs[sortOrder].tolist()
+        weights = weights[sortOrder].tolist()
+        del rows, neighs, sortOrder
+
+        bounds = NUM.searchsorted(rowPos, NUM.arange(len(points) + 1))
+        for pos, point in enumerate(points):
+            lo, hi = bounds[pos], bounds[pos + 1]
+            yield ids[point].item(), neighIDs[lo:hi], weights[lo:hi]
+
+        #### Resize the Next Block From the Density Just Seen ####
+        start += len(points)
+        blockSize = bandBlockSize(len(weights) * 1.0 / len(points), maxBytes)
+        del neighIDs, weights, rowPos, bounds
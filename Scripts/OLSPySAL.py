@@ -6,13 +6,11 @@ Author(s): Mark Janikas, Xing Kang, Sergio Rey, Hu Shao
 """
 
 import arcpy as ARCPY
-import numpy as NUM
-import pysal as PYSAL
+import spreg as SPREG
 import SSDataObject as SSDO
 import SSUtilities as UTILS
-import os as OS
-import sys as SYS
-import pysal2ArcUtils as AUTILS
+import RegressionUtils as RUTILS
+import BulkOutput as BULK
 
 FIELDNAMES = ["Predy", "Resid"]
 FIELDALIAS = ["Predicted {0}", "Residual"]
@@ -20,10 +18,12 @@ FIELDALIAS = ["Predicted {0}", "Residual"]
 class OLS_PySAL(object):
     """Computes linear regression via Ordinary Least Squares using PySAL."""
 
-    def __init__(self, ssdo, depVarName, indVarNames, patW):
+    def __init__(self, ssdo, depVarName, indVarNames, patW, 
+                 diagnostics = "FULL"):
 
         #### Set Initial Attributes ####
         UTILS.assignClassAttr(self, locals())
+        self.diagnostics = RUTILS.diagnosticLevel(diagnostics)
 
         #### Initialize Data ####
         self.initialize()
@@ -40,44 +40,12 @@ class OLS_PySAL(object):
         #### Shorthand Attributes ####
         ssdo = self.ssdo
 
-        #### MasterField Can Not Be The Dependent Variable ####
-        if ssdo.masterField == self.depVarName:
-            ARCPY.AddIDMessage("ERROR", 945, ssdo.masterField, 
-                               ARCPY.GetIDMessage(84112))
-            raise SystemExit()
-
-        #### Remove the MasterField from Independent Vars #### 
-        if ssdo.masterField in self.indVarNames:
-            self.indVarNames.remove(ssdo.masterField)
-            ARCPY.AddIDMessage("Warning", 736, ssdo.masterField)
-
-        #### Remove the Dependent Variable from Independent Vars ####
-        if self.depVarName in self.indVarNames:
-            self.indVarNames.remove(self.depVarName)
-            ARCPY.AddIDMessage("Warning", 850, self.depVarName)
-
-        #### Raise Error If No Independent Vars ####
-        if not len(self.indVarNames):
-            ARCPY.AddIDMessage("Error", 737)
-            raise SystemExit()
-
-        #### Create Dependent Variable ####
+        #### Validate Variables and Load y and X as One Block ####
+        self.y, self.x = RUTILS.loadDesign(ssdo, self.depVarName, 
+                                           self.indVarNames)
         self.allVars = [self.depVarName] + self.indVarNames
-        self.y = ssdo.fields[self.depVarName].returnDouble()
         self.n = ssdo.numObs
-        self.y.shape = (self.n, 1)
-
-        #### Assure that Variance is Larger than Zero ####
-        yVar = NUM.var(self.y)
-        if NUM.isnan(yVar) or yVar <= 0.0:
-            ARCPY.AddIDMessage("Error", 906)
-            raise SystemExit()
-
-        #### Create Design Matrix ####
         self.k = len(self.indVarNames) + 1
-        self.x = NUM.ones((self.n, self.k - 1), dtype = float)
-        for column, variable in enumerate(self.indVarNames):
-            self.x[:,column] = ssdo.fields[variable].data
 
         #### Resolve Weights ####
         self.w = self.patW.w
@@ -88,16 +56,30 @@ class OLS_PySAL(object):
         
         ARCPY.SetProgressor("default", "Executing OLS regression...")
 
+        #### Coefficients Only, No Variance or Diagnostics ####
+        if self.diagnostics == "COEFFICIENTS":
+            self.ols = SPREG.BaseOLS(self.y, 
+                                     RUTILS.addConstant(self.x))
+            names = ["CONSTANT"] + self.indVarNames
+            ARCPY.AddMessage(RUTILS.coefficientSummary("ORDINARY LEAST "
+                                                       "SQUARES", names,
+                                                       self.ols.betas))
+            return
+
         #### Performan OLS regression ####
-        self.ols = PYSAL.model.spreg.OLS(self.y, self.x, w = self.w,
-                                         spat_diag = True, robust = 'white', 
-                                         name_y = self.depVarName,
-                                         name_x = self.indVarNames, 
-                                         name_ds = self.ssdo.inputFC,
-                                         name_w = self.wName)
+        full = self.diagnostics == "FULL"
+        self.ols = SPREG.OLS(self.y, self.x, 
+                             w = self.w if full else None,
+                             spat_diag = full, 
+                             nonspat_diag = full,
+                             robust = 'white', 
+                             name_y = self.depVarName,
+                             name_x = self.indVarNames, 
+                             name_ds = self.ssdo.inputFC,
+                             name_w = self.wName)
         ARCPY.AddMessage(self.ols.summary)
 
-    def createOutput(self, outputFC):
+    def createOutput(self, outputFC, outFormat = None):
         
         #### Build fields for output table ####
         candidateFields = {}
@@ -110,6 +92,5 @@ class OLS_PySAL(object):
                                                              "Double", 
                                                              fieldData[i],
                                                              alias = alias)
-        self.ssdo.output2NewFC(outputFC, candidateFields, 
-                               appendFields = self.allVars,
-                               fieldOrder = FIELDNAMES)
+        BULK.output(self.ssdo, outputFC, candidateFields, FIELDNAMES,
+                    appendFields = self.allVars, outFormat = outFormat)
@@ -0,0 +1,564 @@
+"""
+Data preparation shared by the regression tools.
+"""
+
+import os as OS
+import numpy as NUM
+import scipy.sparse as SPARSE
+import scipy.sparse.linalg as SLINALG
+import scipy.stats as STATS
+import arcpy as ARCPY
+
+#### Precision of the Design Matrix (Set PYSAL_DESIGN_FLOAT32 for Single) ####
+DESIGNDTYPE = NUM.float32 if OS.environ.get("PYSAL_DESIGN_FLOAT32") \
+              else NUM.float64
+
+#### Log-Determinant Methods of the ML Estimators ####
+MLMETHODS = ["AUTO", "FULL", "ORD", "LU", "CHEBYSHEV", "MONTECARLO", "GRID"]
+
+#### Methods Fit by spreg, the Others by MLUtils ####
+SPREGMLMETHODS = ["FULL", "ORD"]
+
+#### Largest Number of Features for the Dense (FULL, ORD) Methods ####
+DENSEMAXOBS = 2000
+
+def mlMethod(method, numObs):
+    """Resolves the log-determinant method of the ML lag and error models.
+    FULL and ORD (eigenvalues) run spreg on dense n x n matrices, LU (a
+    sparse factorization per evaluation), CHEBYSHEV, MONTECARLO and GRID
+    (exact values over a grid of rho) run MLUtils.  AUTO uses ORD for
+    small inputs and CHEBYSHEV otherwise.
+
+    INPUTS:
+    method (str): one of MLMETHODS, AUTO if None
+    numObs (int): number of features
+
+    RETURN:
+    method (str): one of MLMETHODS other than AUTO
+    """
+
+    method = (method or "AUTO").upper()
+    if method not in MLMETHODS:
+        ARCPY.AddError("The log-determinant method {0} is not in {1}".format(
+                       method, ", ".join(MLMETHODS)))
+        raise SystemExit()
+
+    if method == "AUTO":
+        return "ORD" if numObs <= DENSEMAXOBS else "CHEBYSHEV"
+    if method in SPREGMLMETHODS and numObs > DENSEMAXOBS:
+        ARCPY.AddWarning(("The {0} log-determinant method stores a dense n x "
+                          "n matrix, use CHEBYSHEV or MONTECARLO for {1} "
+                          "features.").format(method, numObs))
+    return method
+
+#### Diagnostics Levels of the Regression Tools ####
+DIAGNOSTICLEVELS = ["COEFFICIENTS", "STANDARD", "FULL"]
+
+#### Reduced Form Method (Override With Environment Variable) ####
+REDUCEDFORMMETHODS = ["SERIES", "SOLVE", "SPREG"]
+REDUCEDFORMMETHOD = OS.environ.get("PYSAL_REDUCED_FORM", "SERIES").upper()
+
+#### Relative Size of the Last Power Series Term ####
+REDUCEDFORMTOLERANCE = 1e-10
+MAXSERIESTERMS = 10000
+
+def reducedForm(w, data, rho, method = None, 
+                tolerance = REDUCEDFORMTOLERANCE):
+    """Computes (I - rho W)^-1 data.
+
+    INPUTS:
+    w (PySAL W): spatial weights (or a sparse matrix)
+    data (array): n x m array
+    rho (float): spatial autoregressive coefficient, |rho| < 1
+    method {str, None}: SERIES (power series truncated when the last term
+                        is below tolerance relative to the sum, solved
+                        instead if it diverges) or SOLVE (sparse LU),
+                        defaults to REDUCEDFORMMETHOD
+    tolerance {float, REDUCEDFORMTOLERANCE}: relative stopping criterion of
+                                             the power series
+
+    RETURN:
+    result (array): n x m array
+    """
+
+    if method is None:
+        method = REDUCEDFORMMETHOD
+    rho = float(NUM.asarray(rho).ravel()[0])
+    wSparse = SPARSE.csr_matrix(getattr(w, "sparse", w))
+    data = NUM.asarray(data, dtype = float)
+
+    if method.upper() != "SOLVE":
+        result = data.copy()
+        term = data
+        lastNorm = NUM.inf
+        for step in range(MAXSERIESTERMS):
+            term = rho * (wSparse * term)
+            result += term
+            termNorm = NUM.linalg.norm(term)
+            if termNorm <= tolerance * NUM.linalg.norm(result):
+                return result
+            if termNorm > lastNorm:
+                #### Diverging Series, Solve the System Instead ####
+                break
+            lastNorm = termNorm
+
+    #### Sparse LU of (I - rho W) ####
+    system = SPARSE.identity(wSparse.shape[0], format = "csc") - \
+             rho * wSparse.tocsc()
+    result = SLINALG.splu(system).solve(data.reshape(len(data), -1))
+    return result.reshape(data.shape)
+
+def reducedFormMethod(method = None):
+    """Validates the reduced form method of the lag and combo models.
+
+    INPUTS:
+    method {str, None}: one of REDUCEDFORMMETHODS, defaults to
+                        REDUCEDFORMMETHOD
+
+    RETURN:
+    method (str): SERIES, SOLVE or SPREG (keep the predictions of spreg)
+    """
+
+    if method is None:
+        method = REDUCEDFORMMETHOD
+    method = method.upper()
+    if method not in REDUCEDFORMMETHODS:
+        ARCPY.AddError("The reduced form method {0} is not in {1}".format(
+                       method, ", ".join(REDUCEDFORMMETHODS)))
+        raise SystemExit()
+    return method
+
+def reducedFormPredictions(model, w, method = None,
+                           tolerance = REDUCEDFORMTOLERANCE, ePred = True):
+    """Sets the reduced form predictions (predy_e, e_pred) of a spatial lag
+    model fit with spreg.BaseGM_Lag, which leaves them out, from its
+    coefficients, predy_e = (I - rho W)^-1 X b.  spreg expands its power
+    series to an absolute tolerance, which takes longer as n grows.
+
+    INPUTS:
+    model (object): fitted spreg model with x, y and betas (rho is the last
+                    coefficient if the model has no rho attribute)
+    w (PySAL W): spatial weights the model was fit with
+    method {str, None}: one of REDUCEDFORMMETHODS, SPREG uses the power
+                        series of spreg
+    tolerance {float, REDUCEDFORMTOLERANCE}: relative tolerance of SERIES
+    ePred {bool, True}: keep e_pred, it is None if False
+
+    RETURN:
+    warn (str): warning when rho is outside (-1, 1), None otherwise
+    """
+
+    method = reducedFormMethod(method)
+    rho = getattr(model, "rho", None)
+    if rho is None:
+        rho = model.betas[-1]
+    rho = float(NUM.asarray(rho).ravel()[0])
+
+    warn = None
+    if NUM.abs(rho) >= 1:
+        warn = ("*** WARNING: Estimate for spatial lag coefficient is "
+                "outside the boundary (-1, 1). ***")
+        model.predy_e = NUM.zeros(model.y.shape)
+        model.e_pred = NUM.zeros(model.y.shape)
+    else:
+        numX = model.x.shape[1]
+        xb = NUM.dot(model.x, model.betas[:numX])
+        if method == "SPREG":
+            import spreg.utils as SUTILS
+            model.predy_e = SUTILS.inverse_prod(w, xb, rho)
+        else:
+            model.predy_e = reducedForm(w, xb, rho, method, tolerance)
+        model.e_pred = model.y - model.predy_e
+
+    if not ePred:
+        model.e_pred = None
+    return warn
+
+def zInference(betas, vm, df = None):
+    """Returns the standard errors, z statistics and two-sided normal
+    p-values of the estimates (t statistics and t p-values if df is
+    given).
+
+    INPUTS:
+    betas (array): k x 1 estimates
+    vm (array): k x k variance-covariance matrix of the estimates
+    df {int, None}: degrees of freedom of the t distribution
+
+    RETURN:
+    stdErr (array): k x 1 standard errors
+    zStat (array): k x 1 z (or t) statistics
+    pValue (array): k x 1 p-values
+    """
+
+    betas = NUM.asarray(betas).reshape(-1, 1)
+    stdErr = NUM.sqrt(NUM.diag(vm)).reshape(-1, 1)
+    zStat = betas / stdErr
+    if df is None:
+        pValue = 2.0 * STATS.norm.sf(NUM.abs(zStat))
+    else:
+        pValue = 2.0 * STATS.t.sf(NUM.abs(zStat), df)
+    return stdErr, zStat, pValue
+
+def inferenceSummary(title, names, betas, vm, info = None, tests = None,
+                     df = None):
+    """Formats the estimates, their inference and the diagnostics of a
+    model fit with a spreg base class.
+
+    INPUTS:
+    title (str): name of the model
+    names (list): name of each coefficient
+    betas (array): estimates, in the order of names
+    vm (array): variance-covariance matrix of the estimates
+    info {list, None}: (label, value) pairs printed above the estimates
+    tests {list, None}: (name, statistic, p-value) printed below them
+    df {int, None}: degrees of freedom of t inference, z if None
+
+    Estimates past the size of vm (lambda of BaseGM_Error) are printed
+    without inference, as spreg does.
+
+    RETURN:
+    summary (str): report of the model
+    """
+
+    lines = [title, "-" * len(title)]
+    for label, value in (info or []):
+        if isinstance(value, str):
+            lines.append("{0:<32} {1:>12}".format(label, value))
+        elif isinstance(value, (int, NUM.integer)):
+            lines.append("{0:<32} {1:>12d}".format(label, value))
+        else:
+            lines.append("{0:<32} {1:>12.4f}".format(label, value))
+
+    betas = NUM.ravel(betas)
+    numInfer = NUM.shape(vm)[0]
+    stdErr, zStat, pValue = zInference(betas[:numInfer], vm, df = df)
+    header = "{0:<20} {1:>16} {2:>16} {3:>12} {4:>12}"
+    lines.append("")
+    lines.append(header.format("Variable", "Coefficient", "Std.Error",
+                               "z-Statistic" if df is None else \
+                               "t-Statistic", "Probability"))
+    row = "{0:<20} {1:>16.7f} {2:>16.7f} {3:>12.7f} {4:>12.7f}"
+    for i, name in enumerate(names):
+        if i < numInfer:
+            lines.append(row.format(name[:20], float(betas[i]),
+                                    stdErr[i,0], zStat[i,0], pValue[i,0]))
+        else:
+            lines.append("{0:<20} {1:>16.7f}".format(name[:20],
+                                                     float(betas[i])))
+
+    if tests:
+        lines.append("")
+        lines.append("{0:<32} {1:>12} {2:>12}".format("Test", "Value",
+                                                      "Probability"))
+        for name, value, prob in tests:
+            lines.append("{0:<32} {1:>12.4f} {2:>12.4f}".format(name, value,
+                                                                prob))
+    return "\n".join(lines)
+
+def pseudoR2(y, predy):
+    """Returns the squared correlation of y and its predictions."""
+
+    return float(NUM.corrcoef(NUM.ravel(y), NUM.ravel(predy))[0,1] ** 2)
+
+def fitGMLag(y, x, w, robust = None, gwk = None, diagnostics = "FULL",
+             reducedForm = None, ePred = True, nameY = "y", nameX = None,
+             nameGWK = None):
+    """Fits the spatial two stage least squares lag model with
+    spreg.BaseGM_Lag and computes the reduced form predictions and the
+    inference here, so the power series of spreg.GM_Lag never runs and
+    the lower diagnostic levels skip the work they do not report.
+
+    COEFFICIENTS fits the estimates and the predictions only, STANDARD
+    adds the robust variance and the summary, FULL adds the
+    Anselin-Kelejian test.
+
+    INPUTS:
+    y (array): n x 1 dependent variable
+    x (array): n x (k - 1) explanatory variables, without the constant
+    w (PySAL W): spatial weights
+    robust {str, None}: None, white or hac
+    gwk {PySAL Kernel, None}: kernel weights of hac
+    diagnostics {str, FULL}: one of DIAGNOSTICLEVELS
+    reducedForm {str, None}: one of REDUCEDFORMMETHODS
+    ePred {bool, True}: keep the reduced form residuals
+    nameY {str, y}: name of the dependent variable
+    nameX {list, None}: names of the explanatory variables
+    nameGWK {str, None}: name of the kernel weights
+
+    RETURN:
+    lag (object): spreg.BaseGM_Lag with predy_e, e_pred, rho, pr2, pr2_e,
+                  summary and, at FULL, ak_test
+    """
+
+    import spreg as SPREG
+    diagnostics = diagnosticLevel(diagnostics)
+    if diagnostics == "COEFFICIENTS":
+        robust = None
+    lag = SPREG.BaseGM_Lag(y, addConstant(x), w = w, robust = robust,
+                           gwk = gwk)
+    lag.rho = lag.betas[-1]
+    lag.warning = reducedFormPredictions(lag, w, method = reducedForm,
+                                         ePred = ePred)
+
+    nameY = nameY or "y"
+    if nameX is None:
+        nameX = ["var_{0}".format(i + 1) for i in range(x.shape[1])]
+    names = ["CONSTANT"] + list(nameX) + ["W_" + nameY]
+    title = "SPATIAL TWO STAGE LEAST SQUARES"
+    if diagnostics == "COEFFICIENTS":
+        lag.summary = coefficientSummary(title, names, lag.betas)
+        return lag
+
+    lag.pr2 = pseudoR2(lag.y, lag.predy)
+    lag.pr2_e = pseudoR2(lag.y, lag.predy_e)
+    info = [("Dependent Variable", nameY),
+            ("Number of Observations", int(lag.n)),
+            ("Number of Variables", int(lag.k)),
+            ("Pseudo R-squared", lag.pr2),
+            ("Spatial Pseudo R-squared", lag.pr2_e)]
+    if robust == "white":
+        title += " (WHITE STANDARD ERRORS)"
+    elif robust == "hac":
+        title += " (HAC STANDARD ERRORS)"
+        if nameGWK:
+            info.append(("Kernel Weights", nameGWK))
+
+    tests = None
+    if diagnostics == "FULL":
+        import spreg.diagnostics_sp as SPDIAG
+        lag.ak_test = SPDIAG.AKtest(lag, w, case = "gen")
+        tests = [("Anselin-Kelejian Test", lag.ak_test.ak,
+                  lag.ak_test.p)]
+    lag.summary = inferenceSummary(title, names, lag.betas, lag.vm,
+                                   info = info, tests = tests)
+    return lag
+
+#### spreg Error and Combo Models: Base Class Module, Base Class, Title ####
+GMERRORMODELS = {"GM_Error": ("error_sp", "BaseGM_Error",
+                              "GM SPATIALLY WEIGHTED LEAST SQUARES"),
+                 "GM_Error_Het": ("error_sp_het", "BaseGM_Error_Het",
+                                  "GM SPATIALLY WEIGHTED LEAST SQUARES "
+                                  "(HET)"),
+                 "GM_Error_Hom": ("error_sp_hom", "BaseGM_Error_Hom",
+                                  "GM SPATIALLY WEIGHTED LEAST SQUARES "
+                                  "(HOM)"),
+                 "GM_Combo_Het": ("error_sp_het", "BaseGM_Combo_Het",
+                                  "SPATIALLY WEIGHTED 2SLS- GM-COMBO MODEL "
+                                  "(HET)"),
+                 "GM_Combo_Hom": ("error_sp_hom", "BaseGM_Combo_Hom",
+                                  "SPATIALLY WEIGHTED 2SLS- GM-COMBO MODEL "
+                                  "(HOM)")}
+
+def fitGMError(y, x, w, model = "GM_Error", diagnostics = "FULL",
+               reducedForm = None, ePred = True, nameY = "y", nameX = None,
+               nameW = None, nameDS = None):
+    """Fits a GMM spatial error or combo model.  FULL runs the spreg class
+    of the model with its summary, the lower levels run its base class so
+    spreg's report is never built.
+
+    COEFFICIENTS reports the estimates only, STANDARD adds their inference
+    and the pseudo R-squared.  Combo models below FULL get their reduced
+    form predictions from reducedFormPredictions.
+
+    INPUTS:
+    y (array): n x 1 dependent variable
+    x (array): n x (k - 1) explanatory variables, without the constant
+    w (PySAL W): spatial weights
+    model {str, GM_Error}: one of GMERRORMODELS
+    diagnostics {str, FULL}: one of DIAGNOSTICLEVELS
+    reducedForm {str, None}: one of REDUCEDFORMMETHODS, combo models only
+    ePred {bool, True}: keep the reduced form residuals of combo models
+    nameY {str, y}: name of the dependent variable
+    nameX {list, None}: names of the explanatory variables
+    nameW {str, None}: name of the spatial weights
+    nameDS {str, None}: name of the dataset
+
+    RETURN:
+    error (object): spreg model with betas, predy, u, summary, warning and,
+                    for combo models, rho, predy_e and e_pred
+    """
+
+    import spreg as SPREG
+    diagnostics = diagnosticLevel(diagnostics)
+    combo = model.startswith("GM_Combo")
+    if diagnostics == "FULL":
+        error = getattr(SPREG, model)(y, x, w = w, name_y = nameY,
+                                      name_x = nameX, name_w = nameW,
+                                      name_ds = nameDS)
+        error.warning = getattr(error, "warning", None)
+        if combo and not ePred:
+            error.e_pred = None
+        return error
+
+    import importlib as IMPORT
+    moduleName, baseName, title = GMERRORMODELS[model]
+    baseClass = getattr(IMPORT.import_module("spreg." + moduleName), baseName)
+    xc = addConstant(x)
+    nameY = nameY or "y"
+    if nameX is None:
+        nameX = ["var_{0}".format(i + 1) for i in range(x.shape[1])]
+    names = ["CONSTANT"] + list(nameX)
+    if combo:
+        import spreg.utils as SUTILS
+        yend, q = SUTILS.set_endog(y, xc[:,1:], w, None, None, 1, True)
+        error = baseClass(y, xc, yend = yend, q = q, w = w.sparse)
+        error.rho = error.betas[-2]
+        warn = reducedFormPredictions(error, w, method = reducedForm,
+                                      ePred = ePred)
+        error.warning = warn or getattr(error, "warning", None)
+        names.append("W_" + nameY)
+    else:
+        error = baseClass(y, xc, w = w.sparse)
+        error.warning = getattr(error, "warning", None)
+    names.append("lambda")
+
+    if diagnostics == "COEFFICIENTS":
+        error.summary = coefficientSummary(title, names, error.betas)
+        return error
+
+    error.pr2 = pseudoR2(error.y, error.predy)
+    info = [("Dependent Variable", nameY),
+            ("Number of Observations", int(error.n)),
+            ("Number of Variables", int(error.k)),
+            ("Pseudo R-squared", error.pr2)]
+    if combo:
+        error.pr2_e = pseudoR2(error.y, error.predy_e)
+        info.append(("Spatial Pseudo R-squared", error.pr2_e))
+    error.summary = inferenceSummary(title, names, error.betas, error.vm,
+                                     info = info)
+    return error
+
+def diagnosticLevel(level):
+    """Validates the diagnostics level of a regression tool.
+
+    COEFFICIENTS fits the estimates, predictions and residuals only,
+    STANDARD adds the standard errors and the summary, FULL adds every
+    diagnostic test.
+
+    INPUTS:
+    level (str): one of DIAGNOSTICLEVELS, FULL if None
+
+    RETURN:
+    level (str): upper case level
+    """
+
+    level = (level or "FULL").upper()
+    if level not in DIAGNOSTICLEVELS:
+        ARCPY.AddError("The diagnostics level {0} is not in {1}".format(
+                       level, ", ".join(DIAGNOSTICLEVELS)))
+        raise SystemExit()
+    return level
+
+def addConstant(x):
+    """Returns the design matrix with a leading column of ones, as the
+    spreg base classes expect."""
+
+    xc = NUM.empty((x.shape[0], x.shape[1] + 1), dtype = float)
+    xc[:,0] = 1.0
+    xc[:,1:] = x
+    return xc
+
+def coefficientSummary(title, names, betas):
+    """Formats the estimates of a model fit without a spreg summary.
+
+    INPUTS:
+    title (str): name of the model
+    names (list): name of each coefficient
+    betas (array): estimates, in the order of names
+
+    RETURN:
+    summary (str): one line per coefficient
+    """
+
+    lines = [title, "-" * len(title)]
+    for name, beta in zip(names, NUM.asarray(betas).ravel()):
+        lines.append("{0:<20} {1:>16.7f}".format(name[:20], beta))
+    return "\n".join(lines)
+
+def validateVariables(ssdo, depVarName, indVarNames):
+    """Removes the unique ID field and the dependent variable from the
+    explanatory variables and validates what remains.
+
+    INPUTS:
+    ssdo (obj): instance of SSDataObject
+    depVarName (str): name of the dependent variable
+    indVarNames (list): names of the explanatory variables (modified)
+    """
+
+    #### MasterField Can Not Be The Dependent Variable ####
+    if ssdo.masterField == depVarName:
+        ARCPY.AddIDMessage("ERROR", 945, ssdo.masterField,
+                           ARCPY.GetIDMessage(84112))
+        raise SystemExit()
+
+    #### Remove the MasterField from Independent Vars ####
+    if ssdo.masterField in indVarNames:
+        indVarNames.remove(ssdo.masterField)
+        ARCPY.AddIDMessage("Warning", 736, ssdo.masterField)
+
+    #### Remove the Dependent Variable from Independent Vars ####
+    if depVarName in indVarNames:
+        indVarNames.remove(depVarName)
+        ARCPY.AddIDMessage("Warning", 850, depVarName)
+
+    #### Raise Error If No Independent Vars ####
+    if not len(indVarNames):
+        ARCPY.AddIDMessage("Error", 737)
+        raise SystemExit()
+
+def designBlock(ssdo, fieldNames, dtype = None):
+    """Copies fields of the SSDataObject into one Fortran-ordered block.
+    A source array of the block dtype is released once copied, the field
+    data is replaced by a view of its column so later output still finds
+    the values.  Fields of another dtype (integers, or any field when the
+    block is float32) keep their own array, so output is written with the
+    values and type of the input.
+
+    INPUTS:
+    ssdo (obj): instance of SSDataObject
+    fieldNames (list): fields in column order
+    dtype {type, None}: float64 or float32, defaults to DESIGNDTYPE
+
+    RETURN:
+    block (array): n x len(fieldNames) array, column-major
+    """
+
+    if dtype is None:
+        dtype = DESIGNDTYPE
+
+    block = NUM.empty((ssdo.numObs, len(fieldNames)), dtype = dtype,
+                      order = "F")
+    for column, fieldName in enumerate(fieldNames):
+        field = ssdo.fields[fieldName]
+        block[:,column] = field.data
+        if field.data.dtype == block.dtype:
+            field.data = block[:,column]
+    return block
+
+def loadDesign(ssdo, depVarName, indVarNames, dtype = None):
+    """Validates the variables of a regression and builds the dependent
+    variable and the design matrix as views of a single block.
+
+    INPUTS:
+    ssdo (obj): instance of SSDataObject
+    depVarName (str): name of the dependent variable
+    indVarNames (list): names of the explanatory variables (modified)
+    dtype {type, None}: float64 or float32, defaults to DESIGNDTYPE
+
+    RETURN:
+    y (array): n x 1 dependent variable
+    x (array): n x (k - 1) explanatory variables (no constant)
+    """
+
+    validateVariables(ssdo, depVarName, indVarNames)
+    block = designBlock(ssdo, [depVarName] + indVarNames, dtype = dtype)
+    y = block[:,:1]
+    x = block[:,1:]
+
+    #### Assure that Variance is Larger than Zero ####
+    yVar = NUM.var(y)
+    if NUM.isnan(yVar) or yVar <= 0.0:
+        ARCPY.AddIDMessage("Error", 906)
+        raise SystemExit()
+
+    return y, x
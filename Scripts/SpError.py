@@ -7,12 +7,11 @@ Author(s): Mark Janikas, Xing Kang, Sergio Rey, Hu SHao
 
 import arcpy as ARCPY
 import numpy as NUM
-import pysal as PYSAL
-import os as OS
+import spreg as SPREG
 import SSDataObject as SSDO
 import SSUtilities as UTILS
-import sys as SYS
-import pysal2ArcUtils as AUTILS
+import RegressionUtils as RUTILS
+import BulkOutput as BULK
 
 FIELDNAMES = ["Predy", "Resid"]
 FIELDALIAS = ["Predicted {0}", "Residual"]
@@ -24,10 +23,12 @@ MODELTYPES = ["GMM", "GMM_HAC", "ML"]
 class Error_PySAL(object):
     """Computes linear regression via Ordinary Least Squares using PySAL."""
 
-    def __init__(self, ssdo, depVarName, indVarNames, patW, modelType = "GMM"):
+    def __init__(self, ssdo, depVarName, indVarNames, patW, modelType = "GMM",
+                 mlMethod = "AUTO", diagnostics = "FULL"):
 
         #### Set Initial Attributes ####
         UTILS.assignClassAttr(self, locals())
+        self.diagnostics = RUTILS.diagnosticLevel(diagnostics)
 
         #### Validate Model Type ####
         if modelType not in MODELTYPES:
@@ -50,44 +51,12 @@ class Error_PySAL(object):
         #### Shorthand Attributes ####
         ssdo = self.ssdo
 
-        #### MasterField Can Not Be The Dependent Variable ####
-        if ssdo.masterField == self.depVarName:
-            ARCPY.AddIDMessage("ERROR", 945, ssdo.masterField, 
-                               ARCPY.GetIDMessage(84112))
-            raise SystemExit()
-
-        #### Remove the MasterField from Independent Vars #### 
-        if ssdo.masterField in self.indVarNames:
-            self.indVarNames.remove(ssdo.masterField)
-            ARCPY.AddIDMessage("Warning", 736, ssdo.masterField)
-
-        #### Remove the Dependent Variable from Independent Vars ####
-        if self.depVarName in self.indVarNames:
-            self.indVarNames.remove(self.depVarName)
-            ARCPY.AddIDMessage("Warning", 850, self.depVarName)
-
-        #### Raise Error If No Independent Vars ####
-        if not len(self.indVarNames):
-            ARCPY.AddIDMessage("Error", 737)
-            raise SystemExit()
-
-        #### Create Dependent Variable ####
+        #### Validate Variables and Load y and X as One Block ####
+        self.y, self.x = RUTILS.loadDesign(ssdo, self.depVarName, 
+                                           self.indVarNames)
         self.allVars = [self.depVarName] + self.indVarNames
-        self.y = ssdo.fields[self.depVarName].returnDouble()
         self.n = ssdo.numObs
-        self.y.shape = (self.n, 1)
-
-        #### Assure that Variance is Larger than Zero ####
-        yVar = NUM.var(self.y)
-        if NUM.isnan(yVar) or yVar <= 0.0:
-            ARCPY.AddIDMessage("Error", 906)
-            raise SystemExit()
-
-        #### Create Design Matrix ####
         self.k = len(self.indVarNames) + 1
-        self.x = NUM.ones((self.n, self.k - 1), dtype = float)
-        for column, variable in enumerate(self.indVarNames):
-            self.x[:,column] = ssdo.fields[variable].data
 
         #### Set Weights Info ####
         self.w = self.patW.w
@@ -98,30 +67,73 @@ class Error_PySAL(object):
 
         ARCPY.SetProgressor("default", "Executing Spatial Error regression...")
 
-        #### Perform GM_Error/GMError_Het regression ####
+        #### Maximum Likelihood, Dense Methods by spreg ####
         if self.modelType == "ML":
-            error = PYSAL.model.spreg.ML_Error(self.y, self.x, w = self.w,
-                                               name_y = self.depVarName,
-                                               name_x = self.indVarNames,
-                                               name_w = self.wName,
-                                               name_ds = self.ssdo.inputFC)
-
-        elif self.modelType == "GMM":
-            error = PYSAL.model.spreg.GM_Error(self.y, self.x, w = self.w, 
-                                               name_y = self.depVarName,
-                                               name_x = self.indVarNames, 
-                                               name_w = self.wName,
-                                               name_ds = self.ssdo.inputFC)
+            method = RUTILS.mlMethod(self.mlMethod, self.n)
+            if method not in RUTILS.SPREGMLMETHODS:
+                self.calculateML(method)
+                return
+            if self.diagnostics == "FULL":
+                self.error = SPREG.ML_Error(self.y, self.x, w = self.w,
+                                            method = method,
+                                            name_y = self.depVarName,
+                                            name_x = self.indVarNames,
+                                            name_w = self.wName,
+                                            name_ds = self.ssdo.inputFC)
+            else:
+                self.calculateBaseML(method)
+
+        #### GM_Error/GM_Error_Het, Base Classes Below FULL ####
         else:
-            error = PYSAL.model.spreg.GM_Error_Het(self.y, self.x, w = self.w, 
-                                                   name_y = self.depVarName,
-                                                   name_x = self.indVarNames, 
-                                                   name_w = self.wName,
-                                                   name_ds = self.ssdo.inputFC)
+            model = "GM_Error" if self.modelType == "GMM" else "GM_Error_Het"
+            self.error = RUTILS.fitGMError(self.y, self.x, self.w,
+                                           model = model,
+                                           diagnostics = self.diagnostics,
+                                           nameY = self.depVarName,
+                                           nameX = self.indVarNames,
+                                           nameW = self.wName,
+                                           nameDS = self.ssdo.inputFC)
+        ARCPY.AddMessage(self.error.summary)
+
+    def calculateBaseML(self, method):
+        """Fits the ML error model with the spreg base class, which skips
+        the information criteria and the report of spreg.ML_Error.  The
+        variance is part of the base fit, STANDARD reports it."""
+
+        import spreg.ml_error as MLERROR
+        error = MLERROR.BaseML_Error(self.y, RUTILS.addConstant(self.x),
+                                     self.w, method = method)
+        names = ["CONSTANT"] + self.indVarNames + ["lambda"]
+        title = "ML SPATIAL ERROR (METHOD = {0})".format(method)
+        if self.diagnostics == "COEFFICIENTS":
+            error.summary = RUTILS.coefficientSummary(title, names,
+                                                      error.betas)
+        else:
+            error.pr2 = RUTILS.pseudoR2(error.y, error.predy)
+            info = [("Dependent Variable", self.depVarName),
+                    ("Number of Observations", int(error.n)),
+                    ("Number of Variables", int(error.k)),
+                    ("Pseudo R-squared", error.pr2),
+                    ("Sigma-square ML", NUM.asarray(error.sig2).item()),
+                    ("Log Likelihood", NUM.asarray(error.logll).item())]
+            error.summary = RUTILS.inferenceSummary(title, names,
+                                                    error.betas, error.vm,
+                                                    info = info)
         self.error = error
+
+    def calculateML(self, method):
+        """Fits the ML error model with a sparse or approximate
+        log-determinant, see MLUtils."""
+
+        import MLUtils as MLUTILS
+        self.error = MLUTILS.ML_Error(self.y, self.x, self.w, 
+                                      method = method,
+                                      diagnostics = self.diagnostics,
+                                      nameY = self.depVarName,
+                                      nameX = self.indVarNames)
         ARCPY.AddMessage(self.error.summary)
 
-    def createOutput(self, outputFC):
+    def createOutput(self, outputFC, outFormat = None):
         
         #### Build fields for output table ####
         candidateFields = {}
@@ -143,6 +155,5 @@ class Error_PySAL(object):
                                                              fieldData[i],
                                                              alias = alias)
 
-        self.ssdo.output2NewFC(outputFC, candidateFields, 
-                               appendFields = self.allVars,
-                               fieldOrder = fieldNames)
+        BULK.output(self.ssdo, outputFC, candidateFields, fieldNames,
+                    appendFields = self.allVars, outFormat = outFormat)
@@ -7,12 +7,11 @@ Author(s): Mark Janikas, Xing Kang, Sergio Rey, Hu Shao
 
 import arcpy as ARCPY
 import numpy as NUM
-import pysal as PYSAL
-import os as OS
-import sys as SYS
+import spreg as SPREG
 import SSDataObject as SSDO
 import SSUtilities as UTILS
-import pysal2ArcUtils as AUTILS
+import RegressionUtils as RUTILS
+import BulkOutput as BULK
 
 FIELDNAMES = ["Predy", "Resid", "Predy_e", "e_Pred"]
 FIELDALIAS = ["Predicted {0}", "Residual", "Predicted {0} (Reduced Form)",
@@ -24,10 +23,13 @@ class Lag_PySAL(object):
 
     def __init__(self, ssdo, depVarName, indVarNames, patW, 
                  modelType = "GMM_COMBO", 
-                 kernelType = "Uniform", kernelKNN = 2):
+                 kernelType = "Uniform", kernelKNN = 2, 
+                 mlMethod = "AUTO", ePred = True, reducedForm = None,
+                 diagnostics = "FULL"):
 
         #### Set Initial Attributes ####
         UTILS.assignClassAttr(self, locals())
+        self.diagnostics = RUTILS.diagnosticLevel(diagnostics)
 
         #### Validate Model Type ####
         if modelType not in MODELTYPES:
@@ -50,44 +52,12 @@ class Lag_PySAL(object):
         #### Shorthand Attributes ####
         ssdo = self.ssdo
 
-        #### MasterField Can Not Be The Dependent Variable ####
-        if ssdo.masterField == self.depVarName:
-            ARCPY.AddIDMessage("ERROR", 945, ssdo.masterField, 
-                               ARCPY.GetIDMessage(84112))
-            raise SystemExit()
-
-        #### Remove the MasterField from Independent Vars #### 
-        if ssdo.masterField in self.indVarNames:
-            self.indVarNames.remove(ssdo.masterField)
-            ARCPY.AddIDMessage("Warning", 736, ssdo.masterField)
-
-        #### Remove the Dependent Variable from Independent Vars ####
-        if self.depVarName in self.indVarNames:
-            self.indVarNames.remove(self.depVarName)
-            ARCPY.AddIDMessage("Warning", 850, self.depVarName)
-
-        #### Raise Error If No Independent Vars ####
-        if not len(self.indVarNames):
-            ARCPY.AddIDMessage("Error", 737)
-            raise SystemExit()
-
-        #### Create Dependent Variable ####
+        #### Validate Variables and Load y and X as One Block ####
+        self.y, self.x = RUTILS.loadDesign(ssdo, self.depVarName, 
+                                           self.indVarNames)
         self.allVars = [self.depVarName] + self.indVarNames
-        self.y = ssdo.fields[self.depVarName].returnDouble()
         self.n = ssdo.numObs
-        self.y.shape = (self.n, 1)
-
-        #### Assure that Variance is Larger than Zero ####
-        yVar = NUM.var(self.y)
-        if NUM.isnan(yVar) or yVar <= 0.0:
-            ARCPY.AddIDMessage("Error", 906)
-            raise SystemExit()
-
-        #### Create Design Matrix ####
         self.k = len(self.indVarNames) + 1
-        self.x = NUM.ones((self.n, self.k - 1), dtype = float)
-        for column, variable in enumerate(self.indVarNames):
-            self.x[:,column] = ssdo.fields[variable].data
 
         #### Set Weights Info ####
         self.w = self.patW.w
@@ -98,40 +68,63 @@ class Lag_PySAL(object):
 
         ARCPY.SetProgressor("default", "Executing Spatial Lag regression...")
 
-        #### Perform GM_Lag regression ####
-        if self.modelType == "GMM_COMBO":
-            self.lag = PYSAL.model.spreg.GM_Lag(self.y, self.x, w = self.w, 
-                                                robust = 'white', spat_diag = True, 
-                                                name_y = self.depVarName,
-                                                name_x = self.indVarNames, 
-                                                name_w = self.wName,
-                                                name_ds = self.ssdo.inputFC)
-        elif self.modelType == "GMM_HAC":
-            import pysal.lib.weights as WEIGHTS
-            self.w.transform = 'r'
-            dataArray = self.ssdo.xyCoords
-            kernelName = "{0} function with knn = {1}"
-            kernelName = kernelName.format(self.kernelType, self.kernelKNN)
-            kernelWeights = WEIGHTS.Kernel(dataArray, fixed = True, k = self.kernelKNN,
-                                           function = self.kernelType, diagonal = True)
-            self.lag = PYSAL.model.spreg.GM_Lag(self.y, self.x, w = self.w, 
-                                                robust = 'hac', gwk = kernelWeights,
-                                                spat_diag = True, 
-                                                name_y = self.depVarName,
-                                                name_x = self.indVarNames, 
-                                                name_w = self.wName,
-                                                name_gwk = kernelName,
-                                                name_ds = self.ssdo.inputFC)
+        #### Spatial Two Stage Least Squares, One Reduced Form Pass ####
+        if self.modelType in ["GMM_COMBO", "GMM_HAC"]:
+            robust, kernelWeights, kernelName = 'white', None, None
+            if self.modelType == "GMM_HAC":
+                import KernelUtils as KUTILS
+                self.w.transform = 'r'
+                robust = 'hac'
+                kernelName = "{0} function with knn = {1}"
+                kernelName = kernelName.format(self.kernelType, 
+                                               self.kernelKNN)
+                kernelWeights = KUTILS.buildKernel(self.ssdo.xyCoords, 
+                                                   self.kernelType,
+                                                   self.kernelKNN, 
+                                                   fixed = True,
+                                                   diagonal = True)
+            self.lag = RUTILS.fitGMLag(self.y, self.x, self.w, 
+                                       robust = robust, gwk = kernelWeights,
+                                       diagnostics = self.diagnostics,
+                                       reducedForm = self.reducedForm,
+                                       ePred = self.ePred,
+                                       nameY = self.depVarName,
+                                       nameX = self.indVarNames,
+                                       nameGWK = kernelName)
+            if self.lag.warning:
+                ARCPY.AddWarning(self.lag.warning)
         else:
-            self.lag = PYSAL.model.spreg.ML_Lag(self.y, self.x, self.w,
-                                                spat_diag = True,
-                                                name_y = self.depVarName,
-                                                name_x = self.indVarNames, 
-                                                name_w = self.wName,
-                                                name_ds = self.ssdo.inputFC)
+            method = RUTILS.mlMethod(self.mlMethod, self.n)
+            if method not in RUTILS.SPREGMLMETHODS:
+                self.calculateML(method)
+                return
+            self.lag = SPREG.ML_Lag(self.y, self.x, self.w,
+                                    method = method,
+                                    spat_diag = self.diagnostics == "FULL",
+                                    name_y = self.depVarName,
+                                    name_x = self.indVarNames, 
+                                    name_w = self.wName,
+                                    name_ds = self.ssdo.inputFC)
+            if not self.ePred:
+                self.lag.e_pred = None
         ARCPY.AddMessage(self.lag.summary)
 
-    def createOutput(self, outputFC):
+    def calculateML(self, method):
+        """Fits the ML lag model with a sparse or approximate
+        log-determinant, see MLUtils."""
+
+        import MLUtils as MLUTILS
+        self.lag = MLUTILS.ML_Lag(self.y, self.x, self.w, method = method,
+                                  diagnostics = self.diagnostics,
+                                  reducedForm = self.reducedForm,
+                                  ePred = self.ePred,
+                                  nameY = self.depVarName,
+                                  nameX = self.indVarNames)
+        if self.lag.warning:
+            ARCPY.AddWarning(self.lag.warning)
+        ARCPY.AddMessage(self.lag.summary)
+
+    def createOutput(self, outputFC, outFormat = None):
 
         #### Build fields for output table ####
         nullFlag = self.lag.e_pred is None
@@ -140,10 +133,13 @@ class Lag_PySAL(object):
         else:
             ePredOut = self.lag.e_pred
 
+        #### Reduced Form Error Left Out When Not Requested ####
+        fieldNames = FIELDNAMES if self.ePred else FIELDNAMES[:3]
+
         candidateFields = {}
         fieldData = [self.lag.predy.flatten(), self.lag.u.flatten(),
                      self.lag.predy_e.flatten(), ePredOut.flatten()]
-        for i, fieldName in enumerate(FIELDNAMES):
+        for i, fieldName in enumerate(fieldNames):
             alias = FIELDALIAS[i]
             if i in [0, 2]:
                 alias = alias.format(self.depVarName)
@@ -152,7 +148,6 @@ class Lag_PySAL(object):
                                                              fieldData[i],
                                                              alias = alias,
                                                              checkNullValues = nullFlag)
-        self.ssdo.output2NewFC(outputFC, candidateFields, 
-                               appendFields = self.allVars,
-                               fieldOrder = FIELDNAMES)
+        BULK.output(self.ssdo, outputFC, candidateFields, fieldNames,
+                    appendFields = self.allVars, outFormat = outFormat)
 
@@ -0,0 +1,188 @@
+"""
+Measures how long the toolbox takes to open and each tool takes to import,
+and fails when startup regresses past a budget.
+
+Every measurement runs in a fresh Python process that has already imported
+arcpy and numpy, so only the time added by the toolkit is counted; the best
+of several runs is kept.  Opening the toolbox (loading the .pyt, building the
+parameters of every tool and running their validation) must not import
+PySAL, SciPy's spatial or stats packages, and no tool may import the pysal
+meta-package.  Outside of ArcGIS the stand-ins in the Headless folder take
+the place of arcpy.
+
+    python StartupBenchmark.py
+    python StartupBenchmark.py --repeat 5 --toolbox-budget 100
+
+The budgets default to the PYSAL_TOOLBOX_BUDGET_MS and PYSAL_TOOL_BUDGET_MS
+environment settings.  The exit status is 1 when a check fails.
+"""
+
+import os as OS
+import sys as SYS
+import json as JSON
+import argparse as ARG
+import subprocess as SUB
+
+SCRIPTDIR = OS.path.dirname(OS.path.abspath(__file__))
+HEADLESSDIR = OS.path.join(SCRIPTDIR, "Headless")
+TOOLBOX = OS.path.join(OS.path.dirname(SCRIPTDIR),
+                       "Python Spatial Analysis Library (PySAL).pyt")
+
+#### Default Budgets in Milliseconds ####
+TOOLBOXBUDGET = 250.0
+TOOLBUDGET = 5000.0
+
+#### Modules the Toolbox Dialog Must Not Import ####
+DIALOGMODULES = ["pysal", "libpysal", "spreg", "scipy.spatial",
+                 "scipy.stats"]
+
+#### Tool Modules and the Modules Each Must Not Import ####
+WEIGHTSMODULES = ["pysal", "spreg"]
+REGRESSIONMODULES = ["pysal"]
+TOOLMODULES = [("ContWeightsCreator", WEIGHTSMODULES),
+               ("DistWeightsCreator", WEIGHTSMODULES),
+               ("KernelWeightsCreator", WEIGHTSMODULES),
+               ("WeightConvertor", WEIGHTSMODULES),
+               ("OLSPySAL", REGRESSIONMODULES),
+               ("BatchOLS", REGRESSIONMODULES),
+               ("SpError", REGRESSIONMODULES),
+               ("SpLag", REGRESSIONMODULES),
+               ("AutoModel", REGRESSIONMODULES)]
+
+#### Code Run in the Fresh Process, Prints the Time and the Modules ####
+CHILDCODE = """
+import sys, time, json
+sys.path.insert(0, {scriptDir!r})
+try:
+    import arcpy
+except ImportError:
+    sys.path.insert(0, {headlessDir!r})
+    import arcpy
+import numpy
+before = set(sys.modules)
+start = time.perf_counter()
+{body}
+elapsed = (time.perf_counter() - start) * 1000.0
+loaded = sorted(set(sys.modules) - before)
+sys.stdout.write("\\n" + json.dumps({{"ms": elapsed, "modules": loaded}}))
+"""
+
+#### Opens the Toolbox and Validates the Parameters of Every Tool ####
+TOOLBOXCODE = """
+import importlib.machinery, importlib.util
+loader = importlib.machinery.SourceFileLoader("pysaltoolbox", {toolbox!r})
+spec = importlib.util.spec_from_loader("pysaltoolbox", loader)
+pyt = importlib.util.module_from_spec(spec)
+loader.exec_module(pyt)
+for toolClass in pyt.Toolbox().tools:
+    tool = toolClass()
+    parameters = tool.getParameterInfo()
+    tool.updateParameters(parameters)
+    tool.updateMessages(parameters)
+"""
+
+def envBudget(name, default):
+    """Returns the budget of an environment setting, the default if not
+    set."""
+
+    value = OS.environ.get(name, "").strip()
+    if value:
+        return float(value)
+    return default
+
+def timeChild(body, repeat = 3):
+    """Runs code in fresh processes and returns its best time.
+
+    INPUTS:
+    body (str): code to time, run after arcpy and numpy are imported
+    repeat {int, 3}: number of processes
+
+    RETURN:
+    elapsed (float): best time in milliseconds
+    modules (list): modules the code imported
+    """
+
+    code = CHILDCODE.format(scriptDir = SCRIPTDIR, headlessDir = HEADLESSDIR,
+                            body = body)
+    best, modules = None, []
+    for run in range(max(repeat, 1)):
+        result = SUB.run([SYS.executable, "-c", code], cwd = SCRIPTDIR,
+                         stdout = SUB.PIPE, stderr = SUB.PIPE,
+                         universal_newlines = True)
+        if result.returncode:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1])
+        info = JSON.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or info["ms"] < best:
+            best = info["ms"]
+        modules = info["modules"]
+    return best, modules
+
+def forbiddenModules(modules, forbidden):
+    """Returns the forbidden packages (or their submodules) in a list of
+    module names."""
+
+    found = []
+    for name in forbidden:
+        prefix = name + "."
+        if any(module == name or module.startswith(prefix) \
+               for module in modules):
+            found.append(name)
+    return found
+
+def runChecks(toolboxBudget, toolBudget, repeat = 3):
+    """Times the toolbox and the tools, returns the number of failures."""
+
+    checks = [("Toolbox", TOOLBOXCODE.format(toolbox = TOOLBOX),
+               toolboxBudget, DIALOGMODULES)]
+    for moduleName, forbidden in TOOLMODULES:
+        checks.append((moduleName, "import " + moduleName, toolBudget,
+                       forbidden))
+
+    failures = 0
+    for label, body, budget, forbidden in checks:
+        try:
+            elapsed, modules = timeChild(body, repeat = repeat)
+        except RuntimeError as err:
+            print("{0:<22} FAILED  {1}".format(label, err))
+            failures += 1
+            continue
+        problems = []
+        if elapsed > budget:
+            problems.append("over budget")
+        found = forbiddenModules(modules, forbidden)
+        if found:
+            problems.append("imports " + ", ".join(found))
+        status = "; ".join(problems) if problems else "ok"
+        failures += bool(problems)
+        print("{0:<22} {1:>9.1f} ms  budget {2:>7.0f} ms  {3}".format(label,
+                                                                  elapsed,
+                                                                  budget,
+                                                                  status))
+    return failures
+
+def main(argv = None):
+    """Runs the benchmark, returns the exit status."""
+
+    parser = ARG.ArgumentParser(prog = "StartupBenchmark",
+                                description = "Times the startup of the "
+                                              "PySAL toolbox.")
+    parser.add_argument("--repeat", type = int, default = 3,
+                        help = "fresh processes per check, best is kept")
+    parser.add_argument("--toolbox-budget", dest = "toolboxBudget",
+                        type = float,
+                        default = envBudget("PYSAL_TOOLBOX_BUDGET_MS",
+                                            TOOLBOXBUDGET),
+                        help = "milliseconds to open and validate the "
+                               "toolbox")
+    parser.add_argument("--tool-budget", dest = "toolBudget", type = float,
+                        default = envBudget("PYSAL_TOOL_BUDGET_MS",
+                                            TOOLBUDGET),
+                        help = "milliseconds to import a tool")
+    args = parser.parse_args(argv)
+
+    failures = runChecks(args.toolboxBudget, args.toolBudget,
+                         repeat = args.repeat)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    SYS.exit(main())
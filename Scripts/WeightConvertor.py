@@ -6,7 +6,6 @@ Author(s): Xun Li, Xing Kang, Sergio Rey
 
 import os
 import arcpy as ARCPY
-import pysal as PYSAL
 import pysal2ArcUtils as AUTILS
 import SSDataObject as SSDO
 import SSUtilities as UTILS
@@ -196,35 +195,18 @@ class WeightConvertor(object):
             
         if outputExt == EXTENSIONS[0]:
             # GAL file
-            outputWriter = open(outputFile, 'w')
             header = "%s %s %s %s\n" % \
                 (0, weightObj.n, uniqueID, 'UNKNOWN')
-            outputWriter.write(header)
-            masterIDs = list(weightObj.neighbors.keys())
-            masterIDs.sort()
-            for id in masterIDs:
-                neighbors = weightObj.neighbors[id]
-                outputWriter.write("%s %s\n" % (id, len(neighbors)))
-                outputWriter.write("%s\n" % \
-                                   (" ".join([str(nbr) for nbr in neighbors])))
-            outputWriter.close()
+            AUTILS.writeGAL(weightObj, outputFile, header)
         elif outputExt == EXTENSIONS[1] or outputExt == EXTENSIONS[2]:
             # GWT, KWT
-            outputWriter = PYSAL.open(outputFile, 'w')
-            outputWriter.varName = uniqueID
-            outputWriter.write(weightObj)
-            outputWriter.close()
+            AUTILS.writeGWT(weightObj, outputFile, 'unknown', uniqueID)
         else:
             # SWM
             swmWriter = WU.SWMWriter(outputFile, uniqueID, \
                                      ssdo.spatialRefName if ssdo else '#', \
                                      weightObj.n, rowStandard)
-            masterIDs = list(weightObj.neighbors.keys())
-            masterIDs.sort()
-            for key in masterIDs:
-                swmWriter.swm.writeEntry(key, weightObj.neighbors[key], \
-                                         weightObj.weights[key])
-            swmWriter.close()
+            AUTILS.writeSWM(weightObj, swmWriter)
     
 if __name__ == '__main__':
     setupParameters()
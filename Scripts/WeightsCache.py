@@ -0,0 +1,275 @@
+"""
+Content-addressed on-disk cache of parsed spatial weights files.
+
+Parsed weights are stored as CSR arrays (indptr, indices, data), the ids of
+the rows and the unique ID field name of the weights file.  Entries are keyed
+on the path, size and modification time of the weights file together with
+the master ID to order ID mapping of the spatial dataset, so any edit to the
+file or change in the selection produces a new entry.  The cache directory is
+bounded in size and evicts the least recently used entries first.
+Summary statistics of each transformation of the weights are stored as
+separate entries keyed on the weights entry and the transformation.
+"""
+
+import os as OS
+import hashlib as HASH
+import tempfile as TEMP
+import numpy as NUM
+
+#### Cache Location and Size (Override With Environment Variables) ####
+CACHEDIR = OS.environ.get("PYSAL_WEIGHTS_CACHE",
+                          OS.path.join(TEMP.gettempdir(),
+                                       "PySALWeightsCache"))
+MAXCACHEBYTES = int(OS.environ.get("PYSAL_WEIGHTS_CACHE_MB", 2048)) * 2**20
+CACHEVERSION = "1"
+CACHEEXT = ".npz"
+ARRAYNAMES = ["indptr", "indices", "data", "ids", "varName", "transform"]
+
+def hashMaster2Order(master2Order):
+    """Returns a digest of the master ID to order ID mapping.
+
+    INPUTS:
+    master2Order (dict): master ID to order ID
+
+    RETURN:
+    digest (str): hex digest, "NONE" if no mapping is provided
+    """
+
+    if master2Order is None:
+        return "NONE"
+
+    numKeys = len(master2Order)
+    keys = NUM.fromiter(master2Order.keys(), dtype = NUM.int64,
+                        count = numKeys)
+    values = NUM.fromiter(master2Order.values(), dtype = NUM.int64,
+                          count = numKeys)
+    sortOrder = NUM.argsort(keys)
+    digest = HASH.sha1(keys[sortOrder].tobytes())
+    digest.update(values[sortOrder].tobytes())
+    return digest.hexdigest()
+
+def cacheKey(weightsFile, master2Order = None):
+    """Builds the cache key of a weights file read for a given dataset.
+
+    INPUTS:
+    weightsFile (str): path to the spatial weights file
+    master2Order {dict, None}: master ID to order ID
+
+    RETURN:
+    key (str): hex digest identifying the parsed weights, None if the
+               weights file can not be found
+    """
+
+    try:
+        stat = OS.stat(weightsFile)
+    except OSError:
+        return None
+
+    path = OS.path.normcase(OS.path.abspath(weightsFile))
+    mtime = getattr(stat, "st_mtime_ns", int(stat.st_mtime * 1e9))
+    keyItems = [CACHEVERSION, path, str(stat.st_size), str(mtime),
+                hashMaster2Order(master2Order)]
+    return HASH.sha1("|".join(keyItems).encode("utf-8")).hexdigest()
+
+def cachePath(key, cacheDir = None):
+    """Returns the path of the cache entry for a given key."""
+
+    if cacheDir is None:
+        cacheDir = CACHEDIR
+    return OS.path.join(cacheDir, key + CACHEEXT)
+
+def loadArrays(key, cacheDir = None):
+    """Loads the CSR arrays of a parsed weights file from the cache.
+
+    INPUTS:
+    key (str): cache key from cacheKey()
+    cacheDir {str, None}: cache directory, defaults to CACHEDIR
+
+    RETURN:
+    arrays (dict): name to array for each item in ARRAYNAMES, None on a miss
+    """
+
+    if key is None:
+        return None
+
+    path = cachePath(key, cacheDir)
+    if not OS.path.isfile(path):
+        return None
+
+    try:
+        with NUM.load(path, allow_pickle = False) as entry:
+            arrays = dict((name, entry[name]) for name in ARRAYNAMES)
+        #### Mark as Recently Used ####
+        OS.utime(path, None)
+    except (OSError, IOError, KeyError, ValueError):
+        return None
+
+    arrays["varName"] = str(arrays["varName"]) or None
+    arrays["transform"] = str(arrays["transform"])
+    return arrays
+
+def storeArrays(key, arrays, cacheDir = None, maxBytes = None):
+    """Writes the CSR arrays of a parsed weights file to the cache and
+    evicts the least recently used entries beyond the size budget.
+
+    INPUTS:
+    key (str): cache key from cacheKey()
+    arrays (dict): name to array for each item in ARRAYNAMES
+    cacheDir {str, None}: cache directory, defaults to CACHEDIR
+    maxBytes {int, None}: size budget of the cache, defaults to MAXCACHEBYTES
+
+    RETURN:
+    stored (bool): True if the entry was written
+    """
+
+    if key is None:
+        return False
+    if cacheDir is None:
+        cacheDir = CACHEDIR
+    if maxBytes is None:
+        maxBytes = MAXCACHEBYTES
+
+    entry = dict(arrays)
+    entry["varName"] = NUM.array(entry["varName"] or "")
+    entry["transform"] = NUM.array(entry["transform"])
+    return writeEntry(key, entry, cacheDir, maxBytes)
+
+def statsKey(key, transform):
+    """Builds the cache key of the statistics of a transformation of the
+    weights stored under key.
+
+    INPUTS:
+    key (str): cache key of the weights from cacheKey()
+    transform (str): weights transformation
+
+    RETURN:
+    key (str): hex digest, None if the weights have no key
+    """
+
+    if key is None:
+        return None
+    keyItems = [CACHEVERSION, key, "STATS", transform.upper()]
+    return HASH.sha1("|".join(keyItems).encode("utf-8")).hexdigest()
+
+def loadStats(key, names, cacheDir = None):
+    """Loads the statistics of a weights transformation from the cache.
+
+    INPUTS:
+    key (str): cache key from statsKey()
+    names (list): names of the statistics
+    cacheDir {str, None}: cache directory, defaults to CACHEDIR
+
+    RETURN:
+    stats (dict): name to array (scalars are 0-d), None on a miss
+    """
+
+    if key is None:
+        return None
+
+    path = cachePath(key, cacheDir)
+    if not OS.path.isfile(path):
+        return None
+
+    try:
+        with NUM.load(path, allow_pickle = False) as entry:
+            stats = dict((name, entry[name]) for name in names)
+        OS.utime(path, None)
+    except (OSError, IOError, KeyError, ValueError):
+        return None
+
+    return stats
+
+def storeStats(key, stats, cacheDir = None, maxBytes = None):
+    """Writes the statistics of a weights transformation to the cache.
+
+    INPUTS:
+    key (str): cache key from statsKey()
+    stats (dict): name to array
+    cacheDir {str, None}: cache directory, defaults to CACHEDIR
+    maxBytes {int, None}: size budget of the cache, defaults to MAXCACHEBYTES
+
+    RETURN:
+    stored (bool): True if the entry was written
+    """
+
+    if key is None:
+        return False
+    if cacheDir is None:
+        cacheDir = CACHEDIR
+    if maxBytes is None:
+        maxBytes = MAXCACHEBYTES
+    return writeEntry(key, stats, cacheDir, maxBytes)
+
+def writeEntry(key, entry, cacheDir, maxBytes):
+    """Writes a dictionary of arrays to the cache entry of a key.
+
+    INPUTS:
+    key (str): cache key
+    entry (dict): name to array
+    cacheDir (str): cache directory
+    maxBytes (int): size budget of the cache
+
+    RETURN:
+    stored (bool): True if the entry was written
+    """
+
+    entryBytes = sum([NUM.asarray(value).nbytes for value in entry.values()])
+    if entryBytes > maxBytes:
+        return False
+
+    path = cachePath(key, cacheDir)
+    try:
+        if not OS.path.isdir(cacheDir):
+            OS.makedirs(cacheDir)
+        evict(maxBytes - entryBytes, cacheDir)
+
+        #### Write to Temp File and Rename So Readers Never See Partials ####
+        fd, tempPath = TEMP.mkstemp(suffix = CACHEEXT, dir = cacheDir)
+        with OS.fdopen(fd, "wb") as fo:
+            NUM.savez(fo, **entry)
+        OS.replace(tempPath, path)
+    except (OSError, IOError):
+        return False
+
+    return True
+
+def evict(maxBytes, cacheDir = None):
+    """Removes least recently used entries until the cache fits a budget.
+
+    INPUTS:
+    maxBytes (int): size the cache directory may occupy
+    cacheDir {str, None}: cache directory, defaults to CACHEDIR
+    """
+
+    if cacheDir is None:
+        cacheDir = CACHEDIR
+
+    entries = []
+    for fileName in OS.listdir(cacheDir):
+        if not fileName.endswith(CACHEEXT):
+            continue
+        path = OS.path.join(cacheDir, fileName)
+        try:
+            stat = OS.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    totalBytes = sum([size for mtime, size, path in entries])
+    entries.sort()
+    for mtime, size, path in entries:
+        if totalBytes <= maxBytes:
+            break
+        try:
+            OS.remove(path)
+            totalBytes -= size
+        except OSError:
+            pass
+
+def clear(cacheDir = None):
+    """Removes every entry from the cache."""
+
+    if cacheDir is None:
+        cacheDir = CACHEDIR
+    if OS.path.isdir(cacheDir):
+        evict(0, cacheDir)
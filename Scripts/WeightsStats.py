@@ -0,0 +1,83 @@
+"""
+Summary statistics of spatial weights shared by the spatial diagnostics and
+the estimators of the regression tools.
+
+The statistics of a transformation (row sums, S0, S1 and the traces and
+diagonals of W'W and WW) are computed together on first access and stored
+next to the parsed weights in WeightsCache, so later runs on the same
+weights file read them instead.
+"""
+
+import numpy as NUM
+import WeightsCache as WCACHE
+
+STATNAMES = ["rowSums", "s0", "s1", "diagW2", "diagWtW", "diagWtW_WW",
+             "trcW2", "trcWtW", "trcWtW_WW"]
+
+def computeStats(sparse):
+    """Computes the summary statistics of a sparse weights matrix without
+    forming the products W'W and WW.
+
+    INPUTS:
+    sparse (csr_matrix): spatial weights
+
+    RETURN:
+    stats (dict): name to value for each item in STATNAMES
+    """
+
+    rowSums = NUM.asarray(sparse.sum(1)).ravel()
+    both = sparse + sparse.T
+    diagW2 = NUM.asarray(sparse.multiply(sparse.T).sum(1)).ravel()
+    diagWtW = NUM.asarray(sparse.multiply(sparse).sum(0)).ravel()
+    diagWtW_WW = diagWtW + diagW2
+    return {"rowSums": rowSums, "s0": float(sparse.sum()),
+            "s1": float(both.multiply(both).sum()) / 2.0,
+            "diagW2": diagW2, "diagWtW": diagWtW, "diagWtW_WW": diagWtW_WW,
+            "trcW2": float(diagW2.sum()), "trcWtW": float(diagWtW.sum()),
+            "trcWtW_WW": float(diagWtW_WW.sum())}
+
+class WeightsStats(object):
+    """Lazily computed statistics of the current transformation of a
+    spatial weights object.
+
+    INPUTS:
+    w (PySAL W): spatial weights
+    cacheKey {str, None}: WeightsCache key of the weights, the statistics
+                          are only kept in memory if None
+    """
+
+    def __init__(self, w, cacheKey = None):
+        self.w = w
+        self.cacheKey = cacheKey
+        self.transformStats = {}
+
+    def statistics(self):
+        """Returns the statistics of the current transformation, loading or
+        computing them on first access."""
+
+        transform = self.w.transform.upper()
+        if transform not in self.transformStats:
+            key = WCACHE.statsKey(self.cacheKey, transform)
+            stats = WCACHE.loadStats(key, STATNAMES)
+            if stats is None:
+                stats = computeStats(self.w.sparse)
+                WCACHE.storeStats(key, stats)
+            else:
+                stats = dict((name, value if value.ndim else value.item())
+                             for name, value in stats.items())
+            self.transformStats[transform] = stats
+        return self.transformStats[transform]
+
+    def get(self, name):
+        """Returns a statistic of the current transformation."""
+
+        return self.statistics()[name]
+
+    @property
+    def rowSums(self):
+        return self.get("rowSums")
+
+    @property
+    def trace(self):
+        """tr(W'W + WW) of the LM tests."""
+        return self.get("trcWtW_WW")
@@ -2,15 +2,21 @@
 Author(s): Luc Anselin, Sergio Rey, Xun Li
 """
 import os as OS
+import sys as SYS
+import mmap as MMAP
 import numpy as NUM
-import ErrorUtils as ERROR
+import scipy.sparse as SPARSE
 import arcpy as ARCPY
-import SSDataObject as SSDO
 import SSUtilities as UTILS
 import WeightsUtilities as WU
 import locale as LOCALE
-import pysal as PYSAL
-from pysal.lib.weights import W
+import warnings as WARN
+import WeightsCache as WCACHE
+import WeightsStats as WSTATS
+from libpysal.weights import W
+
+#### Number of Characters Read Per Buffer When Parsing Text Weights ####
+READBLOCKSIZE = 2 ** 24
 
 class PAT_W(object):
     """Wrapper Class for adding attributes to PySAL W for toolkit"""
@@ -24,12 +30,365 @@ class PAT_W(object):
         self.setWeights()
         
     def setWeights(self):
+        """Reads the weights file, reusing the parsed CSR arrays from the
+        weights cache when the file and selection have not changed."""
 
-        if self.wExt == "SWM":
-            self.w = swm2Weights(self.weightsFile, self.ssdo.master2Order)
+        master2Order = self.ssdo.master2Order
+        cacheKey = WCACHE.cacheKey(self.weightsFile, master2Order)
+        arrays = WCACHE.loadArrays(cacheKey)
+        if arrays is not None:
+            self.w = arrays2Weights(arrays)
         else:
-            self.w = text2Weights(self.weightsFile, 
-                                  master2Order = self.ssdo.master2Order)
+            if self.wExt == "SWM":
+                self.w = swm2Weights(self.weightsFile, master2Order)
+            else:
+                self.w = text2Weights(self.weightsFile, 
+                                      master2Order = master2Order)
+            WCACHE.storeArrays(cacheKey, weights2Arrays(self.w))
+
+        #### Statistics Shared by Every Model Fit on These Weights ####
+        self.stats = WSTATS.WeightsStats(self.w, cacheKey)
+        self.w.stats = self.stats
+
+class SparseW(W):
+    """PySAL W built straight from CSR arrays.
+
+    The neighbor and weight dictionaries of a regular W are only assembled
+    when a caller asks for them.  Transformations, the sparse matrix and the
+    summary statistics used by spreg all work on the CSR arrays, so the
+    regression models never require Python neighbor lists.
+    """
+
+    def __init__(self, sparse, ids = None, varName = None, 
+                 silence_warnings = True):
+        self.silence_warnings = silence_warnings
+        sparse = SPARSE.csr_matrix(sparse)
+        numObs = sparse.shape[0]
+        if ids is None:
+            ids = NUM.arange(numObs)
+        self._ids = NUM.asarray(ids)
+        self._id_order = self._ids.tolist()
+        self._id_order_set = False
+        self._csr = {"O": sparse}
+        self._neighbors = None
+        self._weightDicts = {}
+        self._transform = "O"
+        self._varName = varName
+        self.stats = None
+        self._reset()
+
+    def _reset(self):
+        """Reset cached summary properties."""
+        self._cache = {}
+
+    @property
+    def n(self):
+        """Number of units."""
+        return self._csr["O"].shape[0]
+
+    @property
+    def sparse(self):
+        """CSR matrix of the current transformation."""
+        return self._csr[self._transform]
+
+    @property
+    def indptr(self):
+        """Row pointers of the CSR structure."""
+        return self._csr["O"].indptr
+
+    @property
+    def neighbors(self):
+        """Dictionary of neighbor ids, built on first access."""
+        if self._neighbors is None:
+            sparse = self._csr["O"]
+            self._neighbors = self._rowDict(self._ids[sparse.indices])
+        return self._neighbors
+
+    @neighbors.setter
+    def neighbors(self, value):
+        self._neighbors = value
+
+    @property
+    def weights(self):
+        """Dictionary of weights for the current transformation, built on 
+        first access."""
+        if self._transform not in self._weightDicts:
+            data = self._csr[self._transform].data
+            self._weightDicts[self._transform] = self._rowDict(data)
+        return self._weightDicts[self._transform]
+
+    @weights.setter
+    def weights(self, value):
+        self._weightDicts[self._transform] = value
+
+    @property
+    def transformations(self):
+        """Weight dictionaries of every transformation applied so far."""
+        current = self._transform
+        transformations = {}
+        for transform in self._csr:
+            self._transform = transform
+            transformations[transform] = self.weights
+        self._transform = current
+        return transformations
+
+    @property
+    def cardinalities(self):
+        """Number of neighbors for each id."""
+        if "cardinalities" not in self._cache:
+            counts = NUM.diff(self.indptr).tolist()
+            self._cardinalities = dict(zip(self._id_order, counts))
+            self._cache["cardinalities"] = self._cardinalities
+        return self._cardinalities
+
+    def _stat(self, name):
+        """Summary statistic from the attached WeightsStats if any."""
+        if self.stats is None:
+            return getattr(W, name).fget(self)
+        return self.stats.get(name)
+
+    s0 = property(lambda self: self._stat("s0"))
+    s1 = property(lambda self: self._stat("s1"))
+    diagW2 = property(lambda self: self._stat("diagW2"))
+    diagWtW = property(lambda self: self._stat("diagWtW"))
+    diagWtW_WW = property(lambda self: self._stat("diagWtW_WW"))
+    trcW2 = property(lambda self: self._stat("trcW2"))
+    trcWtW = property(lambda self: self._stat("trcWtW"))
+    trcWtW_WW = property(lambda self: self._stat("trcWtW_WW"))
+
+    def _rowDict(self, values):
+        """Splits link values into a dictionary of lists keyed on id."""
+        indptr = self.indptr.tolist()
+        values = values.tolist()
+        rowDict = {}
+        for row, rowID in enumerate(self._id_order):
+            rowDict[rowID] = values[indptr[row]:indptr[row + 1]]
+        return rowDict
+
+    def get_transform(self):
+        """Getter for transform property."""
+        return self._transform
+
+    def set_transform(self, value = "B"):
+        """Transformations of weights (B, R, D, V, O), applied to the data
+        array of the original CSR matrix."""
+        value = value.upper()
+        if value not in self._csr:
+            original = self._csr["O"]
+            data = original.data
+            rowIndex = NUM.repeat(NUM.arange(self.n), NUM.diff(self.indptr))
+            if value == "R":
+                rowSums = NUM.bincount(rowIndex, weights = data, 
+                                       minlength = self.n)
+                data = data / rowSums[rowIndex]
+            elif value == "D":
+                data = data / data.sum()
+            elif value == "B":
+                data = NUM.ones_like(data)
+            elif value == "V":
+                squares = NUM.bincount(rowIndex, weights = data * data, 
+                                       minlength = self.n)
+                data = data / NUM.sqrt(squares)[rowIndex]
+                data = data * (self.n / data.sum())
+            else:
+                raise Exception("unsupported weights transformation")
+            self._csr[value] = SPARSE.csr_matrix((data, original.indices, 
+                                                  original.indptr), 
+                                                 shape = original.shape)
+        self._transform = value
+        self._reset()
+
+    transform = property(get_transform, set_transform)
+
+    def full(self):
+        """Generate a full numpy array."""
+        return self.sparse.toarray(), self._id_order
+
+    def toW(self):
+        """Returns a regular PySAL W with the same neighbors, weights and
+        transformation."""
+        current = self._transform
+        self.transform = "O"
+        w = W(dict(self.neighbors), dict(self.weights), 
+              id_order = list(self._id_order), silence_warnings = True)
+        self.transform = current
+        if current != "O":
+            w.transform = current
+        w._varName = self._varName
+        return w
+
+def links2CSR(rowIDs, rows, neighs, weights):
+    """Builds the CSR structure of the weights from link arrays.  Neighbors
+    keep the order in which they appear in the weights file.
+
+    INPUTS:
+    rowIDs (array): ids of every row in the weights structure
+    rows (array): id of the focal feature for each link
+    neighs (array): id of the neighbor for each link
+    weights (array): weight of each link
+
+    RETURN:
+    sparse (csr_matrix): weights matrix with rows/columns in sorted id order
+    ids (array): sorted ids of the rows
+    """
+
+    ids = NUM.unique(NUM.concatenate([NUM.asarray(rowIDs, dtype = NUM.int64),
+                                      NUM.asarray(neighs, dtype = NUM.int64)]))
+    numObs = len(ids)
+    rowPos = NUM.searchsorted(ids, rows)
+    sortOrder = NUM.argsort(rowPos, kind = "mergesort")
+    indices = NUM.searchsorted(ids, neighs)[sortOrder]
+    data = NUM.asarray(weights, dtype = float)[sortOrder]
+    indptr = NUM.zeros(numObs + 1, dtype = NUM.int64)
+    NUM.cumsum(NUM.bincount(rowPos, minlength = numObs), out = indptr[1:])
+
+    sparse = SPARSE.csr_matrix((data, indices, indptr), 
+                               shape = (numObs, numObs))
+    return sparse, ids
+
+def iterRows(w):
+    """Yields the rows of a weights object in sorted id order.
+
+    INPUTS:
+    w (PySAL W): spatial weights object
+
+    RETURN:
+    rows (generator): (id, neighbor ids, weights) for each row
+    """
+
+    if isinstance(w, SparseW):
+        sparse = w.sparse
+        indptr = sparse.indptr
+        neighIDs = w._ids[sparse.indices]
+        for row, rowID in enumerate(w._id_order):
+            start, stop = indptr[row], indptr[row + 1]
+            yield (rowID, neighIDs[start:stop].tolist(), 
+                   sparse.data[start:stop].tolist())
+    else:
+        masterIDs = list(w.neighbors.keys())
+        masterIDs.sort()
+        for rowID in masterIDs:
+            yield rowID, w.neighbors[rowID], w.weights[rowID]
+
+def writeGAL(w, outputFile, header):
+    """Writes a weights object to a GAL file.
+
+    INPUTS:
+    w (PySAL W): spatial weights object
+    outputFile (str): path to the output GAL file
+    header (str): first line of the GAL file
+    """
+
+    writeGALRows(iterRows(w), outputFile, header)
+
+def writeGALRows(rows, outputFile, header):
+    """Writes weights rows to a GAL file as they are produced.
+
+    INPUTS:
+    rows (iterable): (id, neighbor ids, weights) for each row
+    outputFile (str): path to the output GAL file
+    header (str): first line of the GAL file
+    """
+
+    outputWriter = open(outputFile, 'w')
+    outputWriter.write(header)
+    for rowID, neighbors, weights in rows:
+        outputWriter.write("%s %s\n" % (rowID, len(neighbors)))
+        outputWriter.write("%s\n" % \
+                           (" ".join([str(nbr) for nbr in neighbors])))
+    outputWriter.close()
+
+def writeGWT(w, outputFile, shpName, varName):
+    """Writes a weights object to a GWT/KWT file.
+
+    INPUTS:
+    w (PySAL W): spatial weights object
+    outputFile (str): path to the output GWT/KWT file
+    shpName (str): name of the spatial dataset in the header
+    varName (str): unique ID field in the header
+    """
+
+    writeGWTRows(iterRows(w), w.n, outputFile, shpName, varName)
+
+def writeGWTRows(rows, numObs, outputFile, shpName, varName):
+    """Writes weights rows to a GWT/KWT file as they are produced.
+
+    INPUTS:
+    rows (iterable): (id, neighbor ids, weights) for each row
+    numObs (int): number of rows in the header
+    outputFile (str): path to the output GWT/KWT file
+    shpName (str): name of the spatial dataset in the header
+    varName (str): unique ID field in the header
+    """
+
+    outputWriter = open(outputFile, 'w')
+    outputWriter.write("0 %s %s %s\n" % (numObs, shpName, varName))
+    for rowID, neighbors, weights in rows:
+        outputWriter.write("".join(["%s %s %6G\n" % (rowID, nbr, weight) \
+                                    for nbr, weight in zip(neighbors, 
+                                                           weights)]))
+    outputWriter.close()
+
+def writeSWM(w, swmWriter):
+    """Writes every row of a weights object with an open WU.SWMWriter.
+
+    INPUTS:
+    w (PySAL W): spatial weights object
+    swmWriter (WU.SWMWriter): open SWM writer
+    """
+
+    writeSWMRows(iterRows(w), swmWriter)
+
+def writeSWMRows(rows, swmWriter):
+    """Writes weights rows with an open WU.SWMWriter as they are produced.
+
+    INPUTS:
+    rows (iterable): (id, neighbor ids, weights) for each row
+    swmWriter (WU.SWMWriter): open SWM writer
+    """
+
+    for rowID, neighbors, weights in rows:
+        swmWriter.swm.writeEntry(rowID, neighbors, weights)
+    swmWriter.close()
+
+def weights2Arrays(w):
+    """Returns the CSR arrays of the original (untransformed) weights.
+
+    INPUTS:
+    w (PySAL W): spatial weights object
+
+    RETURN:
+    arrays (dict): indptr, indices, data, ids, varName and transform
+    """
+
+    transform = w.transform
+    w.transform = 'O'
+    sparse = w.sparse.tocsr()
+    w.transform = transform
+
+    return {"indptr": sparse.indptr, "indices": sparse.indices, 
+            "data": sparse.data, "ids": NUM.array(w.id_order), 
+            "varName": getattr(w, "_varName", None), 
+            "transform": transform}
+
+def arrays2Weights(arrays):
+    """Builds a SparseW from the CSR arrays of weights2Arrays.
+
+    INPUTS:
+    arrays (dict): indptr, indices, data, ids, varName and transform
+
+    RETURN:
+    w (PySAL W): spatial weights object
+    """
+
+    ids = arrays["ids"]
+    sparse = SPARSE.csr_matrix((arrays["data"], arrays["indices"], 
+                                arrays["indptr"]), 
+                               shape = (len(ids), len(ids)))
+    w = SparseW(sparse, ids, varName = arrays["varName"])
+    if arrays["transform"].upper() != 'O':
+        w.transform = arrays["transform"]
+    return w
 
 def setUniqueIDField(ssdo, weightsFile):
     """Replace SSUTILITIES.setUniqueIDField to support flexible weights file 
@@ -37,31 +396,32 @@ def setUniqueIDField(ssdo, weightsFile):
     if weightsFile == None:
         return ssdo.oidName
     
-    weightsSuffix = weightsFile.split(".")[-1].lower()
-    swmFileBool = (weightsSuffix == "swm")
-    
-    if swmFileBool:
+    info = getWeightsFileInfo(weightsFile)
+    if info.wType == "SWM":
+        masterField = info.idField
+        if masterField and ssdoHasField(ssdo, masterField):
+            return masterField
         return UTILS.setUniqueIDField(ssdo, weightsFile)
     
-    fo = UTILS.openFile(weightsFile, "r")
-    header = fo.readline().strip()
-    headerItems = header.split(" ") 
-    
-    if len(headerItems) == 1 and weightsSuffix == "gal":
+    if len(info.headerItems) == 1 and info.wType == "GAL":
         return ssdo.oidName
     
-    elif len(headerItems) > 1:
-        for item in headerItems:
-            if not item.isdigit() and item.lower() != "unknown" \
-               and len(item) > 0:
-                masterField = item
-                # check to see if in ssdo
-                for fieldName, fieldObj in ssdo.allFields.items():
-                    if fieldObj.baseName.upper() == masterField.upper():
-                        return masterField
+    elif len(info.headerItems) > 1:
+        for masterField in info.candidateFields:
+            # check to see if in ssdo
+            if ssdoHasField(ssdo, masterField):
+                return masterField
                     
     msg = "Header is not valid in Weights file (%s)." % weightsFile
     ARCPY.AddWarning(msg)
+
+def ssdoHasField(ssdo, fieldName):
+    """Returns True if the SSDataObject has a field with the given base
+    name (case insensitive)."""
+    for fieldObj in ssdo.allFields.values():
+        if fieldObj.baseName.upper() == fieldName.upper():
+            return True
+    return False
              
 def returnWeightFileType(weightsFile):
     name, ext = OS.path.splitext(weightsFile.upper())
@@ -69,52 +429,483 @@ def returnWeightFileType(weightsFile):
         return None
     return ext.strip(".")
 
+class WeightsFileInfo(object):
+    """Header information of a spatial weights file.  The header is read
+    once and every caller is served from the parsed result.
+
+    ATTRIBUTES:
+    wType (str): GAL, GWT, KWT or SWM
+    headerItems (list): items of a text header
+    candidateFields (list): header items that may be the unique ID field
+    idField (str): unique ID field, None if unknown
+    numObs (int): number of features in the weights file
+    rowStandard (bool): row standardization flag of SWM files, else None
+    isNewGal (bool): True unless the file is a GAL with a multi-item header
+    """
+
+    def __init__(self, weightsFile):
+        self.weightsFile = weightsFile
+        self.wType = returnWeightFileType(weightsFile)
+        self.headerItems = []
+        self.candidateFields = []
+        self.idField = None
+        self.numObs = None
+        self.rowStandard = None
+        self.isNewGal = True
+
+        if self.wType == "SWM":
+            self.readSWMHeader()
+        else:
+            self.readTextHeader()
+
+    def readTextHeader(self):
+        fi = open(self.weightsFile, "r")
+        try:
+            self.headerItems = fi.readline().strip().split()
+        finally:
+            fi.close()
+
+        headerItems = self.headerItems
+        self.candidateFields = [ item for item in headerItems \
+                                 if not item.isdigit() and \
+                                 item.lower() != "unknown" ]
+        if self.candidateFields:
+            self.idField = self.candidateFields[0]
+
+        if self.wType == "GAL" and len(headerItems) == 1:
+            self.numObs = LOCALE.atoi(headerItems[0])
+        elif len(headerItems) > 1:
+            self.numObs = LOCALE.atoi(headerItems[1])
+            if self.wType == "GAL":
+                self.isNewGal = False
+
+    def readSWMHeader(self):
+        fo = open(self.weightsFile, "rb")
+        try:
+            header = parseSWMHeader(fo.readline())
+            numObs, rowStandard = NUM.fromfile(fo, "<i4", count = 2)
+        finally:
+            fo.close()
+
+        masterField = header["masterField"]
+        if masterField and masterField.upper() != "UNKNOWN":
+            self.idField = masterField
+            self.candidateFields = [masterField]
+        self.numObs = int(numObs)
+        self.rowStandard = bool(rowStandard)
+
+#### Parsed Headers Keyed on Path, Validated With Size and mtime ####
+WEIGHTSINFO = {}
+
+def getWeightsFileInfo(weightsFile):
+    """Returns the WeightsFileInfo of a weights file, reading the header 
+    only if the file is new or has changed since it was last read.
+
+    INPUTS:
+    weightsFile (str): path to the spatial weights file
+
+    RETURN:
+    info (WeightsFileInfo): parsed header information
+    """
+
+    path = OS.path.normcase(OS.path.abspath(weightsFile))
+    stat = OS.stat(weightsFile)
+    signature = (stat.st_size, stat.st_mtime)
+    cached = WEIGHTSINFO.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    info = WeightsFileInfo(weightsFile)
+    WEIGHTSINFO[path] = (signature, info)
+    return info
+
 def isNewGalFormat(weightsFile):
-    ext = returnWeightFileType(weightsFile)
-    if ext == "GAL":
-        weightFile = open(weightsFile, 'r')
-        info = weightFile.readline().strip().split()
-        if len(info) > 1:
-            return False
-    return True
+    return getWeightsFileInfo(weightsFile).isNewGal
 
 def getIDFieldFromWeights(weightsFile):
+    return getWeightsFileInfo(weightsFile).idField
+
+def getFeatNumFromWeights(weightsFile):
     weightType = returnWeightFileType(weightsFile)
-    if weightType == 'SWM':
-        swm = WU.SWMReader(weightsFile)
-        if not swm.masterField or swm.masterField == 'UNKNOWN':
+    if weightType in ['GAL', 'GWT', 'KWT', 'SWM']:
+        return getWeightsFileInfo(weightsFile).numObs
+
+def parseSWMHeader(header):
+    """Parses the text header line of an SWM file.
+
+    INPUTS:
+    header (bytes|str): first line of the SWM file
+
+    RETURN:
+    info (dict): masterField, version and fixedWeights
+    """
+
+    if not isinstance(header, str):
+        header = header.decode("utf-8", "replace")
+    header = header.strip()
+
+    info = {"masterField": None, "version": None, "fixedWeights": False}
+    if header.startswith("VERSION"):
+        for item in header.split(";"):
+            key, sep, value = item.partition("@")
+            key = key.upper()
+            if key == "VERSION":
+                info["version"] = value
+            elif key == "UNIQUEID":
+                info["masterField"] = value
+            elif key == "FIXEDWEIGHTS":
+                info["fixedWeights"] = value.upper() in ["TRUE", "1"]
+    else:
+        #### Pre 10.1 Header: masterField;spatialRefName ####
+        info["masterField"] = header.split(";")[0]
+
+    return info
+
+def readSWMArrays(swmFile):
+    """Decodes an SWM file into NumPy arrays through a memory map.
+
+    The binary body holds the number of observations and the row
+    standardization flag (int32), followed by one record per observation:
+    masterID and number of neighbors (int32), the neighbor IDs (int32), the
+    weights (float64, a single value when the weights are fixed) and the sum
+    of the unstandardized weights (float64).  Records without neighbors stop
+    after the number of neighbors.  Only the record offsets are found with a
+    scan; the IDs and weights are gathered in vectorized passes.
+
+    INPUTS:
+    swmFile (str): path to the SWM file
+
+    RETURN:
+    info (dict): masterField, version, fixedWeights, numObs and rowStandard
+    masterIDs (array): master ID of each record
+    numNeighs (array): number of neighbors of each record
+    neighIDs (array): concatenated neighbor master IDs
+    weights (array): weight of each link
+    sumUnstandard (array): sum of the unstandardized weights of each record
+    """
+
+    fo = open(swmFile, "rb")
+    try:
+        header = fo.readline()
+        info = parseSWMHeader(header)
+        bodyStart = len(header)
+        fileSize = OS.fstat(fo.fileno()).st_size
+        numInts = (fileSize - bodyStart) // 4
+        if numInts < 2:
             return None
-        return swm.masterField
+        mm = MMAP.mmap(fo.fileno(), 0, access = MMAP.ACCESS_READ)
+    finally:
+        fo.close()
+
+    body = NUM.frombuffer(mm, dtype = "<i4", count = numInts, 
+                          offset = bodyStart)
+    if SYS.byteorder == "little":
+        mmView = memoryview(mm)
+        ints = mmView[bodyStart:bodyStart + 4 * numInts].cast("i")
     else:
-        weightFile = open(weightsFile, 'r')
-        info = weightFile.readline().strip().split()
-        weightFile.close()
-        for item in info:
-            if not item.isdigit() and item.lower() != "unknown" \
-               and len(item) > 0:
-                return item
-        return None
+        mmView = None
+        ints = body.tolist()
 
-def getFeatNumFromWeights(weightsFile):
-    weightType = returnWeightFileType(weightsFile)
-    if weightType in ['GAL', 'GWT', 'KWT']:
-        weightFile = open(weightsFile, 'r')
-        info = weightFile.readline().strip().split()
-        if weightType == 'GAL':
-            if len(info) == 1:
-                return LOCALE.atoi(info[0])
-            elif len(info) > 1:
-                return LOCALE.atoi(info[1])
+    try:
+        numObs, rowStandard = int(body[0]), int(body[1])
+        info["numObs"] = numObs
+        info["rowStandard"] = rowStandard
+
+        #### Scan Record Offsets (in int32 Units) ####
+        fixedWeights = info["fixedWeights"]
+        starts = [0] * numObs
+        pos = 2
+        try:
+            for record in range(numObs):
+                starts[record] = pos
+                nn = ints[pos + 1]
+                if not nn:
+                    pos += 2
+                elif fixedWeights:
+                    pos += 6 + nn
+                else:
+                    pos += 4 + 3 * nn
+        except IndexError:
+            return None
+        if pos != numInts or (fileSize - bodyStart) % 4:
+            return None
+
+        #### Gather IDs, Weights and Sums ####
+        starts = NUM.array(starts, dtype = NUM.int64)
+        masterIDs = body[starts].astype(NUM.int64)
+        numNeighs = body[starts + 1].astype(NUM.int64)
+        numLinks = numNeighs.sum()
+        firstLink = NUM.cumsum(numNeighs) - numNeighs
+        within = NUM.arange(numLinks) - NUM.repeat(firstLink, numNeighs)
+        neighStarts = starts + 2
+        neighIDs = body[NUM.repeat(neighStarts, numNeighs) + 
+                        within].astype(NUM.int64)
+
+        weightStarts = neighStarts + numNeighs
+        if fixedWeights:
+            rowWeights = int32Pairs2Float(body, weightStarts)
+            weights = NUM.repeat(rowWeights, numNeighs)
+            sumStarts = weightStarts + 2
         else:
-            return LOCALE.atoi(info[1])
-    elif weightType == 'SWM':
-        swm = WU.SWMReader(weightsFile)
-        return swm.numObs
+            weights = int32Pairs2Float(body, NUM.repeat(weightStarts, 
+                                                        numNeighs) + 
+                                       2 * within)
+            sumStarts = weightStarts + 2 * numNeighs
+        sumUnstandard = NUM.zeros(numObs, dtype = float)
+        hasNeighs = numNeighs > 0
+        sumUnstandard[hasNeighs] = int32Pairs2Float(body, 
+                                                    sumStarts[hasNeighs])
+    finally:
+        #### Release Every View Before Closing the Memory Map ####
+        if mmView is not None:
+            ints.release()
+            mmView.release()
+        ints = None
+        body = None
+        mm.close()
 
+    return info, masterIDs, numNeighs, neighIDs, weights, sumUnstandard
+
+def int32Pairs2Float(body, positions):
+    """Reinterprets consecutive int32 pairs as little-endian float64 values.
+
+    INPUTS:
+    body (array): int32 view of the SWM body
+    positions (array): int32 offset of the first half of each value
+
+    RETURN:
+    values (array): float64 values
+    """
+
+    pairs = NUM.empty((len(positions), 2), dtype = body.dtype)
+    pairs[:,0] = body[positions]
+    pairs[:,1] = body[positions + 1]
+    return pairs.view("<f8").ravel().astype(float)
+
+def readSWMEntries(swmFile):
+    """Reads an SWM file one record at a time with WeightsUtilities.  Used
+    when the binary layout is not the one expected by readSWMArrays.
+
+    INPUTS:
+    swmFile (str): path to the SWM file
+
+    RETURN:
+    Same as readSWMArrays
+    """
 
-def swm2Weights(swmFile, master2Order=None):
     swm = WU.SWMReader(swmFile)
     numObs = swm.numObs
+    masterIDs = NUM.empty(numObs, dtype = NUM.int64)
+    numNeighs = NUM.zeros(numObs, dtype = NUM.int64)
+    sumUnstandard = NUM.zeros(numObs, dtype = float)
+    neighList = []
+    weightList = []
+    for record in range(numObs):
+        masterID, nn, nhsTemp, weightsTemp, sumTemp = swm.swm.readEntry()
+        masterIDs[record] = masterID
+        if nn:
+            numNeighs[record] = nn
+            neighList.append(NUM.asarray(nhsTemp, dtype = NUM.int64))
+            weightList.append(NUM.asarray(weightsTemp, dtype = float))
+            sumUnstandard[record] = sumTemp[0]
+    swm.close()
+
+    info = {"masterField": swm.masterField, "version": None, 
+            "fixedWeights": False, "numObs": numObs, 
+            "rowStandard": swm.rowStandard}
+    if neighList:
+        neighIDs = NUM.concatenate(neighList)
+        weights = NUM.concatenate(weightList)
+    else:
+        neighIDs = NUM.empty((0,), dtype = NUM.int64)
+        weights = NUM.empty((0,), dtype = float)
+
+    return info, masterIDs, numNeighs, neighIDs, weights, sumUnstandard
+
+def readTextBlocks(fi, blockSize = READBLOCKSIZE):
+    """Reads the remainder of an open text weights file in large buffers.
+    Each yielded block ends on a line boundary so that no token is split.
+
+    INPUTS:
+    fi (file): open text file positioned after the header
+    blockSize {int, READBLOCKSIZE}: number of characters per read
+
+    RETURN:
+    block (str): generator of text blocks
+    """
+
+    decimalPoint = LOCALE.localeconv()['decimal_point']
+    remainder = ""
+    while True:
+        block = fi.read(blockSize)
+        if not block:
+            break
+        block = remainder + block
+        lastLine = block.rfind("\n")
+        if lastLine < 0:
+            remainder = block
+            continue
+        remainder = block[lastLine + 1:]
+        block = block[:lastLine + 1]
+        if decimalPoint != ".":
+            block = block.replace(decimalPoint, ".")
+        yield block
+
+    if remainder.strip():
+        if decimalPoint != ".":
+            remainder = remainder.replace(decimalPoint, ".")
+        yield remainder
+
+def tokenizeBlock(block, dtype = float):
+    """Converts a whitespace delimited block of text into a NumPy array.
+
+    INPUTS:
+    block (str): text to be tokenized
+    dtype {type, float}: data type of the returned array
+
+    RETURN:
+    tokens (array): 1-d array of parsed values, None if a token is invalid
+    """
+
+    with WARN.catch_warnings():
+        #### Older NumPy Only Warns When It Stops at an Invalid Token ####
+        WARN.simplefilter("error", DeprecationWarning)
+        try:
+            return NUM.fromstring(block, dtype = dtype, sep = " ")
+        except (ValueError, DeprecationWarning):
+            return None
+
+def parseGALBody(fi):
+    """Tokenizes the body of a GAL file in one pass.
+
+    INPUTS:
+    fi (file): open GAL file positioned after the header
+
+    RETURN:
+    masterIDs (array): master ID of each record in file order
+    numNeighs (array): number of neighbors of each record
+    neighIDs (array): concatenated neighbor master IDs
+    """
+
+    lines = "".join(readTextBlocks(fi)).rstrip().splitlines()
+    if len(lines) % 2:
+        #### Last Record Is An Island Without Its Empty Neighbor Line ####
+        lines.append("")
+
+    records = tokenizeBlock(" ".join(lines[0::2]), dtype = NUM.int64)
+    neighIDs = tokenizeBlock(" ".join(lines[1::2]), dtype = NUM.int64)
+    if records is None or neighIDs is None or len(records) != len(lines):
+        return None
+    masterIDs = records[0::2]
+    numNeighs = records[1::2]
+    if numNeighs.sum() != len(neighIDs):
+        return None
+
+    return masterIDs, numNeighs, neighIDs
+
+def parseGWTBody(fi):
+    """Tokenizes the body of a GWT/KWT file one buffer at a time.
+
+    INPUTS:
+    fi (file): open GWT/KWT file positioned after the header
+
+    RETURN:
+    masterIDs (array): master ID of each link in file order
+    neighIDs (array): neighbor master ID of each link
+    weights (array): weight of each link
+    """
+
+    tokenList = []
+    for block in readTextBlocks(fi):
+        tokens = tokenizeBlock(block)
+        if tokens is None or len(tokens) % 3:
+            return None
+        tokenList.append(tokens)
+
+    if tokenList:
+        links = NUM.concatenate(tokenList).reshape(-1, 3)
+    else:
+        links = NUM.empty((0, 3), dtype = float)
+    masterIDs = links[:,0].astype(NUM.int64)
+    neighIDs = links[:,1].astype(NUM.int64)
+    if NUM.any(masterIDs != links[:,0]) or NUM.any(neighIDs != links[:,1]):
+        return None
+
+    return masterIDs, neighIDs, links[:,2].copy()
+
+def mapMasterIDs(masterIDs, master2Order):
+    """Vectorized lookup of master IDs in the master2Order dictionary.
+
+    INPUTS:
+    masterIDs (array): master IDs to be mapped
+    master2Order (dict): master ID to order ID
+
+    RETURN:
+    orderIDs (array): mapped order IDs (undefined where not found)
+    found (array): boolean mask of master IDs present in master2Order
+    """
+
+    numKeys = len(master2Order)
+    if not numKeys:
+        found = NUM.zeros(len(masterIDs), dtype = bool)
+        return NUM.zeros(len(masterIDs), dtype = NUM.int64), found
+
+    keys = NUM.fromiter(master2Order.keys(), dtype = NUM.int64, 
+                        count = numKeys)
+    values = NUM.fromiter(master2Order.values(), dtype = NUM.int64, 
+                          count = numKeys)
+    sortOrder = NUM.argsort(keys)
+    keys = keys[sortOrder]
+    values = values[sortOrder]
+
+    position = NUM.searchsorted(keys, masterIDs)
+    position[position == numKeys] = 0
+    found = keys[position] == masterIDs
+
+    return values[position], found
+
+def subsetWeights(sparse, orderIDs, found, restandardize = False, 
+                  extraIDs = None):
+    """Maps weights read in master ID space onto the order IDs of the 
+    spatial dataset.  Rows and columns of features that are not in the 
+    selection are masked out of the CSR structure and, if requested, the 
+    remaining weights of every row are divided by their new row sum.
+
+    INPUTS:
+    sparse (csr_matrix): weights with rows/columns in master ID order
+    orderIDs (array): order ID of each row (see mapMasterIDs)
+    found (array): boolean mask of rows that are in the selection
+    restandardize {bool, False}: re-standardize the remaining rows
+    extraIDs {array, None}: order IDs that need a row even without links
+
+    RETURN:
+    sparse (csr_matrix): weights with rows/columns in sorted order ID order
+    ids (array): sorted order IDs of the rows
+    """
+
+    indices = sparse.indices
+    rowIndex = NUM.repeat(NUM.arange(len(orderIDs)), NUM.diff(sparse.indptr))
+    keep = found[rowIndex] & found[indices]
+    rowIndex = rowIndex[keep]
+    data = sparse.data[keep]
+    if restandardize:
+        rowSums = NUM.bincount(rowIndex, weights = data, 
+                               minlength = len(orderIDs))
+        data = data / rowSums[rowIndex]
+
+    rowIDs = orderIDs[found]
+    if extraIDs is not None:
+        rowIDs = NUM.append(rowIDs, extraIDs)
+    return links2CSR(rowIDs, orderIDs[rowIndex], orderIDs[indices[keep]], 
+                     data)
+
+def swm2Weights(swmFile, master2Order=None):
+    swmArrays = readSWMArrays(swmFile)
+    if swmArrays is None:
+        swmArrays = readSWMEntries(swmFile)
+    info, masterIDs, numNeighs, neighIDs, weights, sumUnstandard = swmArrays
+    numObs = info["numObs"]
+    rowStandard = info["rowStandard"]
     adjust = False
     
     if master2Order and len(master2Order) < numObs: 
@@ -123,57 +914,31 @@ def swm2Weights(swmFile, master2Order=None):
         ARCPY.AddWarning(msg)
         adjust = True
 
-    neighs = {}
-    w = {}
-    rowStandard = swm.rowStandard
-    for i in range(numObs):
-        masterID, nn, nhsTemp, weightsTemp, sumUnstandard = swm.swm.readEntry()
-        if master2Order == None:
-            # no need adjust when convert directly from weights content
-            orderID = masterID
-            nhIDs = nhsTemp
-            weights = weightsTemp
-            
-        elif masterID in master2Order:
-            orderID = master2Order[masterID]         
-            if not adjust:
-                nhIDs = [ master2Order[nh] for nh in nhsTemp ]
-                weights = weightsTemp
-            else:
-                # Restandardize Due to Subset/Select
-                nhIDs = []
-                weights = []            
-                if nn:
-                    for i in range(nn):
-                        nh = nhsTemp[i]
-                        if nh in master2Order:
-                            nhOrder = master2Order[nh]
-                            nhIDs.append(nhOrder)
-                            nhWeight = weightsTemp[i]
-                            if rowStandard:
-                                # Unstandardize if Necessary
-                                nhWeight = nhWeight * sumUnstandard[0]
-                            weights.append(nhWeight)            
-    
-                # Re-Standardize
-                if nhIDs:
-                    weights = NUM.array(weights)
-                    if rowStandard:
-                        weights = (1.0 / weights.sum()) * weights
-    
-        # Add To Dict Structures
-        neighs[orderID] = nhIDs
-        w[orderID] = weights
+    sparse, ids = links2CSR(masterIDs, NUM.repeat(masterIDs, numNeighs), 
+                            neighIDs, weights)
+    if master2Order != None:
+        orderIDs, found = mapMasterIDs(ids, master2Order)
+        if not adjust:
+            linkFound = NUM.repeat(found, NUM.diff(sparse.indptr))
+            if not found[sparse.indices[linkFound]].all():
+                msg = ("A unique Master ID entry was not found in the "
+                       "spatial dataset! Invalid SWM File...")
+                ARCPY.AddError(msg)
+                raise SystemExit()
 
-    swm.close()
-    wobj = W(neighs, w)
-    wobj._varName = swm.masterField
-    return wojb
+        # Restandardize Due to Subset/Select.  Unstandardizing with 
+        # sumUnstandard first cancels out in the row renormalization.
+        sparse, ids = subsetWeights(sparse, orderIDs, found, 
+                                    restandardize = adjust and rowStandard)
+
+    wobj = SparseW(sparse, ids, varName = info["masterField"])
+    return wobj
 
 def text2Weights(weightsFile, master2Order = None):
 
     adjust = False
-    numObs = getFeatNumFromWeights(weightsFile)
+    weightsInfo = getWeightsFileInfo(weightsFile)
+    numObs = weightsInfo.numObs
     if master2Order:
         if len(master2Order) < numObs: 
             msg = ("The spatial attributes have fewer entries than spatial "
@@ -181,150 +946,78 @@ def text2Weights(weightsFile, master2Order = None):
             ARCPY.AddWarning(msg)
             adjust = True
 
-    uid = None
-    neighDict = {}
-    weightDict = {}
-    orderID = None
+    uid = weightsInfo.idField
     inType = OS.path.splitext(weightsFile)[-1].upper()
-    
-    fi = open(weightsFile, "r")
-    info = fi.readline().strip()
-    for item in info.split(" "):
-        if not item.isdigit() and item.lower() != "unknown" \
-           and len(item) > 0:
-            uid = item
-            break
     if uid == None:
         msg = ("A unique ID entry was not found in the weights file. Please "
                "check the weights file.")
         ARCPY.AddError(msg)
         raise SystemExit()
+    
+    fi = open(weightsFile, "r")
+    fi.readline()
         
     if inType == ".GAL":
-        # read 2 lines at a time
-        line = fi.readline()
-        while line:
-            # read line for id and #neighbors
-            masterID, nn = [int(i) for i in line.strip().split()]
-            orderID = None
-            if not adjust:
-                try:
-                    if master2Order:
-                        orderID = master2Order[masterID]
-                    else:
-                        orderID = masterID
-                except:
-                    msg = ("A unique Master ID entry was not found in the "
-                           "spatial dataset! Invaid GAL File...")
-                    ARCPY.AddError(msg)
-                    raise SystemExit()
-            else:
-                if masterID in master2Order:
-                    orderID = int(master2Order[masterID])
-                #### Check Unique ID ####
-                if orderID in neighDict:
-                    ARCPY.AddIDMessage("Error", 644, "UNIQUE_ID")
-                    ARCPY.AddIDMessage("Error", 643)
-                    raise SystemExit()
-            
-            # read next line for neighbor ids
-            line = fi.readline()
-            if orderID is not None:
-                neighIDs = [int(i) for i in line.strip().split()]
-                if not adjust:
-                    try:
-                        if master2Order:
-                            neighs = [master2Order[i] for i in neighIDs]
-                        else:
-                            neighs = neighIDs
-                        neighDict[orderID] = neighs
-                        weightDict[orderID] = [1. for i in neighs] 
-                    except:
-                        msg = ("A unique ID entry" + uid + " was not found in the "
-                               "spatial dataset! Invalid GAL file...")
-                        ARCPY.AddError(msg)
-                        raise SystemExit()
-                else:
-                    neighDict[orderID] = []
-                    weightDict[orderID] = []
-                           
-                    for curMasterID in neighIDs:
-                        if curMasterID in master2Order:
-                            neighDict[orderID].append(master2Order[curMasterID])
-                            weightDict[orderID].append(1.)
-                           
-                    weightArray = NUM.array(weightDict[orderID]) 
-                    if len(weightArray) > 0:
-                        weightArray = 1.0 * weightArray / len(weightArray)
-                        weightDict[orderID] = weightArray.tolist()
-                    
-            line = fi.readline()
-            
-    # inType not GAL
+        parsed = parseGALBody(fi)
     else:
-        for line in fi:
-            masterID, nid, weight = line.strip().split()
-            masterID = int(masterID)
-            nid = int(nid)
-            
-            if not adjust:
-                try:
-                    if master2Order:
-                        orderID = master2Order[masterID] 
-                        neighID = master2Order[nid] 
-                    else:
-                        orderID = masterID 
-                        neighID = nid
-                except:
-                    msg = ("A unique Master ID entry was not found in the "
-                           "spatial dataset! Invalid GWT File...")
-                    ARCPY.AddError(msg)
-                    raise SystemExit()
-
-                #### Process Intersection in Weights Matrix ####
-                if orderID not in neighDict:
-                    neighDict[orderID] = []
-                    weightDict[orderID] = []
-                try:
-                    neighDict[orderID].append( neighID )
-                    weightDict[orderID].append( LOCALE.atof(weight) )
-                except:
-                    msg = ("Parsing error encountered while creating spatial "
-                           "weights object...")
-                    ARCPY.AddError(msg)
-                    raise SystemExit()
-            else:
-                if masterID in master2Order:
-                    orderID = master2Order[masterID]
-                    if orderID not in neighDict:
-                        neighDict[orderID] = []
-                        weightDict[orderID] = []
-                    if nid in master2Order:
-                        orderNID = master2Order[nid]
-                        neighDict[orderID].append(orderNID)
-                        weightDict[orderID].append(LOCALE.atof(weight))
-        # restandardization
-        if adjust:
-            for orderID in weightDict.keys():
-                if len(weightDict[orderID]) > 0:
-                    sumWeight = 0.0
-                    for item in weightDict[orderID]:
-                        sumWeight += item
-                    weightArray = 1.0 * NUM.array(weightDict[orderID])/sumWeight
-                    weightDict[orderID] = weightArray.tolist()
+        parsed = parseGWTBody(fi)
     fi.close()
-    if returnWeightFileType(weightsFile) == 'GWT' and master2Order:
-        for neighKey in master2Order.keys():
-            orderID = int(master2Order[int(neighKey)])
-            if orderID not in neighDict:
-                neighDict[orderID] = []
-                weightDict[orderID] = []
-
-    w = W(neighDict, weightDict)
+    if parsed is None:
+        msg = ("Parsing error encountered while creating spatial "
+               "weights object...")
+        ARCPY.AddError(msg)
+        raise SystemExit()
+
+    if inType == ".GAL":
+        masterIDs, numNeighs, neighIDs = parsed
+        rows = NUM.repeat(masterIDs, numNeighs)
+        weights = NUM.ones(len(neighIDs), dtype = float)
+    else:
+        rows, neighIDs, weights = parsed
+        masterIDs = rows
+    sparse, ids = links2CSR(masterIDs, rows, neighIDs, weights)
+
+    if master2Order:
+        orderIDs, found = mapMasterIDs(ids, master2Order)
+        recordFound = found[NUM.searchsorted(ids, masterIDs)]
+        if inType == ".GAL" and not adjust:
+            if not recordFound.all():
+                msg = ("A unique Master ID entry was not found in the "
+                       "spatial dataset! Invaid GAL File...")
+                ARCPY.AddError(msg)
+                raise SystemExit()
+            if not found.all():
+                msg = ("A unique ID entry" + uid + " was not found in "
+                       "the spatial dataset! Invalid GAL file...")
+                ARCPY.AddError(msg)
+                raise SystemExit()
+        elif inType == ".GAL":
+            #### Check Unique ID ####
+            selected = masterIDs[recordFound]
+            if len(NUM.unique(selected)) < len(selected):
+                ARCPY.AddIDMessage("Error", 644, "UNIQUE_ID")
+                ARCPY.AddIDMessage("Error", 643)
+                raise SystemExit()
+        elif not adjust and not found.all():
+            msg = ("A unique Master ID entry was not found in the "
+                   "spatial dataset! Invalid GWT File...")
+            ARCPY.AddError(msg)
+            raise SystemExit()
+
+        extraIDs = None
+        if returnWeightFileType(weightsFile) == 'GWT':
+            #### Back-Fill Islands Missing From the GWT File ####
+            extraIDs = NUM.fromiter(master2Order.values(), 
+                                    dtype = NUM.int64, 
+                                    count = len(master2Order))
+        sparse, ids = subsetWeights(sparse, orderIDs, found, 
+                                    restandardize = adjust, 
+                                    extraIDs = extraIDs)
+
+    w = SparseW(sparse, ids, varName = uid)
     if inType == ".GAL":
         w.transform = 'r'
 
-    w._varName = uid
     return w
 
 def lmChoice(result, criticalValue):
@@ -362,8 +1055,229 @@ def lmChoice(result, criticalValue):
     else:
         return "OLS"
 
+#### Final Model Label of Each Candidate Estimator of autospace ####
+CANDIDATEMODELS = {"LAG_HAC": "Spatial Lag with Spatial Error - HAC",
+                   "COMBO_HET": "Spatial Lag with Spatial Error - Heteroskedastic",
+                   "COMBO_HOM": "Spatial Lag with Spatial Error - Homoskedastic",
+                   "ERROR_HET": "Spatial Error - Heteroskedastic",
+                   "ERROR_HOM": "Spatial Error - Homoskedastic",
+                   "LAG_HET": "Spatial Lag - Heteroskedastic",
+                   "LAG_HOM": "Spatial Lag - Homoskedastic",
+                   "OLS_HET": "No Space - Heteroskedastic",
+                   "OLS_HOM": "No Space - Homoskedastic"}
+
+#### Candidates Started Before the OLS Diagnostics Are Known ####
+SPECULATIVEMODELS = {True: ["COMBO_HET", "COMBO_HOM", "ERROR_HET",
+                            "ERROR_HOM"],
+                     False: ["LAG_HAC", "ERROR_HET", "ERROR_HOM"]}
+
+#### spreg Model of Each GMM Error and Combo Candidate ####
+GMERRORCANDIDATES = {"COMBO_HET": "GM_Combo_Het",
+                     "COMBO_HOM": "GM_Combo_Hom",
+                     "ERROR_HET": "GM_Error_Het",
+                     "ERROR_HOM": "GM_Error_Hom"}
+
+#### Model Data Shared by the Candidates of a Worker Process ####
+WORKERMODELDATA = None
+
+def candidateKey(model, hetFlag, combo):
+    """Returns the candidate estimator of an lmChoice category.
+
+    INPUTS:
+    model (str): ['MIXED', 'LAG', 'ERROR', 'OLS']
+    hetFlag (bool): residuals are heteroskedastic
+    combo (bool): use the combo model rather than HAC for lag-error
+
+    RETURN:
+    key (str): one of CANDIDATEMODELS
+    """
+
+    if model == "MIXED":
+        if not combo:
+            return "LAG_HAC"
+        prefix = "COMBO"
+    else:
+        prefix = model
+    return prefix + ("_HET" if hetFlag else "_HOM")
+
+def fitCandidate(key, y, x, w, gwk, options):
+    """Fits one candidate estimator of autospace.
+
+    INPUTS:
+    key (str): one of CANDIDATEMODELS except OLS_HOM
+    y (array): nx1 array for dependent variable
+    x (array): n x (k - 1) explanatory variables
+    w (PySAL W): spatial weights
+    gwk (PySAL W): kernel weights, only used by LAG_HAC
+    options (dict): name_y, name_x, name_w, name_gwk, name_ds, spat_diag,
+                    diagnostics, reduced_form and e_pred
+
+    RETURN:
+    regression (object): PySAL regression result
+    """
+
+    import spreg as SPREG
+    import RegressionUtils as RUTILS
+    name_y, name_x = options['name_y'], options['name_x']
+    name_w, name_ds = options['name_w'], options['name_ds']
+    spatDiag = options.get('spat_diag', True)
+    if key.startswith("LAG"):
+        robust = {"LAG_HAC": 'hac', "LAG_HET": 'white'}.get(key)
+        return RUTILS.fitGMLag(y, x, w, robust = robust, 
+                               gwk = gwk if robust == 'hac' else None,
+                               diagnostics = options.get('diagnostics'),
+                               reducedForm = options.get('reduced_form'),
+                               ePred = options.get('e_pred', True),
+                               nameY = name_y, nameX = name_x,
+                               nameGWK = options['name_gwk'])
+    elif key in GMERRORCANDIDATES:
+        return RUTILS.fitGMError(y, x, w, model = GMERRORCANDIDATES[key],
+                                 diagnostics = options.get('diagnostics'),
+                                 reducedForm = options.get('reduced_form'),
+                                 ePred = options.get('e_pred', True),
+                                 nameY = name_y, nameX = name_x,
+                                 nameW = name_w, nameDS = name_ds)
+    elif not spatDiag:
+        return choiceOLS(y, x, None, options, robust = 'white')
+    return SPREG.OLS(y,x,robust='white',nonspat_diag=spatDiag,
+                     name_y=name_y,name_x=name_x,name_ds=name_ds)
+
+def choiceOLS(y, x, w, options, robust = None):
+    """Fits OLS with the spreg base class for the levels below FULL,
+    computing only the Koenker-Bassett and LM tests autospace chooses
+    with (none if w is None).
+
+    INPUTS:
+    y (array): nx1 array for dependent variable
+    x (array): n x (k - 1) explanatory variables
+    w {PySAL W, None}: spatial weights of the LM tests
+    options (dict): see fitCandidate
+    robust {str, None}: None or white
+
+    RETURN:
+    regression (object): spreg.BaseOLS with summary and, if w is given,
+                         koenker_bassett, lm_error, lm_lag, rlm_error and
+                         rlm_lag as spreg.OLS sets them
+    """
+
+    import spreg as SPREG
+    import spreg.diagnostics as DIAG
+    import spreg.diagnostics_sp as DIAGSP
+    import RegressionUtils as RUTILS
+
+    name_y, name_x = options['name_y'], options['name_x']
+    if name_x is None:
+        name_x = ["var_{0}".format(i + 1) for i in range(x.shape[1])]
+    names = ["CONSTANT"] + list(name_x)
+    ols = SPREG.BaseOLS(y, RUTILS.addConstant(x), robust = robust)
+
+    tests = []
+    if w is not None:
+        ols.koenker_bassett = DIAG.koenker_bassett(ols)
+        cache = DIAGSP.spDcache(ols, w)
+        ols.lm_error = DIAGSP.lmErr(ols, w, cache)
+        ols.lm_lag = DIAGSP.lmLag(ols, w, cache)
+        ols.rlm_error = DIAGSP.rlmErr(ols, w, cache)
+        ols.rlm_lag = DIAGSP.rlmLag(ols, w, cache)
+        tests = [("Koenker-Bassett Test", ols.koenker_bassett['kb'],
+                  ols.koenker_bassett['pvalue']),
+                 ("Lagrange Multiplier (lag)",) + tuple(ols.lm_lag),
+                 ("Robust LM (lag)",) + tuple(ols.rlm_lag),
+                 ("Lagrange Multiplier (error)",) + tuple(ols.lm_error),
+                 ("Robust LM (error)",) + tuple(ols.rlm_error)]
+
+    title = "ORDINARY LEAST SQUARES"
+    diagnostics = RUTILS.diagnosticLevel(options.get('diagnostics'))
+    if diagnostics == "COEFFICIENTS":
+        ols.summary = RUTILS.coefficientSummary(title, names, ols.betas)
+        return ols
+
+    if robust == 'white':
+        title += " (WHITE STANDARD ERRORS)"
+    ols.r2 = DIAG.r2(ols)
+    info = [("Dependent Variable", name_y or "y"),
+            ("Number of Observations", int(ols.n)),
+            ("Number of Variables", int(ols.k)),
+            ("R-squared", ols.r2)]
+    ols.summary = RUTILS.inferenceSummary(title, names, ols.betas, ols.vm,
+                                          info = info, tests = tests,
+                                          df = ols.n - ols.k)
+    return ols
+
+def initCandidateWorker(y, x, w, gwk, options):
+    """Stores the model data in a worker process."""
+
+    global WORKERMODELDATA
+    WORKERMODELDATA = (y, x, w, gwk, options)
+
+def fitWorkerCandidate(key):
+    """Fits a candidate estimator on the data of the worker process.
+
+    RETURN:
+    regression (object): PySAL regression result, None if the fit failed
+    error (str): traceback of the failed fit, None if it succeeded
+    """
+
+    y, x, w, gwk, options = WORKERMODELDATA
+    try:
+        return fitCandidate(key, y, x, w, gwk, options), None
+    except Exception:
+        #### Only Reported if the Search Chooses This Candidate ####
+        import traceback as TRACE
+        return None, TRACE.format_exc()
+
+def startCandidates(keys, y, x, w, gwk, options, numWorkers = None):
+    """Starts fitting candidate estimators in a pool of processes.
+
+    INPUTS:
+    keys (list): candidates to fit
+    y, x, w, gwk, options: see fitCandidate
+    numWorkers {int, None}: number of processes, defaults to
+                            NeighborUtils.NUMWORKERS
+
+    RETURN:
+    pool (multiprocessing.Pool): pool running the candidates
+    results (dict): candidate key to AsyncResult
+    """
+
+    import NeighborUtils as NUTILS
+
+    if numWorkers is None:
+        numWorkers = NUTILS.NUMWORKERS
+    context = NUTILS.processContext()
+    pool = context.Pool(processes = max(min(numWorkers, len(keys)), 1),
+                        initializer = initCandidateWorker,
+                        initargs = (y, x, w, gwk, options))
+    results = dict((key, pool.apply_async(fitWorkerCandidate, (key,)))
+                   for key in keys)
+    return pool, results
+
+def candidateResult(result):
+    """Returns the regression of a speculative candidate.
+
+    INPUTS:
+    result (AsyncResult): result of startCandidates
+
+    RETURN:
+    regression (object): PySAL regression result
+    """
+
+    regression, error = result.get()
+    if error is not None:
+        raise RuntimeError("Fitting the chosen model failed:\n" + error)
+    return regression
+
+def stopCandidates(pool):
+    """Terminates the worker processes, including the candidates still
+    fitting, so the tool does not wait for models it will not use."""
+
+    pool.terminate()
+    pool.join()
+
 def autospace(y,x,w,gwk,opvalue=0.01,combo=False,name_y=None,name_x=None,
-              name_w=None,name_gwk=None,name_ds=None):
+              name_w=None,name_gwk=None,name_ds=None,speculative=False,
+              numWorkers=None,reducedForm=None,ePred=True,
+              diagnostics="FULL"):
     """
     Runs automatic spatial regression using decision tree
     
@@ -388,6 +1302,24 @@ def autospace(y,x,w,gwk,opvalue=0.01,combo=False,name_y=None,name_x=None,
     combo        : boolean
                    flag for use of combo model rather than HAC for lag-error
                    model; default: combo = False
+    speculative  : boolean
+                   fit the likely spatial candidates (SPECULATIVEMODELS) in
+                   a process pool while the OLS runs, keeping the one chosen
+                   and terminating the rest; default: speculative = False
+    numWorkers   : integer
+                   number of processes of the speculative candidates;
+                   default: NeighborUtils.NUMWORKERS
+    reducedForm  : string
+                   reduced form method of the lag and combo models, see
+                   RegressionUtils.reducedFormPredictions; default: None
+    ePred        : boolean
+                   keep the reduced form residuals; default: True
+    diagnostics  : string
+                   FULL fits every model with its spreg class and tests,
+                   the lower levels (see RegressionUtils.DIAGNOSTICLEVELS)
+                   fit the spreg base classes and skip their reports and
+                   tests, computing only the OLS tests driving the choice;
+                   default: FULL
                    
     Returns
     -------
@@ -409,64 +1341,54 @@ def autospace(y,x,w,gwk,opvalue=0.01,combo=False,name_y=None,name_x=None,
                    results['regression1']: regression object with base model (OLS)
                    results['regression2']: regression object with final model
     """
+    import spreg as SPREG
+
     results = {}
-    results['spatial error']=False
-    results['spatial lag']=False
-    r1 = PYSAL.model.spreg.OLS(y,x,w=w,gwk=gwk,spat_diag=True,
-                               name_y=name_y,name_x=name_x,
-                               name_w=name_w,name_gwk=name_gwk,
-                               name_ds=name_ds)
-    results['regression1'] = r1
-    Het = r1.koenker_bassett['pvalue']
-    if Het < opvalue:
-        Hetflag = True
-    else:
-        Hetflag = False
-    results['heteroskedasticity'] = Hetflag
-    model = lmChoice(r1, opvalue)
-    if model == "MIXED":
-        if not combo:
-            r2 = PYSAL.model.spreg.GM_Lag(y,x,w=w,gwk=gwk,robust='hac',spat_diag = True,
-                                          name_y=name_y, name_x=name_x,
-                                          name_w=name_w,name_gwk=name_gwk,
-                                          name_ds=name_ds)
-            results['final model']="Spatial Lag with Spatial Error - HAC"
-        elif Hetflag:
-            r2 = PYSAL.model.spreg.GM_Combo_Het(y,x,w=w,name_y=name_y,name_x=name_x,
-                                                name_w=name_w,name_ds=name_ds)
-            results['final model']="Spatial Lag with Spatial Error - Heteroskedastic"
-        else:
-            r2 = PYSAL.model.spreg.GM_Combo_Hom(y,x,w=w,name_y=name_y,name_x=name_x,
-                                                name_w=name_w,name_ds=name_ds)
-            results['final model']="Spatial Lag with Spatial Error - Homoskedastic"
-    elif model == "ERROR":
-        results['spatial error']=True
-        if Hetflag:
-            r2 = PYSAL.model.spreg.GM_Error_Het(y,x,w,name_y=name_y,name_x=name_x,
-                                                name_w=name_w,name_ds=name_ds)
-            results['final model']="Spatial Error - Heteroskedastic"
-        else:
-            r2 = PYSAL.model.spreg.GM_Error_Hom(y,x,w,name_y=name_y,name_x=name_x,
-                                                name_w=name_w,name_ds=name_ds)
-            results['final model']="Spatial Error - Homoskedastic"
-    elif model == "LAG":
-        results['spatial lag']=True
-        if Hetflag:
-            r2 = PYSAL.model.spreg.GM_Lag(y,x,w=w,robust='white',
-                                          name_y=name_y,name_x=name_x,
-                                          name_w=name_w,name_ds=name_ds)
-            results['final model']="Spatial Lag - Heteroskedastic"
+    options = {'name_y': name_y, 'name_x': name_x, 'name_w': name_w,
+               'name_gwk': name_gwk, 'name_ds': name_ds,
+               'spat_diag': diagnostics.upper() == "FULL",
+               'diagnostics': diagnostics, 'reduced_form': reducedForm,
+               'e_pred': ePred}
+
+    #### Start the Likely Candidates While the OLS Runs ####
+    pool, candidates = None, {}
+    if speculative:
+        keys = SPECULATIVEMODELS[bool(combo)]
+        pool, candidates = startCandidates(keys, y, x, w, gwk, options,
+                                           numWorkers = numWorkers)
+
+    try:
+        if options['spat_diag']:
+            r1 = SPREG.OLS(y,x,w=w,gwk=gwk,spat_diag=True,
+                           name_y=name_y,name_x=name_x,
+                           name_w=name_w,name_gwk=name_gwk,
+                           name_ds=name_ds)
         else:
-            r2 = PYSAL.model.spreg.GM_Lag(y,x,w=w,name_y=name_y,name_x=name_x,
-                                          name_w=name_w,name_ds=name_ds)
-            results['final model']="Spatial Lag - Homoskedastic"
-    else:
-        if Hetflag:
-            r2 = PYSAL.model.spreg.OLS(y,x,robust='white',name_y=name_y,name_x=name_x,
-                                       name_ds=name_ds)
-            results['final model']="No Space - Heteroskedastic"
+            r1 = choiceOLS(y, x, w, options)
+        results['regression1'] = r1
+        Het = r1.koenker_bassett['pvalue']
+        if Het < opvalue:
+            Hetflag = True
         else:
+            Hetflag = False
+        results['heteroskedasticity'] = Hetflag
+        model = lmChoice(r1, opvalue)
+        results['spatial error'] = model == "ERROR"
+        results['spatial lag'] = model == "LAG"
+
+        #### Keep the Chosen Candidate, Fit It Here If Not Started ####
+        key = candidateKey(model, Hetflag, combo)
+        results['final model'] = CANDIDATEMODELS[key]
+        if key == "OLS_HOM":
             r2 = r1
-            results['final model']="No Space - Homoskedastic"
+        else:
+            if key in candidates:
+                r2 = candidateResult(candidates[key])
+            else:
+                r2 = fitCandidate(key, y, x, w, gwk, options)
+    finally:
+        if pool is not None:
+            stopCandidates(pool)
+
     results['regression2'] = r2
     return results